@@ -0,0 +1,4 @@
+"""
+Бенчмарки производительности. Запуск из корня проекта:
+python -m benchmarks.<имя_модуля> --help
+"""
@@ -0,0 +1,57 @@
+"""
+Распределение дат по дням, неделям ISO и месяцам: по одному объекту
+(toordinal, isocalendar, year/month) против векторного bucket_ids
+(миллисекунды на весь массив). Векторный путь выигрывает, когда даты уже
+лежат в массиве (ColumnarExpenseRepository): перевод списка datetime
+в datetime64 сам по себе дороже, чем вычисление по объектам.
+
+python -m benchmarks.bench_bucketing --count 1000000
+"""
+
+from datetime import datetime, timedelta
+
+import argparse
+import time
+
+import numpy as np
+
+from benchmarks.common import report
+from bookkeeper.analytics.bucketing import bucket_ids
+
+
+def per_object(dates: list[datetime]) -> None:
+    for d in dates:
+        d.toordinal()
+        d.isocalendar()[:2]
+        (d.year, d.month)
+
+
+def vectorized(dates: np.ndarray) -> None:
+    for interval in ('День', 'Неделя', 'Месяц'):
+        bucket_ids(dates, interval)
+
+
+def timed(func: object, *args: object) -> float:
+    start = time.perf_counter()
+    func(*args)  # type: ignore[operator]
+    return (time.perf_counter() - start) * 1e3
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--count', type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    start = datetime(2015, 1, 1)
+    dates = [start + timedelta(seconds=300 * i) for i in range(args.count)]
+    array = np.array(dates, 'datetime64[us]')
+    results = {
+        'per object': timed(per_object, dates),
+        'bucket_ids (datetime64)': timed(vectorized, array),
+        'list -> datetime64': timed(np.array, dates, 'datetime64[us]'),
+    }
+    report(f'{args.count} dates, day + week + month', results, unit='ms')
+
+
+if __name__ == '__main__':
+    main()
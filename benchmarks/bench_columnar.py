@@ -0,0 +1,120 @@
+"""
+Сравнение ColumnarExpenseRepository с MemoryRepository и SQLiteRepository:
+занимаемая память, загрузка и типичные запросы (миллисекунды на операцию).
+
+python -m benchmarks.bench_columnar --rows 1000000 10000000
+"""
+
+from datetime import datetime, timedelta
+from typing import Callable
+
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+from benchmarks.common import populate_expenses, report
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.abstract_repository import AbstractRepository
+from bookkeeper.repository.columnar_repository import ColumnarExpenseRepository
+from bookkeeper.repository.memory_repository import MemoryRepository
+from bookkeeper.repository.query import Between, Query
+from bookkeeper.repository.sqlite_connection import SQLiteConnectionManager
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+
+START = datetime(2015, 1, 1)
+
+
+def columns(rows: int) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """ Те же данные, что и benchmarks.common.expense_rows, но без комментариев """
+
+    rnd = np.random.default_rng(0)
+    dates = (np.datetime64(START, 'us')
+             + np.arange(rows, dtype=np.int64) * np.timedelta64(300, 's'))
+    return dates, rnd.integers(1, 5000, rows).astype(np.float64), \
+        rnd.integers(1, 51, rows).astype(np.int32)
+
+
+def timed(func: Callable[[], object], repeat: int = 3) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat * 1e3
+
+
+def queries(repo: AbstractRepository[Expense], rows: int) -> dict[str, float]:
+    last = START + timedelta(seconds=300 * rows)
+    month = {'date': Between(last - timedelta(days=30), last)}
+    return {
+        'sum(amount) за месяц': timed(
+            lambda: repo.aggregate('sum', 'amount', where=month)),
+        'sum(amount) по категориям': timed(
+            lambda: repo.aggregate('sum', 'amount', group_by='category_id')),
+        'последние 20 расходов': timed(
+            lambda: repo.find(Query(order_by=('-date', '-pk'), limit=20))),
+        'get_all(category_id) (2% строк)': timed(
+            lambda: repo.get_all({'category_id': 7}), repeat=1),
+    }
+
+
+def run(rows: int, memory: bool) -> None:
+    dates, amounts, categories = columns(rows)
+    results: dict[str, dict[str, float]] = {}
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    columnar = ColumnarExpenseRepository()
+    columnar.add_columns(dates, amounts, categories)
+    load = time.perf_counter() - start
+    size = tracemalloc.get_traced_memory()[0] / 2**20
+    tracemalloc.stop()
+    results['columnar'] = {'загрузка, с': load, 'объем, МиБ': size,
+                           **queries(columnar, rows)}
+    del columnar
+
+    if memory:
+        tracemalloc.start()
+        start = time.perf_counter()
+        repo: MemoryRepository[Expense] = MemoryRepository()
+        repo.add_many(map(Expense, dates.tolist(), amounts.tolist(),
+                          categories.tolist()))
+        load = time.perf_counter() - start
+        size = tracemalloc.get_traced_memory()[0] / 2**20
+        tracemalloc.stop()
+        results['memory'] = {'загрузка, с': load, 'объем, МиБ': size,
+                             **queries(repo, rows)}
+        del repo
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_file = os.path.join(tmp, 'bench.db')
+        with SQLiteConnectionManager(db_file, profile='balanced') as manager:
+            start = time.perf_counter()
+            populate_expenses(db_file, rows)
+            sqlite = SQLiteRepository(db_file, Expense, manager)
+            sqlite.ensure_indexes()
+            load = time.perf_counter() - start
+            # для SQLite - размер файла базы данных вместе с индексами
+            results['sqlite'] = {'загрузка, с': load,
+                                 'объем, МиБ': os.path.getsize(db_file) / 2**20,
+                                 **queries(sqlite, rows)}
+
+    for metric in results['columnar']:
+        report(f'{rows} rows: {metric}',
+               {name: values[metric] for name, values in results.items()}, unit='')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, nargs='+', default=[1_000_000])
+    parser.add_argument('--no-memory', action='store_true',
+                        help='не измерять MemoryRepository (долго на 10M строк)')
+    args = parser.parse_args()
+    for rows in args.rows:
+        run(rows, not args.no_memory)
+
+
+if __name__ == '__main__':
+    main()
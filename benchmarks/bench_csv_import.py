@@ -0,0 +1,95 @@
+"""
+Импорт выписки из CSV файла: по одной записи (repo.add на каждую строку,
+как при вводе через ExpensesController) против потокового import_csv
+порциями. Выводится пропускная способность и пик памяти Python (tracemalloc),
+который у import_csv не зависит от размера файла.
+
+python -m benchmarks.bench_csv_import --count 200000
+"""
+
+from datetime import datetime, timedelta
+
+import argparse
+import csv
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.common import report
+from bookkeeper.csv_import import import_csv
+from bookkeeper.models.category import Category
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.sqlite_connection import SQLiteConnectionManager
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+
+CATEGORIES = [f'категория {i}' for i in range(50)]
+
+
+def write_csv(path: str, count: int) -> None:
+    rnd = random.Random(0)
+    start = datetime(2015, 1, 1)
+    with open(path, 'w', newline='', encoding='utf-8') as file:
+        writer = csv.writer(file)
+        writer.writerow(['date', 'amount', 'category', 'comment'])
+        for i in range(count):
+            writer.writerow([(start + timedelta(minutes=10 * i)).isoformat(' '),
+                             f'{rnd.randint(1, 500000) / 100:.2f}',
+                             rnd.choice(CATEGORIES), f'comment {i}'])
+
+
+def one_by_one(path: str, expenses: SQLiteRepository[Expense],
+               categories: SQLiteRepository[Category]) -> None:
+    with open(path, newline='', encoding='utf-8') as file:
+        rows = csv.DictReader(file)
+        for row in rows:
+            category = categories.get_all({'name': row['category']})[0]
+            expenses.add(Expense(datetime.fromisoformat(row['date']),
+                                 float(row['amount']), category.pk, row['comment']))
+
+
+def run(path: str, streaming: bool, chunk_size: int) -> tuple[float, float]:
+    with tempfile.TemporaryDirectory() as tmp:
+        db_file = os.path.join(tmp, 'bench.db')
+        with SQLiteConnectionManager(db_file) as manager:
+            categories = SQLiteRepository(db_file, Category, manager)
+            expenses = SQLiteRepository(db_file, Expense, manager)
+            categories.create_table()
+            expenses.create_table()
+            categories.add_many(Category(name) for name in CATEGORIES)
+            tracemalloc.start()
+            start = time.perf_counter()
+            if streaming:
+                import_csv(path, expenses, categories, chunk_size=chunk_size)
+            else:
+                one_by_one(path, expenses, categories)
+            elapsed = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1] / 2 ** 20
+            tracemalloc.stop()
+    return elapsed, peak
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--count', type=int, default=200_000)
+    parser.add_argument('--chunk-size', type=int, default=10_000)
+    parser.add_argument('--skip-one-by-one', action='store_true')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'statement.csv')
+        write_csv(path, args.count)
+        throughput, memory = {}, {}
+        for name, streaming in (('one by one', False), ('import_csv', True)):
+            if not streaming and args.skip_one_by_one:
+                continue
+            elapsed, peak = run(path, streaming, args.chunk_size)
+            throughput[name] = args.count / elapsed
+            memory[name] = peak
+    report(f'{args.count} rows', throughput, unit='rows/s')
+    report('peak Python memory', memory, unit='MiB')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""
+Импорт нескольких CSV файлов: последовательный import_csv по файлам
+против import_csv_parallel с разным числом процессов разбора. Запись
+в базу данных всегда выполняет один процесс, поэтому ускорение
+ограничено временем записи.
+
+python -m benchmarks.bench_csv_parallel --files 8 --count 50000
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+from benchmarks.bench_csv_import import CATEGORIES, write_csv
+from benchmarks.common import report
+from bookkeeper.csv_import import import_csv, import_csv_parallel
+from bookkeeper.models.category import Category
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.sqlite_connection import SQLiteConnectionManager
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+
+
+def run(paths: list[str], workers: int | None, chunk_size: int) -> float:
+    with tempfile.TemporaryDirectory() as tmp:
+        db_file = os.path.join(tmp, 'bench.db')
+        with SQLiteConnectionManager(db_file) as manager:
+            categories = SQLiteRepository(db_file, Category, manager)
+            expenses = SQLiteRepository(db_file, Expense, manager)
+            categories.create_table()
+            expenses.create_table()
+            categories.add_many(Category(name) for name in CATEGORIES)
+            start = time.perf_counter()
+            if workers is None:
+                for path in paths:
+                    import_csv(path, expenses, categories, chunk_size=chunk_size)
+            else:
+                import_csv_parallel(paths, expenses, categories, chunk_size=chunk_size,
+                                    workers=workers)
+            return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--files', type=int, default=8)
+    parser.add_argument('--count', type=int, default=50_000, help='строк в файле')
+    parser.add_argument('--chunk-size', type=int, default=10_000)
+    parser.add_argument('--max-workers', type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = []
+        for i in range(args.files):
+            paths.append(os.path.join(tmp, f'statement{i}.csv'))
+            write_csv(paths[-1], args.count)
+        rows = args.files * args.count
+        results = {'import_csv': rows / run(paths, None, args.chunk_size)}
+        workers = 1
+        while workers <= args.max_workers:
+            results[f'parallel, {workers} workers'] = \
+                rows / run(paths, workers, args.chunk_size)
+            workers *= 2
+    report(f'{args.files} files x {args.count} rows, {os.cpu_count()} CPUs', results,
+           unit='rows/s')
+
+
+if __name__ == '__main__':
+    main()
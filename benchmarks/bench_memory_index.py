@@ -0,0 +1,43 @@
+"""
+Время поиска по равенству в MemoryRepository с хэш-индексами и без них.
+
+python -m benchmarks.bench_memory_index --rows 100000
+"""
+
+from datetime import datetime
+
+import argparse
+
+from benchmarks.common import measure, report
+from bookkeeper.models.category import Category
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.memory_repository import MemoryRepository
+
+
+def run(rows: int, repeat: int) -> None:
+    results = {}
+    for indexes in ((), ('category_id',)):
+        expenses: MemoryRepository[Expense] = MemoryRepository(indexes=indexes)
+        expenses.add_many(Expense(datetime(2024, 1, 1), 1.0, i % 1000)
+                          for i in range(rows))
+        categories: MemoryRepository[Category] = MemoryRepository(
+            indexes=('name',) if indexes else ())
+        categories.add_many(Category(f'category {i}') for i in range(rows // 100))
+        label = 'indexed' if indexes else 'scan'
+        results[f'{label}: get_all(category_id)'] = measure(
+            lambda: expenses.get_all({'category_id': 500}), repeat)
+        results[f'{label}: get_all(name)'] = measure(
+            lambda: categories.get_all({'name': 'category 7'}), repeat)
+    report(f'{rows} rows', results)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=100_000)
+    parser.add_argument('--repeat', type=int, default=100)
+    args = parser.parse_args()
+    run(args.rows, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
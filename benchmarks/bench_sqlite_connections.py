@@ -0,0 +1,84 @@
+"""
+Задержка одной операции SQLiteRepository: соединение на каждый вызов
+(прежнее поведение) против долгоживущих соединений SQLiteConnectionManager.
+
+python -m benchmarks.bench_sqlite_connections --rows 10000 1000000
+"""
+
+from datetime import datetime
+
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+
+from benchmarks.common import measure, populate_expenses, report
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.sqlite_connection import SQLiteConnectionManager
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+
+
+def connect_per_call(db_file: str, query: str, params: tuple[object, ...]) -> None:
+    """ Прежнее поведение: новое соединение и pragma на каждый запрос """
+
+    with sqlite3.connect(db_file) as con:
+        cur = con.cursor()
+        cur.execute('PRAGMA foreign_keys = ON')
+        cur.execute(query, params)
+        cur.fetchall()
+    con.close()
+
+
+def run(rows: int, repeat: int) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        db_file = os.path.join(tmp, 'bench.db')
+        populate_expenses(db_file, rows)
+        rnd = random.Random(1)
+        now = datetime(2024, 1, 1).strftime('%Y-%m-%d %H:%M:%S')
+
+        before = {
+            'get': measure(lambda: connect_per_call(
+                db_file, 'SELECT * FROM expense WHERE pk = ?',
+                (rnd.randint(1, rows),)), repeat),
+            'add': measure(lambda: connect_per_call(
+                db_file, 'INSERT INTO expense(date, amount, category_id, comment) '
+                'VALUES(?, ?, ?, ?)', (now, 1.0, 1, '')), repeat),
+            'update': measure(lambda: connect_per_call(
+                db_file, 'UPDATE expense SET amount = ? WHERE pk = ?',
+                (2.0, rnd.randint(1, rows))), repeat),
+        }
+
+        with SQLiteConnectionManager(db_file) as manager:
+            repo = SQLiteRepository(db_file, Expense, manager)
+            sample = repo.get(1)
+            assert sample is not None
+
+            def add() -> None:
+                repo.add(Expense(datetime(2024, 1, 1), 1.0, 1))
+
+            def update() -> None:
+                sample.pk = rnd.randint(1, rows)
+                repo.update(sample)
+
+            after = {
+                'get': measure(lambda: repo.get(rnd.randint(1, rows)), repeat),
+                'add': measure(add, repeat),
+                'update': measure(update, repeat),
+            }
+
+    report(f'{rows} rows, connection per call', before)
+    report(f'{rows} rows, pooled connections', after)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, nargs='+', default=[10_000, 1_000_000])
+    parser.add_argument('--repeat', type=int, default=500)
+    args = parser.parse_args()
+    for rows in args.rows:
+        run(rows, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""
+Скорость разбора строк таблицы расходов в объекты Expense (строк в секунду):
+прежний разбор по cursor.description с strptime против RowMapper.
+
+python -m benchmarks.bench_sqlite_decode --rows 1000000
+"""
+
+from datetime import datetime
+from typing import Any, get_args
+
+import argparse
+import os
+import tempfile
+import time
+
+from benchmarks.common import populate_expenses, report
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.sqlite_connection import SQLiteConnectionManager
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+
+DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def legacy_decode(fields: dict[str, Any], raw_obj: Any, desc: Any) -> Expense:
+    """ Прежний SQLiteRepository._to_obj """
+
+    def sql_to_attr(field: Any, value: Any) -> Any:
+        if value == 'NULL':
+            return None
+        if str == field or str in get_args(field):
+            return str(value.strip('\''))
+        if datetime == field or datetime in get_args(field):
+            return datetime.strptime(value.strip('\''), DATETIME_FORMAT)
+        return value
+
+    obj = Expense.__new__(Expense)
+    setattr(obj, 'pk', raw_obj[0])
+    for i, field in enumerate(desc):
+        if field[0] in fields:
+            setattr(obj, field[0], sql_to_attr(fields[field[0]], raw_obj[i]))
+        else:
+            setattr(obj, field[0], raw_obj[i])
+    return obj
+
+
+def run(rows: int) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        db_file = os.path.join(tmp, 'bench.db')
+        populate_expenses(db_file, rows)
+        with SQLiteConnectionManager(db_file) as manager:
+            repo = SQLiteRepository(db_file, Expense, manager)
+            with manager.reader() as con:
+                cur = con.execute('SELECT * FROM expense')
+                legacy_rows = cur.fetchall()
+                desc = cur.description
+                mapper_rows = con.execute(repo.mapper.select_sql).fetchall()
+
+            start = time.perf_counter()
+            for row in legacy_rows:
+                legacy_decode(repo.fields, row, desc)
+            legacy = rows / (time.perf_counter() - start)
+
+            start = time.perf_counter()
+            repo.mapper.decode_all(mapper_rows)
+            mapped = rows / (time.perf_counter() - start)
+
+            start = time.perf_counter()
+            repo.get_all()
+            get_all = rows / (time.perf_counter() - start)
+
+    report(f'{rows} rows', {
+        'legacy decode': legacy,
+        'RowMapper decode': mapped,
+        'get_all (fetch + decode)': get_all,
+    }, unit='rows/s')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, nargs='+', default=[1_000_000])
+    args = parser.parse_args()
+    for rows in args.rows:
+        run(rows)
+
+
+if __name__ == '__main__':
+    main()
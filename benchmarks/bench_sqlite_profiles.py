@@ -0,0 +1,72 @@
+"""
+Матрица пропускной способности вставки и чтения для профилей pragma SQLite.
+
+python -m benchmarks.bench_sqlite_profiles --rows 100000
+"""
+
+from datetime import datetime, timedelta
+from typing import Callable
+
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.sqlite_connection import PROFILES, SQLiteConnectionManager
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+
+
+def throughput(func: Callable[[], object], count: int) -> float:
+    """ Количество операций в секунду """
+
+    start = time.perf_counter()
+    func()
+    return count / (time.perf_counter() - start)
+
+
+def run(profile: str, rows: int, single: int) -> dict[str, float]:
+    with tempfile.TemporaryDirectory() as tmp:
+        db_file = os.path.join(tmp, 'bench.db')
+        with SQLiteConnectionManager(db_file, profile=profile) as manager:
+            repo = SQLiteRepository(db_file, Expense, manager)
+            repo.create_table()
+            start = datetime(2015, 1, 1)
+            expenses = [Expense(start + timedelta(minutes=i), float(i % 500), i % 50)
+                        for i in range(rows)]
+            rnd = random.Random(0)
+
+            def add_each() -> None:
+                for i in range(single):
+                    repo.add(Expense(start, float(i), 1))
+
+            def get_random() -> None:
+                for _ in range(single):
+                    repo.get(rnd.randint(1, rows))
+
+            return {
+                'add (commit per row)': throughput(add_each, single),
+                'add_many (one commit)': throughput(lambda: repo.add_many(expenses),
+                                                    rows),
+                'get (random pk)': throughput(get_random, single),
+                'get_all': throughput(repo.get_all, rows + single),
+            }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=100_000)
+    parser.add_argument('--single', type=int, default=1000,
+                        help='количество одиночных операций')
+    args = parser.parse_args()
+
+    results = {profile: run(profile, args.rows, args.single) for profile in PROFILES}
+    metrics = list(next(iter(results.values())))
+    print(f'{"ops/s":<24}' + ''.join(f'{p:>14}' for p in results))
+    for metric in metrics:
+        print(f'{metric:<24}' + ''.join(f'{r[metric]:>14.0f}' for r in results.values()))
+
+
+if __name__ == '__main__':
+    main()
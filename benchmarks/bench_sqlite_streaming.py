@@ -0,0 +1,72 @@
+"""
+Пиковая память и время до первой записи при обходе таблицы расходов:
+get_all (список всех объектов) против iter_all (fetchmany порциями).
+
+python -m benchmarks.bench_sqlite_streaming --rows 1000000
+"""
+
+from typing import Callable, Iterable
+
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.common import populate_expenses, report
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.sqlite_connection import SQLiteConnectionManager
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+
+
+def consume(source: Callable[[], Iterable[Expense]]) -> tuple[float, float, float]:
+    """
+    Обойти записи, посчитав сумму расходов
+
+    Returns
+    -------
+    Время до первой записи (мс), общее время (с) и пиковая память (МиБ)
+    """
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    first = None
+    total = 0.0
+    for expense in source():
+        if first is None:
+            first = time.perf_counter() - start
+        total += expense.amount
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return (first or 0.0) * 1e3, elapsed, peak / 2**20
+
+
+def run(rows: int, batch_size: int) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        db_file = os.path.join(tmp, 'bench.db')
+        populate_expenses(db_file, rows)
+        with SQLiteConnectionManager(db_file) as manager:
+            repo = SQLiteRepository(db_file, Expense, manager)
+            results = {
+                'get_all': consume(repo.get_all),
+                f'iter_all(batch_size={batch_size})':
+                    consume(lambda: repo.iter_all(batch_size=batch_size)),
+            }
+
+    for index, unit in enumerate(('ms to first row', 's total', 'MiB peak')):
+        report(f'{rows} rows, {unit}',
+               {name: values[index] for name, values in results.items()}, unit=unit)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, nargs='+', default=[1_000_000])
+    parser.add_argument('--batch-size', type=int, default=1000)
+    args = parser.parse_args()
+    for rows in args.rows:
+        run(rows, args.batch_size)
+
+
+if __name__ == '__main__':
+    main()
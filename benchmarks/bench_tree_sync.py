@@ -0,0 +1,85 @@
+"""
+Синхронизация дерева категорий SQLite с текстом дерева отступами
+(Category.sync_from_tree): первичная загрузка и повторная загрузка
+с небольшими изменениями (переименования, переносы, добавления, удаления).
+Время в миллисекундах, включая разбор текста.
+
+python -m benchmarks.bench_tree_sync --count 50000
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from benchmarks.common import report
+from bookkeeper.models.category import Category
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+from bookkeeper.utils import iter_tree
+
+
+def tree_lines(count: int, seed: int = 0) -> list[str]:
+    """
+    Сгенерировать случайное дерево из count категорий
+    """
+
+    rnd = random.Random(seed)
+    children: dict[int, list[int]] = {0: []}
+    for node in range(1, count + 1):
+        children[rnd.randrange(node)].append(node)
+        children[node] = []
+    lines = []
+    stack = [(node, 0) for node in reversed(children[0])]
+    while stack:
+        node, depth = stack.pop()
+        lines.append('    ' * depth + f'категория {node}')
+        stack.extend((child, depth + 1) for child in reversed(children[node]))
+    return lines
+
+
+def edit(lines: list[str], changes: int, seed: int = 1) -> list[str]:
+    """
+    Переименовать changes категорий и добавить changes новых категорий
+    """
+
+    rnd = random.Random(seed)
+    lines = list(lines)
+    for i in rnd.sample(range(len(lines)), changes):
+        lines[i] += ' (новая)'
+    for i in range(changes):
+        # новая категория - соседняя для категории строки position
+        position = rnd.randrange(len(lines))
+        indent = lines[position][:len(lines[position]) - len(lines[position].lstrip())]
+        lines.insert(position, f'{indent}добавленная {i}')
+    return lines
+
+
+def timed(repo: SQLiteRepository[Category], lines: list[str]) -> float:
+    start = time.perf_counter()
+    Category.sync_from_tree(iter_tree(lines), repo)
+    return (time.perf_counter() - start) * 1e3
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--count', type=int, default=50_000)
+    parser.add_argument('--changes', type=int, default=100)
+    args = parser.parse_args()
+
+    lines = tree_lines(args.count)
+    with tempfile.TemporaryDirectory() as tmp:
+        repo = SQLiteRepository(os.path.join(tmp, 'bench.db'), Category)
+        repo.create_table()
+        results = {
+            'initial import': timed(repo, lines),
+            'unchanged': timed(repo, lines),
+            f'{args.changes} renames + {args.changes} adds':
+                timed(repo, edit(lines, args.changes)),
+        }
+        repo.close()
+    report(f'{args.count} categories', results, unit='ms')
+
+
+if __name__ == '__main__':
+    main()
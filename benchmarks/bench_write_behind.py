@@ -0,0 +1,66 @@
+"""
+Пропускная способность непрерывной вставки расходов по одному (add на каждый
+расход, как при вводе через ExpensesController): фиксация на каждый вызов
+против отложенной записи пачками.
+
+python -m benchmarks.bench_write_behind --count 5000
+"""
+
+from datetime import datetime, timedelta
+
+import argparse
+import os
+import tempfile
+import time
+
+from benchmarks.common import report
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.abstract_repository import AbstractRepository
+from bookkeeper.repository.sqlite_connection import SQLiteConnectionManager
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+from bookkeeper.repository.write_behind_repository import WriteBehindRepository
+
+
+def insert(repo: AbstractRepository[Expense], count: int) -> None:
+    start = datetime(2024, 1, 1)
+    for i in range(count):
+        repo.add(Expense(start + timedelta(minutes=i), float(i % 500), i % 50))
+
+
+def run(profile: str, count: int, write_behind: bool, max_batch: int) -> float:
+    with tempfile.TemporaryDirectory() as tmp:
+        db_file = os.path.join(tmp, 'bench.db')
+        with SQLiteConnectionManager(db_file, profile=profile) as manager:
+            sqlite = SQLiteRepository(db_file, Expense, manager)
+            sqlite.create_table()
+            start = time.perf_counter()
+            if write_behind:
+                repo = WriteBehindRepository(sqlite, max_batch=max_batch)
+                insert(repo, count)
+                repo.flush()
+            else:
+                insert(sqlite, count)
+            elapsed = time.perf_counter() - start
+            assert sqlite.aggregate('count') == count
+            if write_behind:
+                repo.close()
+    return count / elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--count', type=int, default=5000)
+    parser.add_argument('--max-batch', type=int, default=1000)
+    args = parser.parse_args()
+
+    results = {}
+    for profile in ('durable', 'balanced'):
+        results[f'{profile}: commit per add'] = run(profile, args.count, False,
+                                                    args.max_batch)
+        results[f'{profile}: write-behind'] = run(profile, args.count, True,
+                                                  args.max_batch)
+    report(f'{args.count} sequential adds', results, unit='ops/s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""
+Общие вспомогательные функции для бенчмарков
+"""
+
+from datetime import datetime, timedelta
+from typing import Callable, Iterator
+
+import random
+import sqlite3
+import time
+
+EXPENSE_DDL = (
+    "CREATE TABLE IF NOT EXISTS expense "
+    "(pk INTEGER PRIMARY KEY, date DATETIME, amount REAL, "
+    "category_id INTEGER, comment TEXT)"
+)
+
+
+def expense_rows(rows: int, seed: int = 0) -> Iterator[tuple[str, float, int, str]]:
+    """
+    Сгенерировать строки таблицы расходов в формате хранения SQLiteRepository
+    """
+
+    rnd = random.Random(seed)
+    start = datetime(2015, 1, 1)
+    for i in range(rows):
+        date = start + timedelta(seconds=i * 300)
+        yield (date.strftime('%Y-%m-%d %H:%M:%S'), float(rnd.randint(1, 5000)),
+               rnd.randint(1, 50), f'comment {i}')
+
+
+def populate_expenses(db_file: str, rows: int) -> None:
+    """
+    Создать таблицу expense и заполнить ее rows строками
+    """
+
+    with sqlite3.connect(db_file) as con:
+        con.execute(EXPENSE_DDL)
+        con.executemany(
+            'INSERT INTO expense(date, amount, category_id, comment) '
+            'VALUES(?, ?, ?, ?)', expense_rows(rows))
+    con.close()
+
+
+def measure(func: Callable[[], object], repeat: int) -> float:
+    """
+    Среднее время одного вызова func в микросекундах
+    """
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def report(title: str, results: dict[str, float], unit: str = 'us/op') -> None:
+    """
+    Напечатать результаты в виде таблицы
+    """
+
+    print(title)
+    width = max(len(name) for name in results)
+    for name, value in results.items():
+        print(f'  {name:<{width}}  {value:12.1f} {unit}')
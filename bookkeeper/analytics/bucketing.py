@@ -0,0 +1,128 @@
+"""
+Модуль описывает векторное распределение дат по периодам на основе NumPy
+
+Номер периода (bucket id) - целое число, одинаковое для всех дат одного
+периода и увеличивающееся на 1 от периода к периоду: номер дня от начала эпохи,
+номер недели ISO (с понедельника) или номер месяца от января 1970 года.
+Номера вычисляются над массивом дат целиком арифметикой datetime64 и могут
+сразу использоваться как ключи группировки (np.bincount, np.unique).
+"""
+
+from datetime import date, datetime
+from typing import Any, Sequence
+
+import numpy as np
+import numpy.typing as npt
+
+# 1 января 1970 года - четверг, понедельник той недели - 29 декабря 1969 года
+_WEEK_SHIFT = 3
+
+INTERVALS = ('День', 'Неделя', 'Месяц')
+
+
+def to_datetime64(dates: Sequence[datetime] | npt.ArrayLike) -> npt.NDArray[Any]:
+    """
+    Привести даты к массиву datetime64[us]. Целые числа считаются
+    микросекундами от начала эпохи
+    """
+
+    array = np.asarray(dates)
+    if np.issubdtype(array.dtype, np.integer):
+        return array.astype(np.int64).view('datetime64[us]')
+    return array.astype('datetime64[us]')
+
+
+def bucket_ids(dates: Sequence[datetime] | npt.ArrayLike,
+               interval: str) -> npt.NDArray[np.int64]:
+    """
+    Вычислить номера периодов для массива дат
+
+    Parameters
+    ----------
+    dates - даты (datetime, datetime64 или микросекунды от начала эпохи)
+    interval - "День", "Неделя" (ISO, с понедельника) или "Месяц"
+
+    Returns
+    -------
+    Номера периодов (int64)
+    """
+
+    values = to_datetime64(dates)
+    if interval == 'День':
+        return values.astype('datetime64[D]').astype(np.int64)
+    if interval == 'Неделя':
+        days = values.astype('datetime64[D]').astype(np.int64)
+        return (days + _WEEK_SHIFT) // 7
+    if interval == 'Месяц':
+        return values.astype('datetime64[M]').astype(np.int64)
+    raise KeyError(f'unknown interval {interval}')
+
+
+def bucket_id(value: date | datetime, interval: str) -> int:
+    """
+    Вычислить номер периода для одной даты (см. bucket_ids)
+    """
+
+    return int(bucket_ids(np.array([np.datetime64(value, 'us')]), interval)[0])
+
+
+def bucket_starts(ids: npt.ArrayLike, interval: str) -> npt.NDArray[Any]:
+    """
+    Вычислить первые дни периодов по их номерам
+
+    Returns
+    -------
+    Массив datetime64[D]
+    """
+
+    ids = np.asarray(ids, np.int64)
+    if interval == 'День':
+        return ids.astype('datetime64[D]')
+    if interval == 'Неделя':
+        return (ids * 7 - _WEEK_SHIFT).astype('datetime64[D]')
+    if interval == 'Месяц':
+        return ids.astype('datetime64[M]').astype('datetime64[D]')
+    raise KeyError(f'unknown interval {interval}')
+
+
+def iso_weeks(ids: npt.ArrayLike) -> tuple[npt.NDArray[np.int64], npt.NDArray[np.int64]]:
+    """
+    Получить ISO год и номер недели по номерам недель. ISO год недели -
+    год ее четверга, поэтому первая неделя года может начинаться в декабре
+    предыдущего календарного года, а последняя - заканчиваться в январе
+
+    Returns
+    -------
+    Пара массивов (ISO год, номер недели в году)
+    """
+
+    thursdays = (np.asarray(ids, np.int64) * 7).astype('datetime64[D]')
+    years = thursdays.astype('datetime64[Y]')
+    weeks = (thursdays - years.astype('datetime64[D]')).astype(np.int64) // 7 + 1
+    return years.astype(np.int64) + 1970, weeks
+
+
+def sum_by_bucket(dates: Sequence[datetime] | npt.ArrayLike, amounts: npt.ArrayLike,
+                  interval: str) -> tuple[npt.NDArray[np.int64], npt.NDArray[np.float64]]:
+    """
+    Просуммировать значения по периодам за один проход
+
+    Parameters
+    ----------
+    dates - даты
+    amounts - значения той же длины
+    interval - "День", "Неделя" или "Месяц"
+
+    Returns
+    -------
+    Пара массивов (номера непустых периодов по возрастанию, суммы)
+    """
+
+    ids = bucket_ids(dates, interval)
+    if not len(ids):
+        return ids, np.zeros(0)
+    first = ids.min()
+    counts = np.bincount(ids - first)
+    sums = np.bincount(ids - first, weights=np.asarray(amounts, np.float64))
+    present = np.flatnonzero(counts)
+    return (present + first).astype(np.int64), sums[present].astype(np.float64)
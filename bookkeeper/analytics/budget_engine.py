@@ -0,0 +1,126 @@
+"""
+Модуль описывает инкрементальный подсчет трат для бюджетов
+
+Суммы расходов за текущие день, неделю и месяц хранятся в памяти и
+изменяются на сумму каждого добавленного, измененного или удаленного расхода,
+поэтому получение суммы не зависит от количества расходов в репозитории.
+Когда период заканчивается, сумма за новый период вычисляется одним запросом
+по диапазону дат.
+"""
+
+from datetime import datetime
+from typing import Callable, Iterable
+
+import math
+
+from bookkeeper.analytics.incremental import IncrementalAggregate
+from bookkeeper.models.budget import period_bounds
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.abstract_repository import AbstractRepository
+from bookkeeper.repository.query import Between
+
+INTERVALS = ('День', 'Неделя', 'Месяц')
+
+
+class BudgetEngine(IncrementalAggregate):
+    """
+    Текущие суммы расходов по периодам бюджетов.
+    Изменять расходы следует через методы add, update и delete движка
+    (см. IncrementalAggregate), тогда суммы обновляются без обращения
+    к репозиторию.
+
+    repo - репозиторий расходов
+    intervals - периоды ("День", "Неделя", "Месяц"), для которых ведутся суммы
+    clock - функция, возвращающая текущий момент времени
+    """
+
+    def __init__(self, repo: AbstractRepository[Expense],
+                 intervals: Iterable[str] = INTERVALS,
+                 clock: Callable[[], datetime] = datetime.today) -> None:
+        super().__init__(repo)
+        self.clock = clock
+        self._bounds: dict[str, tuple[datetime, datetime]] = {}
+        self._totals: dict[str, float] = {}
+        self.intervals = tuple(intervals)
+        for interval in self.intervals:
+            # неизвестный период - KeyError сразу, как у period_bounds
+            period_bounds(interval, datetime.today())
+        self.recompute()
+
+    def _sum(self, bounds: tuple[datetime, datetime]) -> float:
+        return float(self.repo.aggregate('sum', 'amount',
+                                         where={'date': Between(*bounds)}))
+
+    def recompute(self) -> None:
+        """
+        Пересчитать суммы за текущие периоды запросами к репозиторию
+        """
+
+        now = self.clock()
+        for interval in self.intervals:
+            self._bounds[interval] = period_bounds(interval, now)
+            self._totals[interval] = self._sum(self._bounds[interval])
+        self._remember_version()
+
+    def _validate(self) -> None:
+        super()._validate()
+        now = self.clock()
+        for interval in self.intervals:
+            start, end = self._bounds[interval]
+            if not start <= now <= end:
+                # период закончился
+                self._bounds[interval] = period_bounds(interval, now)
+                self._totals[interval] = self._sum(self._bounds[interval])
+
+    def _apply(self, expense: Expense, sign: int) -> None:
+        for interval in self.intervals:
+            start, end = self._bounds[interval]
+            if start <= expense.date <= end:
+                self._totals[interval] += sign * expense.amount
+
+    def amount(self, interval: str) -> float:
+        """
+        Получить сумму расходов за текущий период
+
+        Parameters
+        ----------
+        interval - период ("День", "Неделя" или "Месяц")
+
+        Returns
+        -------
+        Сумма расходов
+        """
+
+        self._validate()
+        return self._totals[interval]
+
+    def totals(self) -> dict[str, float]:
+        """
+        Получить суммы расходов за текущие периоды
+
+        Returns
+        -------
+        Словарь {период: сумма расходов}
+        """
+
+        self._validate()
+        return dict(self._totals)
+
+    def verify(self) -> dict[str, tuple[float, float]]:
+        """
+        Сравнить текущие суммы с суммами, вычисленными запросами к репозиторию.
+        Суммы не пересчитываются
+
+        Returns
+        -------
+        Словарь {период: (текущая сумма, сумма по репозиторию)} для периодов,
+        суммы которых не совпадают. Пустой, если все суммы верны
+        """
+
+        self._validate()
+        mismatches = {}
+        for interval in self.intervals:
+            actual = self._sum(self._bounds[interval])
+            if not math.isclose(self._totals[interval], actual, abs_tol=1e-6):
+                mismatches[interval] = (self._totals[interval], actual)
+        return mismatches
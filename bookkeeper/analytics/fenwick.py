@@ -0,0 +1,215 @@
+"""
+Модуль описывает индекс дневных трат на дереве Фенвика
+
+Дерево Фенвика хранит префиксные суммы массива так, что изменение элемента
+и сумма по любому отрезку вычисляются за O(log n). DailySpendIndex хранит
+в таком дереве суммы расходов по дням (позиция - порядковый номер дня,
+date.toordinal()), общие и, по желанию, отдельно по каждой категории,
+и отвечает на запрос суммы расходов за любой диапазон дней.
+"""
+
+from datetime import date, datetime
+from typing import Iterable
+
+from bookkeeper.analytics.incremental import IncrementalAggregate
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.abstract_repository import AbstractRepository
+
+
+class FenwickTree:
+    """
+    Дерево Фенвика (двоичное индексированное дерево) над массивом чисел.
+    Массив увеличивается автоматически при изменении элемента за его концом
+
+    size - начальный размер массива
+    """
+
+    def __init__(self, size: int = 0) -> None:
+        self._values = [0.0] * size
+        self._tree = [0.0] * (size + 1)
+
+    @classmethod
+    def from_values(cls, values: Iterable[float]) -> 'FenwickTree':
+        """
+        Построить дерево по массиву за O(n)
+        """
+
+        tree = cls()
+        tree._build(list(values))
+        return tree
+
+    def _build(self, values: list[float]) -> None:
+        self._values = values
+        self._tree = [0.0] + values
+        size = len(values)
+        for i in range(1, size + 1):
+            parent = i + (i & -i)
+            if parent <= size:
+                self._tree[parent] += self._tree[i]
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def values(self) -> list[float]:
+        """
+        Получить копию массива
+        """
+
+        return list(self._values)
+
+    def value(self, index: int) -> float:
+        """
+        Получить элемент массива (0 за пределами массива)
+        """
+
+        return self._values[index] if 0 <= index < len(self._values) else 0.0
+
+    def add(self, index: int, delta: float) -> None:
+        """
+        Прибавить delta к элементу массива с индексом index
+
+        Parameters
+        ----------
+        index - неотрицательный индекс элемента
+        delta - прибавляемое значение
+        """
+
+        if index < 0:
+            raise IndexError('index must not be negative')
+        if index >= len(self._values):
+            self._build(self._values
+                        + [0.0] * (max(index + 1, 2 * len(self._values))
+                                   - len(self._values)))
+        self._values[index] += delta
+        i = index + 1
+        while i < len(self._tree):
+            self._tree[i] += delta
+            i += i & -i
+
+    def prefix_sum(self, stop: int) -> float:
+        """
+        Сумма элементов с индексами [0, stop)
+        """
+
+        i = min(stop, len(self._values))
+        total = 0.0
+        while i > 0:
+            total += self._tree[i]
+            i -= i & -i
+        return total
+
+    def range_sum(self, start: int, stop: int) -> float:
+        """
+        Сумма элементов с индексами [start, stop)
+        """
+
+        start = max(start, 0)
+        if stop <= start:
+            return 0.0
+        return self.prefix_sum(stop) - self.prefix_sum(start)
+
+
+class DailySpendIndex(IncrementalAggregate):
+    """
+    Суммы расходов по дням в дереве Фенвика. Сумма за любой диапазон дней
+    вычисляется за O(log n), где n - количество дней между первым
+    и последним расходом. Изменять расходы следует через методы add, update
+    и delete индекса (см. IncrementalAggregate), изменения в обход индекса
+    приводят к его перестроению при следующем запросе.
+
+    repo - репозиторий расходов
+    by_category - вести суммы отдельно по каждой категории
+    """
+
+    def __init__(self, repo: AbstractRepository[Expense],
+                 by_category: bool = False) -> None:
+        super().__init__(repo)
+        self.by_category = by_category
+        # порядковый номер дня, соответствующего индексу 0 деревьев
+        # (None, пока расходов нет)
+        self._origin: int | None = None
+        self._total = FenwickTree()
+        self._categories: dict[int, FenwickTree] = {}
+        self.recompute()
+
+    def recompute(self) -> None:
+        """
+        Перестроить индекс за один проход по расходам репозитория
+        """
+
+        expenses = [(e.date.toordinal(), e.category_id, e.amount)
+                    for e in self.repo.iter_all()]
+        days = [day for day, _, _ in expenses]
+        origin = min(days, default=0)
+        size = max(days) - origin + 1 if days else 0
+        total = [0.0] * size
+        categories: dict[int, list[float]] = {}
+        for day, category_id, amount in expenses:
+            total[day - origin] += amount
+            if self.by_category:
+                if category_id not in categories:
+                    categories[category_id] = [0.0] * size
+                categories[category_id][day - origin] += amount
+        self._origin = origin if days else None
+        self._total = FenwickTree.from_values(total)
+        self._categories = {category_id: FenwickTree.from_values(values)
+                            for category_id, values in categories.items()}
+        self._remember_version()
+
+    def _shift(self, origin: int) -> None:
+        # расход раньше первого дня индекса: деревья сдвигаются вправо
+        assert self._origin is not None
+        padding = [0.0] * (self._origin - origin)
+        self._total = FenwickTree.from_values(padding + self._total.values())
+        self._categories = {
+            category_id: FenwickTree.from_values(padding + tree.values())
+            for category_id, tree in self._categories.items()}
+        self._origin = origin
+
+    def _apply(self, expense: Expense, sign: int) -> None:
+        day = expense.date.toordinal()
+        if self._origin is None:
+            self._origin = day
+        elif day < self._origin:
+            self._shift(day)
+        self._total.add(day - self._origin, sign * expense.amount)
+        if self.by_category:
+            if expense.category_id not in self._categories:
+                self._categories[expense.category_id] = FenwickTree()
+            self._categories[expense.category_id].add(day - self._origin,
+                                                      sign * expense.amount)
+
+    def range_sum(self, start: date | datetime, end: date | datetime,
+                  category_id: int | None = None) -> float:
+        """
+        Получить сумму расходов за дни с start по end включительно.
+        Время в start и end не учитывается
+
+        Parameters
+        ----------
+        start - первый день диапазона
+        end - последний день диапазона
+        category_id - категория расходов (None - все категории);
+        требует by_category=True
+
+        Returns
+        -------
+        Сумма расходов
+        """
+
+        if category_id is not None and not self.by_category:
+            raise ValueError('index is built without `by_category`')
+        self._validate()
+        if self._origin is None:
+            return 0.0
+        tree = (self._total if category_id is None
+                else self._categories.get(category_id, FenwickTree()))
+        return tree.range_sum(start.toordinal() - self._origin,
+                              end.toordinal() - self._origin + 1)
+
+    def day_sum(self, day: date | datetime, category_id: int | None = None) -> float:
+        """
+        Получить сумму расходов за день (см. range_sum)
+        """
+
+        return self.range_sum(day, day, category_id)
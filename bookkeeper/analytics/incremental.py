@@ -0,0 +1,113 @@
+"""
+Модуль описывает базовый класс агрегатов по расходам, которые обновляются
+на разницу при каждом изменении расходов, а не пересчитываются заново
+
+Изменения, внесенные в обход агрегата (другими объектами или процессами),
+обнаруживаются по версии данных репозитория (AbstractRepository.data_version)
+и приводят к полному пересчету.
+"""
+
+from abc import ABC, abstractmethod
+from typing import Any
+
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.abstract_repository import AbstractRepository
+
+
+class IncrementalAggregate(ABC):
+    """
+    Агрегат по расходам репозитория. Изменять расходы следует через методы
+    add, update и delete агрегата, тогда он обновляется без обращения
+    к репозиторию.
+    Абстрактные методы:
+    recompute
+    _apply
+
+    repo - репозиторий расходов
+    """
+
+    def __init__(self, repo: AbstractRepository[Expense]) -> None:
+        self.repo = repo
+        self._version: Any = None
+
+    @abstractmethod
+    def recompute(self) -> None:
+        """
+        Пересчитать агрегат по данным репозитория.
+        Реализация должна вызвать _remember_version
+        """
+
+    @abstractmethod
+    def _apply(self, expense: Expense, sign: int) -> None:
+        """
+        Учесть расход в агрегате (sign = 1) или исключить его (sign = -1)
+        """
+
+    def _remember_version(self) -> None:
+        self._version = self.repo.data_version()
+
+    def _validate(self) -> None:
+        """
+        Пересчитать агрегат, если расходы изменены в обход него
+        """
+
+        version = self.repo.data_version()
+        if version is not None and version != self._version:
+            self.recompute()
+
+    def add(self, expense: Expense) -> int:
+        """
+        Добавить расход в репозиторий и учесть его в агрегате
+
+        Parameters
+        ----------
+        expense - новый расход
+
+        Returns
+        -------
+        pk расхода
+        """
+
+        self._validate()
+        primary_key = self.repo.add(expense)
+        self._apply(expense, 1)
+        self._remember_version()
+        return primary_key
+
+    def update(self, expense: Expense) -> None:
+        """
+        Обновить расход в репозитории и изменить агрегат на разницу
+        между старой и новой версией расхода
+
+        Parameters
+        ----------
+        expense - измененный расход
+        """
+
+        self._validate()
+        old = self.repo.get(expense.pk)
+        self.repo.update(expense)
+        if old is expense:
+            # объект хранилища изменен на месте, прежние значения неизвестны
+            self.recompute()
+            return
+        if old is not None:
+            self._apply(old, -1)
+        self._apply(expense, 1)
+        self._remember_version()
+
+    def delete(self, primary_key: int) -> None:
+        """
+        Удалить расход из репозитория и исключить его из агрегата
+
+        Parameters
+        ----------
+        primary_key - pk расхода
+        """
+
+        self._validate()
+        old = self.repo.get(primary_key)
+        self.repo.delete(primary_key)
+        if old is not None:
+            self._apply(old, -1)
+        self._remember_version()
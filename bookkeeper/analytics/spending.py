@@ -0,0 +1,162 @@
+"""
+Модуль описывает матрицы трат по категориям и периодам
+
+Траты за каждый период по каждой категории вычисляются за один проход
+по расходам (или одним запросом с группировкой, если репозиторий умеет
+суммировать по периодам: SQLiteRepository, ColumnarExpenseRepository),
+после чего суммы поднимаются по дереву категорий от листьев к корням
+в топологическом порядке. Результат - плотные матрицы NumPy
+категории x периоды.
+"""
+
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Iterable
+
+import numpy as np
+import numpy.typing as npt
+
+from bookkeeper.analytics.bucketing import bucket_id, bucket_ids, bucket_starts
+from bookkeeper.models.budget import period_bounds
+from bookkeeper.models.category import Category
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.abstract_repository import AbstractRepository
+from bookkeeper.repository.query import Between
+
+
+def topological_order(categories: Iterable[Category]) -> list[Category]:
+    """
+    Упорядочить категории так, чтобы родитель шел раньше своих подкатегорий
+    (обход в ширину от категорий верхнего уровня, внутри уровня - по pk).
+    Категории, не достижимые от верхнего уровня (цикл в иерархии),
+    идут в конце по pk
+    """
+
+    children: dict[int | None, list[Category]] = {}
+    by_pk = {}
+    for category in sorted(categories, key=lambda c: c.pk):
+        by_pk[category.pk] = category
+    for category in by_pk.values():
+        # ссылка на несуществующего родителя - категория верхнего уровня
+        parent = category.parent if category.parent in by_pk else None
+        children.setdefault(parent, []).append(category)
+
+    order = list(children.get(None, []))
+    seen = {category.pk for category in order}
+    for category in order:
+        for child in children.get(category.pk, []):
+            if child.pk not in seen:
+                seen.add(child.pk)
+                order.append(child)
+    order.extend(c for c in by_pk.values() if c.pk not in seen)
+    return order
+
+
+@dataclass(frozen=True)
+class SpendingMatrix:
+    """
+    Траты по категориям и периодам.
+    interval - период ("День", "Неделя", "Месяц")
+    categories - pk категорий, ось строк (родители раньше подкатегорий)
+    periods - начала периодов, ось столбцов
+    own - траты категории без подкатегорий, матрица categories x periods
+    total - траты категории вместе со всеми подкатегориями
+    unassigned - траты по периодам с категорией, отсутствующей в дереве
+    """
+    interval: str
+    categories: list[int]
+    periods: list[datetime]
+    own: npt.NDArray[np.float64]
+    total: npt.NDArray[np.float64]
+    unassigned: npt.NDArray[np.float64]
+
+    def row(self, category_id: int, own: bool = False) -> npt.NDArray[np.float64]:
+        """
+        Получить траты категории по периодам
+
+        Parameters
+        ----------
+        category_id - pk категории
+        own - только собственные траты категории, без подкатегорий
+        """
+
+        matrix = self.own if own else self.total
+        row: npt.NDArray[np.float64] = matrix[self.categories.index(category_id)]
+        return row
+
+    def value(self, category_id: int, period: datetime, own: bool = False) -> float:
+        """
+        Получить траты категории за период, содержащий дату period
+        """
+
+        start = period_bounds(self.interval, period)[0]
+        return float(self.row(category_id, own)[self.periods.index(start)])
+
+
+def _period_sums(expenses: AbstractRepository[Expense], interval: str,
+                 where: dict[str, Any]) -> tuple[list[datetime], list[int], list[float]]:
+    """
+    Получить суммы трат по (период, категория) в виде трех списков
+    """
+
+    sum_by_period = getattr(expenses, 'sum_by_period', None)
+    if sum_by_period is not None:
+        # группировка на стороне хранилища
+        sums = sum_by_period(interval, where, by_category=True)
+        return ([start for start, _ in sums], [category for _, category in sums],
+                list(sums.values()))
+    rows = [(e.date, e.category_id, e.amount) for e in expenses.iter_all(where)]
+    dates = np.array([r[0] for r in rows], 'datetime64[us]')
+    starts = bucket_starts(bucket_ids(dates, interval), interval)
+    return (starts.astype('datetime64[us]').tolist(), [r[1] for r in rows],
+            [r[2] for r in rows])
+
+
+def spending_matrix(expenses: AbstractRepository[Expense],
+                    categories: AbstractRepository[Category],
+                    interval: str, start: datetime, end: datetime) -> SpendingMatrix:
+    """
+    Вычислить траты по категориям (с учетом подкатегорий) и периодам
+
+    Parameters
+    ----------
+    expenses - репозиторий расходов
+    categories - репозиторий категорий
+    interval - "День", "Неделя" (с понедельника) или "Месяц"
+    start - дата в первом периоде
+    end - дата в последнем периоде
+
+    Returns
+    -------
+    SpendingMatrix с периодами от периода start до периода end включительно
+    """
+
+    first, last = bucket_id(start, interval), bucket_id(end, interval)
+    ids = np.arange(first, max(last + 1, first))
+    periods = bucket_starts(ids, interval).astype('datetime64[us]').tolist()
+    order = topological_order(categories.get_all())
+    category_ids = [category.pk for category in order]
+    rows = {pk: i for i, pk in enumerate(category_ids)}
+
+    where = {'date': Between(period_bounds(interval, start)[0],
+                             period_bounds(interval, end)[1])}
+    starts, category_column, amounts = _period_sums(expenses, interval, where)
+    columns = bucket_ids(np.array(starts, 'datetime64[us]'), interval) - first
+    category_rows = np.array([rows.get(c, -1) for c in category_column], np.int64)
+    values = np.array(amounts, np.float64)
+
+    own = np.zeros((len(order), len(periods)))
+    known = category_rows >= 0
+    np.add.at(own, (category_rows[known], columns[known]), values[known])
+    unassigned = np.bincount(columns[~known], weights=values[~known],
+                             minlength=len(periods)).astype(np.float64)
+
+    total = own.copy()
+    # от листьев к корням: подкатегория идет в порядке позже родителя,
+    # ссылки назад (цикл в иерархии) не учитываются
+    for category in reversed(order):
+        parent = rows.get(category.parent, len(order))  # type: ignore[arg-type]
+        if parent < rows[category.pk]:
+            total[parent] += total[rows[category.pk]]
+
+    return SpendingMatrix(interval, category_ids, periods, own, total, unassigned)
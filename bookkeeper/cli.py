@@ -0,0 +1,199 @@
+"""
+Команды обслуживания базы данных приложения
+
+python -m bookkeeper.cli rebuild-rollups book_keeper.db
+python -m bookkeeper.cli rebuild-closure book_keeper.db
+python -m bookkeeper.cli sync-categories book_keeper.db categories.txt
+python -m bookkeeper.cli import-csv book_keeper.db statement.csv --delimiter ';'
+python -m bookkeeper.cli import-csv book_keeper.db 2023/*.csv --jobs 8
+"""
+
+from typing import Any, Sequence
+
+import argparse
+import sys
+
+from bookkeeper.csv_import import (CsvMapping, ImportProgress, import_csv,
+                                   import_csv_parallel)
+from bookkeeper.models.budget import Budget
+from bookkeeper.models.category import Category
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.query import In
+from bookkeeper.repository.sqlite_connection import SQLiteConnectionManager
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+from bookkeeper.utils import iter_tree
+
+MODELS: tuple[type[Any], ...] = (Category, Expense, Budget)
+
+
+def rebuild_rollups(args: argparse.Namespace) -> None:
+    """
+    Создать недостающие сводные таблицы и триггеры моделей и пересчитать
+    сводные таблицы по записям (для баз данных, созданных прежними версиями
+    приложения или измененных без триггеров)
+    """
+
+    with SQLiteConnectionManager(args.db_file) as manager:
+        for cls in MODELS:
+            repo = SQLiteRepository(args.db_file, cls, manager)
+            if not repo.rollups:
+                continue
+            with manager.transaction():
+                created = repo.ensure_rollups()
+                repo.rebuild_rollups()
+            for rollup in repo.rollups:
+                name = rollup.table_name(repo.table_name)
+                print(f'{name}: {"created" if name in created else "rebuilt"}')
+
+
+def rebuild_closure(args: argparse.Namespace) -> None:
+    """
+    Создать недостающие таблицы замыкания иерархий моделей и пересчитать
+    их по записям
+    """
+
+    with SQLiteConnectionManager(args.db_file) as manager:
+        for cls in MODELS:
+            repo = SQLiteRepository(args.db_file, cls, manager)
+            if repo.closure is None:
+                continue
+            with manager.transaction():
+                created = repo.ensure_closure()
+                repo.rebuild_closure()
+            name = repo.closure.table_name(repo.table_name)
+            print(f'{name}: {"created" if created else "rebuilt"}')
+
+
+def sync_categories(args: argparse.Namespace) -> None:
+    """
+    Привести дерево категорий к дереву из текстового файла с отступами
+    (см. Category.sync_from_tree). Расходы удаленных категорий удаляются
+    в той же транзакции, как при удалении категории в приложении
+    """
+
+    with SQLiteConnectionManager(args.db_file) as manager:
+        categories = SQLiteRepository(args.db_file, Category, manager)
+        expenses = SQLiteRepository(args.db_file, Expense, manager)
+        categories.create_table()
+        expenses.create_table()
+        deleted: list[int] = []
+
+        def delete_expenses(pks: list[int]) -> None:
+            # расходы удаляются раньше категорий, на которые ссылаются
+            deleted.extend(e.pk for e in expenses.iter_all({'category_id': In(pks)}))
+            if deleted:
+                expenses.delete_many(deleted)
+
+        with open(args.tree_file, encoding='utf-8') as lines:
+            result = Category.sync_from_tree(iter_tree(lines), categories,
+                                             delete_expenses)
+    print(f'added: {len(result.added)}, renamed: {len(result.renamed)}, '
+          f'moved: {len(result.moved)}, deleted: {len(result.deleted)} '
+          f'(expenses deleted: {len(deleted)})')
+
+
+def _column(value: str) -> str | int:
+    # номер столбца или название из заголовка
+    return int(value) if value.isdigit() else value
+
+
+def import_expenses(args: argparse.Namespace) -> None:
+    """
+    Импортировать расходы из CSV файлов порциями с выводом хода импорта
+    в stderr. Несколько файлов или --jobs больше 1 - разбор в пуле процессов
+    """
+
+    mapping = CsvMapping(
+        date=args.date, amount=args.amount, category=args.category,
+        comment=None if args.comment == '' else args.comment,
+        date_format=args.date_format, decimal=args.decimal, thousands=args.thousands,
+        negate=args.negate, delimiter=args.delimiter, header=not args.no_header,
+        encoding=args.encoding, unknown_category=args.unknown_category)
+
+    def report(progress: ImportProgress) -> None:
+        print(f'{progress.rows} rows, {progress.rows_per_second:.0f} rows/s, '
+              f'{(progress.fraction or 0):.0%}', file=sys.stderr)
+
+    with SQLiteConnectionManager(args.db_file) as manager:
+        categories = SQLiteRepository(args.db_file, Category, manager)
+        expenses = SQLiteRepository(args.db_file, Expense, manager)
+        categories.create_table()
+        expenses.create_table()
+        if len(args.csv_file) == 1 and args.jobs == 1:
+            result = import_csv(args.csv_file[0], expenses, categories, mapping,
+                                args.chunk_size, report)
+        else:
+            result = import_csv_parallel(args.csv_file, expenses, categories, mapping,
+                                         args.chunk_size, args.jobs, report)
+    print(f'imported: {result.imported}, skipped: {result.skipped}, '
+          f'{result.elapsed:.1f} s, {result.rows_per_second:.0f} rows/s')
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """
+    Создать разборщик аргументов командной строки
+    """
+
+    parser = argparse.ArgumentParser(prog='bookkeeper', description=__doc__)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    rebuild = commands.add_parser('rebuild-rollups',
+                                  help='пересчитать сводные таблицы')
+    rebuild.add_argument('db_file', help='файл базы данных')
+    rebuild.set_defaults(handler=rebuild_rollups)
+
+    closure = commands.add_parser('rebuild-closure',
+                                  help='пересчитать таблицы замыкания иерархий')
+    closure.add_argument('db_file', help='файл базы данных')
+    closure.set_defaults(handler=rebuild_closure)
+
+    sync = commands.add_parser('sync-categories',
+                               help='синхронизировать дерево категорий с файлом')
+    sync.add_argument('db_file', help='файл базы данных')
+    sync.add_argument('tree_file', help='файл дерева категорий с отступами')
+    sync.set_defaults(handler=sync_categories)
+
+    csv_import = commands.add_parser('import-csv', help='импортировать расходы из CSV')
+    csv_import.add_argument('db_file', help='файл базы данных')
+    csv_import.add_argument('csv_file', nargs='+',
+                            help='CSV файлы, импортируются по порядку')
+    csv_import.add_argument('--date', type=_column, default='date',
+                            help='столбец даты: название или номер с 0')
+    csv_import.add_argument('--amount', type=_column, default='amount',
+                            help='столбец суммы')
+    csv_import.add_argument('--category', type=_column, default='category',
+                            help='столбец названия категории')
+    csv_import.add_argument('--comment', type=_column, default='comment',
+                            help='столбец комментария, пустая строка - нет')
+    csv_import.add_argument('--date-format', help='формат даты strptime '
+                                                  '(по умолчанию ISO 8601)')
+    csv_import.add_argument('--decimal', default='.', help='десятичный разделитель')
+    csv_import.add_argument('--thousands', default='', help='разделитель разрядов')
+    csv_import.add_argument('--negate', action='store_true',
+                            help='менять знак сумм (расходы отрицательные)')
+    csv_import.add_argument('--delimiter', default=',', help='разделитель столбцов')
+    csv_import.add_argument('--no-header', action='store_true',
+                            help='в файле нет строки заголовка')
+    csv_import.add_argument('--encoding', default='utf-8', help='кодировка файла')
+    csv_import.add_argument('--unknown-category', default='error',
+                            choices=('error', 'skip', 'create'),
+                            help='строка с неизвестной категорией')
+    csv_import.add_argument('--chunk-size', type=int, default=10_000,
+                            help='строк в одной транзакции')
+    csv_import.add_argument('--jobs', type=int, default=1,
+                            help='процессов разбора файлов, 0 - по числу ядер')
+    csv_import.set_defaults(handler=import_expenses)
+    return parser
+
+
+def main(argv: Sequence[str] | None = None) -> None:
+    """
+    Выполнить команду, заданную аргументами командной строки
+    """
+
+    args = build_parser().parse_args(argv)
+    args.handler(args)
+
+
+if __name__ == '__main__':
+    main()
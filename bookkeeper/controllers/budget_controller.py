@@ -1,6 +1,7 @@
 # type: ignore
 from PySide6 import QtWidgets, QtCore
 
+from bookkeeper.analytics.budget_engine import BudgetEngine
 from bookkeeper.view.utility_widgets.table_widget import TableWidget
 from bookkeeper.repository.abstract_repository import AbstractRepository
 from bookkeeper.models.budget import Budget
@@ -17,11 +18,14 @@ class BudgetController(QtCore.QObject):
     month_sum_default = 30000
 
     def __init__(self, expenses_repo: AbstractRepository[Expense],
-                 budget_repo: AbstractRepository[Budget]) -> None:
+                 budget_repo: AbstractRepository[Budget],
+                 budget_engine: BudgetEngine | None = None) -> None:
         super().__init__()
         self.expenses_repo: AbstractRepository[Expense] = (
             expenses_repo)
         self.budget_repo = budget_repo
+        self.budget_engine = (budget_engine if budget_engine is not None
+                              else BudgetEngine(expenses_repo))
         self.model: TableWidget | None = None
 
     def set_model(self, model: TableWidget) -> None:
@@ -70,11 +74,16 @@ class BudgetController(QtCore.QObject):
 
     def update_model(self):
         budgets = self.budget_repo.get_all()
+        totals = self.budget_engine.totals()
+        changed = []
         for budget in budgets:
-            budget.update_amount(self.expenses_repo)
+            amount = totals[budget.interval]
+            if budget.amount != amount:
+                budget.amount = amount
+                changed.append(budget)
+        self.budget_repo.update_many(changed)
 
         for i, budget in enumerate(budgets):
-            self.budget_repo.update(budget)
 
             item = QtWidgets.QTableWidgetItem(budget.interval)
             item.setData(QtCore.Qt.ItemDataRole.UserRole, budget.pk)
@@ -3,6 +3,7 @@ from PySide6 import QtGui, QtCore
 
 from bookkeeper.repository.abstract_repository import AbstractRepository
 from bookkeeper.models.category import Category
+from bookkeeper.models.category_tree import CategoryTree
 
 
 class CategoriesController(QtCore.QObject):
@@ -16,6 +17,7 @@ class CategoriesController(QtCore.QObject):
     def __init__(self, categories_repo: AbstractRepository[Category]) -> None:
         super().__init__()
         self.repo = categories_repo
+        self.tree = CategoryTree.from_repository(categories_repo)
         self.model = None
 
     def set_model(self, model: QtGui.QStandardItemModel) -> None:
@@ -51,10 +53,10 @@ class CategoriesController(QtCore.QObject):
         if not self.model:
             raise ValueError('model has not been set')
 
-        all_categories = self.repo.get_all()
-
         categories_dict = dict()
-        for category in all_categories:
+        # обход дерева: родитель всегда раньше подкатегорий
+        for pk in self.tree.walk():
+            category = self.tree.get(pk)
             item = QtGui.QStandardItem(category.name)
             item.setData(category.pk)
 
@@ -76,6 +78,7 @@ class CategoriesController(QtCore.QObject):
         """
 
         self.repo.add(c)
+        self.tree.add(c)
 
     def update_category_name(self, pk: int, name: str) -> None:
         """
@@ -90,6 +93,7 @@ class CategoriesController(QtCore.QObject):
         new_category = self.repo.get(pk)
         new_category.name = name
         self.repo.update(new_category)
+        self.tree.rename(pk, name)
 
     def get_current_category_id(self, idx: QtCore.QModelIndex) -> int | None:
         """
@@ -135,7 +139,8 @@ class CategoriesController(QtCore.QObject):
         """
         Полностью удалить категорию из модели. Использует сигнал
         к ExpensesController для удаления всех затрат
-        данной категории и всех подкатегорий
+        данной категории и всех подкатегорий. Все изменения
+        выполняются в одной транзакции
 
         Parameters
         ----------
@@ -147,11 +152,14 @@ class CategoriesController(QtCore.QObject):
 
         item = self.model.itemFromIndex(idx)
 
-        category = self.repo.get(item.data())
-        all_categories = list(category.get_subcategories(self.repo)) + [category]
-        for subcategory in all_categories:
-            self.delete_expense_signal.emit(subcategory.pk)
-            self.repo.delete(subcategory.pk)
+        # репозитории одного файла SQLite разделяют соединение для записи,
+        # поэтому удаление расходов по сигналу входит в ту же транзакцию
+        with self.repo.transaction():
+            subtree = self.tree.subtree_ids(item.data())
+            for pk in subtree:
+                self.delete_expense_signal.emit(pk)
+            self.repo.delete_many(subtree)
+        self.tree.remove(item.data())
 
         self.model.removeRow(idx.row(), idx.parent())
 
@@ -1,7 +1,12 @@
 # type: ignore
+from typing import Callable
+
 from PySide6 import QtWidgets, QtGui, QtCore
 
+from bookkeeper.analytics.budget_engine import BudgetEngine
+from bookkeeper.csv_import import CsvMapping, ImportProgress, import_csv
 from bookkeeper.repository.abstract_repository import AbstractRepository
+from bookkeeper.repository.query import Query
 from bookkeeper.models.expense import Expense
 from bookkeeper.models.category import Category
 from bookkeeper.view.utility_widgets.table_widget import TableWidget
@@ -15,10 +20,13 @@ class ExpensesController(QtCore.QObject):
     update_budget_model_signal = QtCore.Signal()
 
     def __init__(self, expenses_repo: AbstractRepository[Expense],
-                 categories_repo: AbstractRepository[Category]) -> None:
+                 categories_repo: AbstractRepository[Category],
+                 budget_engine: BudgetEngine | None = None) -> None:
         super().__init__()
         self.expenses_repo = expenses_repo
         self.categories_repo = categories_repo
+        # изменения расходов через движок сразу учитываются в суммах бюджетов
+        self.budget_engine = budget_engine
         self.model = None
 
     def set_model(self, model: TableWidget) -> None:
@@ -56,7 +64,10 @@ class ExpensesController(QtCore.QObject):
         e - новая затрата
         """
 
-        self.expenses_repo.add(e)
+        if self.budget_engine is not None:
+            self.budget_engine.add(e)
+        else:
+            self.expenses_repo.add(e)
 
     def update_expense(self, e: Expense) -> None:
         """
@@ -68,7 +79,10 @@ class ExpensesController(QtCore.QObject):
         e - обновленная затрата
         """
 
-        self.expenses_repo.update(e)
+        if self.budget_engine is not None:
+            self.budget_engine.update(e)
+        else:
+            self.expenses_repo.update(e)
 
     def update_model(self) -> None:
         """
@@ -76,8 +90,8 @@ class ExpensesController(QtCore.QObject):
         """
 
         last_count = 20
-        all_expenses = self.expenses_repo.get_all()[:last_count]
-        all_expenses.sort(key=lambda e: e.date, reverse=True)
+        all_expenses = self.expenses_repo.find(
+            Query(order_by=('-date', '-pk'), limit=last_count))
         self.model.setRowCount(len(all_expenses))
 
         for row, expense in enumerate(all_expenses):
@@ -98,7 +112,10 @@ class ExpensesController(QtCore.QObject):
         pk - ключ затраты из репозитория
         """
         try:
-            self.expenses_repo.delete(pk)
+            if self.budget_engine is not None:
+                self.budget_engine.delete(pk)
+            else:
+                self.expenses_repo.delete(pk)
         except KeyError:
             pass
 
@@ -112,3 +129,27 @@ class ExpensesController(QtCore.QObject):
         """
 
         Expense.delete_expenses_of_category(self.expenses_repo, category_id)
+
+    def import_csv(self, path: str, mapping: CsvMapping = CsvMapping(),
+                   progress: Callable[[ImportProgress], None] | None = None
+                   ) -> ImportProgress:
+        """
+        Импортировать расходы из CSV файла порциями, каждая порция -
+        одна транзакция (см. bookkeeper.csv_import.import_csv).
+        Суммы бюджетов пересчитываются при следующем обращении
+
+        Parameters
+        ----------
+        path - путь к CSV файлу
+        mapping - соответствие столбцов файла полям расхода
+        progress - функция, вызываемая после записи каждой порции
+
+        Returns
+        -------
+        Итоговый ImportProgress
+        """
+
+        result = import_csv(path, self.expenses_repo, self.categories_repo,
+                            mapping, progress=progress)
+        self.update_model()
+        return result
@@ -0,0 +1,539 @@
+"""
+Модуль описывает потоковый импорт расходов из CSV файла (выписки банка)
+
+Файл читается построчно и обрабатывается порциями по chunk_size строк:
+даты и суммы порции разбираются вместе (каждая различная строка даты -
+один раз), названия категорий переводятся в pk через кэш, а порция
+записывается одним add_many в одной транзакции. Одновременно в памяти
+находится одна порция, поэтому потребление памяти не зависит от размера
+файла. После каждой порции вызывается функция progress.
+
+import_csv_parallel разбирает порции одного или нескольких файлов
+в пуле процессов, а записывает их в SQLiteRepository один процесс
+(вызывающий) в порядке файлов и строк, поэтому pk назначаются так же,
+как при последовательном импорте, и запись не конкурирует за блокировку
+базы данных.
+"""
+
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+from itertools import islice
+from typing import IO, Any, Callable, Iterable, Iterator, Literal, Sequence, TypeVar
+
+import csv
+import io
+import os
+import time
+
+from bookkeeper.models.category import Category
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.abstract_repository import AbstractRepository
+from bookkeeper.repository.sqlite_mapper import encode_value
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+
+R = TypeVar('R')
+
+Columns = tuple[int, int, int, int | None]
+
+
+@dataclass(frozen=True)
+class CsvMapping:
+    """
+    Соответствие столбцов CSV файла полям расхода. Столбец задается
+    названием из строки заголовка или номером (с 0).
+    date, amount, category - столбцы даты, суммы и названия категории
+    comment - столбец комментария (None - нет)
+    date_format - формат даты для strptime (None - ISO 8601)
+    decimal - десятичный разделитель суммы
+    thousands - разделитель разрядов суммы
+    negate - менять знак суммы (расходы в выписке отрицательные)
+    delimiter - разделитель столбцов
+    header - первая строка файла - заголовок
+    encoding - кодировка файла
+    unknown_category - строка с неизвестной категорией: 'error' - ValueError,
+    'skip' - пропустить, 'create' - создать категорию верхнего уровня
+    """
+    date: str | int = 'date'
+    amount: str | int = 'amount'
+    category: str | int = 'category'
+    comment: str | int | None = 'comment'
+    date_format: str | None = None
+    decimal: str = '.'
+    thousands: str = ''
+    negate: bool = False
+    delimiter: str = ','
+    header: bool = True
+    encoding: str = 'utf-8'
+    unknown_category: Literal['error', 'skip', 'create'] = 'error'
+
+    def column_indexes(self, header: list[str] | None) -> Columns:
+        """
+        Получить номера столбцов даты, суммы, категории и комментария
+
+        Parameters
+        ----------
+        header - строка заголовка (None - файл без заголовка)
+        """
+
+        def index(column: str | int) -> int:
+            if isinstance(column, int):
+                return column
+            if header is None:
+                raise ValueError(f'column {column!r} requires a header row')
+            if column not in header:
+                raise ValueError(f'column {column!r} is not in the header {header}')
+            return header.index(column)
+
+        return (index(self.date), index(self.amount), index(self.category),
+                None if self.comment is None else index(self.comment))
+
+
+@dataclass
+class ImportProgress:
+    """
+    Ход импорта.
+    rows - прочитано строк данных
+    imported - добавлено расходов
+    skipped - пропущено строк (пустых или с неизвестной категорией)
+    bytes_read - прочитано байт файла
+    total_bytes - размер файла (None - неизвестен)
+    elapsed - время от начала импорта в секундах
+    """
+    rows: int = 0
+    imported: int = 0
+    skipped: int = 0
+    bytes_read: int = 0
+    total_bytes: int | None = None
+    elapsed: float = 0.0
+    started: float = field(default_factory=time.perf_counter, repr=False)
+
+    @property
+    def rows_per_second(self) -> float:
+        """ Скорость импорта в строках в секунду """
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def fraction(self) -> float | None:
+        """ Доля прочитанного файла (None, если размер неизвестен) """
+        if not self.total_bytes:
+            return None
+        return min(self.bytes_read / self.total_bytes, 1.0)
+
+
+class CategoryResolver:
+    """
+    Кэш "название категории - pk". Название ищется в репозитории один раз,
+    как в CategoriesController.get_category_by_name (при нескольких
+    категориях с одним названием - первая найденная). Если create,
+    отсутствующие категории создаются на верхнем уровне
+    """
+
+    def __init__(self, repo: AbstractRepository[Category], create: bool = False) -> None:
+        self.repo = repo
+        self.create = create
+        self._pks: dict[str, int | None] = {}
+
+    def resolve(self, name: str) -> int | None:
+        """
+        Получить pk категории по названию или None, если ее нет
+        """
+
+        if name in self._pks:
+            return self._pks[name]
+        categories = self.repo.get_all({'name': name})
+        pk = categories[0].pk if categories else None
+        if pk is None and self.create:
+            pk = self.repo.add(Category(name))
+        self._pks[name] = pk
+        return pk
+
+
+def _counted_lines(file: IO[bytes], encoding: str,
+                   progress: ImportProgress) -> Iterator[str]:
+    # строки файла с концами строк, как при open(..., newline=''),
+    # с учетом прочитанных байт
+    for line in file:
+        progress.bytes_read += len(line)
+        yield line.decode(encoding)
+
+
+def iter_chunks(rows: Iterable[R], chunk_size: int) -> Iterator[list[R]]:
+    """
+    Разбить поток записей на порции по chunk_size записей
+    """
+
+    if chunk_size < 1:
+        raise ValueError('`chunk_size` must be positive')
+    iterator = iter(rows)
+    while chunk := list(islice(iterator, chunk_size)):
+        yield chunk
+
+
+def _parse_dates(values: list[str], date_format: str | None) -> list[datetime]:
+    # каждая различная строка разбирается один раз
+    parse: Callable[[str], datetime] = (
+        datetime.fromisoformat if date_format is None
+        else lambda value: datetime.strptime(value, date_format))
+    parsed = {value: parse(value) for value in set(values)}
+    return [parsed[value] for value in values]
+
+
+def _parse_amounts(values: list[str], mapping: CsvMapping) -> list[float]:
+    replacements = {mapping.decimal: '.', ' ': None, '\xa0': None}
+    if mapping.thousands:
+        replacements[mapping.thousands] = None
+    table = str.maketrans(replacements)
+    sign = -1.0 if mapping.negate else 1.0
+    return [sign * float(value.translate(table)) for value in values]
+
+
+@dataclass
+class ParsedRows:
+    """
+    Порция записей CSV файла, разобранная по столбцам.
+    rows - количество записей в порции, включая пустые
+    numbers - номера непустых записей в файле
+    dates, amounts, comments - столбцы расходов непустых записей
+    categories - названия категорий непустых записей
+    """
+    rows: int
+    numbers: list[int]
+    dates: list[datetime]
+    amounts: list[float]
+    categories: list[str]
+    comments: list[str]
+
+
+def parse_rows(chunk: list[list[str]], columns: Columns, mapping: CsvMapping,
+               first_row: int = 1) -> ParsedRows:
+    """
+    Разобрать порцию записей CSV файла по столбцам без обращения
+    к репозиториям. Пустые записи пропускаются, ошибки разбора -
+    ValueError с номером записи
+
+    Parameters
+    ----------
+    chunk - записи CSV файла, разбитые на столбцы
+    columns - номера столбцов (CsvMapping.column_indexes)
+    mapping - соответствие столбцов
+    first_row - номер первой записи порции в файле
+    """
+
+    date, amount, category, comment = columns
+    width = max(c for c in columns if c is not None) + 1
+    numbers: list[int] = []
+    rows: list[list[str]] = []
+    for number, row in enumerate(chunk, first_row):
+        if not any(value.strip() for value in row):
+            continue
+        if len(row) < max(date, amount, category) + 1:
+            raise ValueError(f'row {number}: expected {width} columns, got {len(row)}')
+        numbers.append(number)
+        rows.append(row)
+
+    dates = [row[date].strip() for row in rows]
+    amounts = [row[amount] for row in rows]
+    try:
+        parsed_dates = _parse_dates(dates, mapping.date_format)
+        parsed_amounts = _parse_amounts(amounts, mapping)
+    except ValueError:
+        # порция разбирается целиком, ошибочная запись ищется только при ошибке
+        for number, row in zip(numbers, rows):
+            try:
+                _parse_dates([row[date].strip()], mapping.date_format)
+                _parse_amounts([row[amount]], mapping)
+            except ValueError as error:
+                raise ValueError(f'row {number}: {error}') from None
+        raise
+    comments = ([row[comment] if comment < len(row) else '' for row in rows]
+                if comment is not None else [''] * len(rows))
+    return ParsedRows(len(chunk), numbers, parsed_dates, parsed_amounts,
+                      [row[category].strip() for row in rows], comments)
+
+
+def _category_ids(names: list[str], numbers: list[int], resolver: CategoryResolver,
+                  mapping: CsvMapping) -> tuple[list[int], list[int] | None]:
+    # pk категорий и индексы оставляемых записей (None - все записи)
+    resolve = resolver.resolve
+    found = [resolve(name) for name in names]
+    if None not in found:
+        return [pk for pk in found if pk is not None], None
+    if mapping.unknown_category != 'skip':
+        i = found.index(None)
+        raise ValueError(f'row {numbers[i]}: unknown category {names[i]!r}')
+    keep = [i for i, pk in enumerate(found) if pk is not None]
+    return [pk for pk in found if pk is not None], keep
+
+
+def _select(values: list[R], keep: list[int] | None) -> list[R]:
+    return values if keep is None else [values[i] for i in keep]
+
+
+def parse_chunk(chunk: list[list[str]], columns: Columns, mapping: CsvMapping,
+                resolver: CategoryResolver, first_row: int = 1
+                ) -> tuple[list[Expense], int]:
+    """
+    Разобрать порцию записей CSV файла в расходы. Пустые записи
+    и записи с неизвестной категорией при unknown_category = 'skip'
+    пропускаются, остальные ошибки - ValueError с номером записи
+
+    Parameters
+    ----------
+    chunk - записи CSV файла, разбитые на столбцы
+    columns - номера столбцов (CsvMapping.column_indexes)
+    mapping - соответствие столбцов
+    resolver - кэш категорий
+    first_row - номер первой записи порции в файле
+
+    Returns
+    -------
+    Пара (расходы, количество пропущенных записей)
+    """
+
+    parsed = parse_rows(chunk, columns, mapping, first_row)
+    category_ids, keep = _category_ids(parsed.categories, parsed.numbers,
+                                       resolver, mapping)
+    expenses = [Expense(*values) for values in zip(
+        _select(parsed.dates, keep), _select(parsed.amounts, keep),
+        category_ids, _select(parsed.comments, keep))]
+    return expenses, parsed.rows - len(expenses)
+
+
+def import_csv(path: str, expenses: AbstractRepository[Expense],
+               categories: AbstractRepository[Category],
+               mapping: CsvMapping = CsvMapping(), chunk_size: int = 10_000,
+               progress: Callable[[ImportProgress], None] | None = None
+               ) -> ImportProgress:
+    """
+    Импортировать расходы из CSV файла. Каждая порция записывается в своей
+    транзакции: при ошибке в строке файла порции до нее остаются записанными
+
+    Parameters
+    ----------
+    path - путь к CSV файлу
+    expenses - репозиторий расходов
+    categories - репозиторий категорий
+    mapping - соответствие столбцов
+    chunk_size - количество строк в порции
+    progress - функция, вызываемая после записи каждой порции
+
+    Returns
+    -------
+    Итоговый ImportProgress
+    """
+
+    resolver = CategoryResolver(categories, mapping.unknown_category == 'create')
+    state = ImportProgress(total_bytes=os.path.getsize(path))
+    with open(path, 'rb') as file:
+        rows = csv.reader(_counted_lines(file, mapping.encoding, state),
+                          delimiter=mapping.delimiter)
+        header = next(rows, None) if mapping.header else None
+        if header:
+            header[0] = header[0].lstrip('\ufeff')
+        columns = mapping.column_indexes(header)
+        first_row = 2 if mapping.header else 1
+        for chunk in iter_chunks(rows, chunk_size):
+            with expenses.transaction():
+                batch, skipped = parse_chunk(chunk, columns, mapping, resolver,
+                                             first_row + state.rows)
+                expenses.add_many(batch)
+            state.rows += len(chunk)
+            state.imported += len(batch)
+            state.skipped += skipped
+            state.elapsed = time.perf_counter() - state.started
+            if progress is not None:
+                progress(state)
+    state.elapsed = time.perf_counter() - state.started
+    return state
+
+
+@dataclass
+class EncodedRows:
+    """
+    Порция записей, разобранная процессом пула: столбцы date, amount
+    и comment в формате хранения SQLiteRepository и названия категорий.
+    rows, numbers, categories - как в ParsedRows
+    """
+    rows: int
+    numbers: list[int]
+    categories: list[str]
+    columns: dict[str, list[Any]]
+
+
+def _records(file: IO[bytes], quotechar: bytes = b'"') -> Iterator[bytes]:
+    # записи файла без разбора на столбцы: строка, в которой не закрыто
+    # поле в кавычках, продолжается следующей строкой
+    parts: list[bytes] = []
+    quoted = False
+    for line in file:
+        if line.count(quotechar) % 2:
+            quoted = not quoted
+        if quoted:
+            parts.append(line)
+        elif parts:
+            parts.append(line)
+            yield b''.join(parts)
+            parts = []
+        else:
+            yield line
+    if parts:
+        yield b''.join(parts)
+
+
+def _split(data: bytes, mapping: CsvMapping) -> list[list[str]]:
+    text = data.decode(mapping.encoding)
+    return list(csv.reader(io.StringIO(text, newline=''), delimiter=mapping.delimiter))
+
+
+def _parse_block(data: bytes, columns: Columns, mapping: CsvMapping,
+                 first_row: int) -> EncodedRows:
+    # выполняется в процессе пула
+    parsed = parse_rows(_split(data, mapping), columns, mapping, first_row)
+    encoded = {value: encode_value(value) for value in set(parsed.dates)}
+    return EncodedRows(parsed.rows, parsed.numbers, parsed.categories, {
+        'date': [encoded[value] for value in parsed.dates],
+        'amount': parsed.amounts,
+        'comment': parsed.comments,
+    })
+
+
+def _blocks(path: str, mapping: CsvMapping, chunk_size: int
+            ) -> Iterator[tuple[bytes, Columns, int, int]]:
+    # порции файла: (байты записей, номера столбцов, номер первой записи,
+    # прочитано байт файла, включая заголовок)
+    with open(path, 'rb') as file:
+        records = _records(file)
+        header: list[str] | None = None
+        if mapping.header:
+            first = next(records, None)
+            rows = _split(first, mapping) if first is not None else []
+            header = rows[0] if rows else []
+            if header:
+                header[0] = header[0].lstrip('\ufeff')
+        try:
+            columns = mapping.column_indexes(header)
+        except ValueError as error:
+            raise ValueError(f'{path}: {error}') from None
+        first_row = 2 if mapping.header else 1
+        position = 0
+        for chunk in iter_chunks(records, chunk_size):
+            yield b''.join(chunk), columns, first_row, file.tell() - position
+            first_row += len(chunk)
+            position = file.tell()
+
+
+class _OrderedWriter:
+    """
+    Единственный писатель import_csv_parallel: записывает порции,
+    разобранные пулом процессов, в порядке их отправки в пул
+    """
+
+    def __init__(self, expenses: SQLiteRepository[Expense], resolver: CategoryResolver,
+                 mapping: CsvMapping, state: ImportProgress,
+                 progress: Callable[[ImportProgress], None] | None) -> None:
+        self.expenses = expenses
+        self.resolver = resolver
+        self.mapping = mapping
+        self.state = state
+        self.progress = progress
+        self.pending: deque[tuple[str, int, Future[EncodedRows]]] = deque()
+
+    def push(self, path: str, size: int, future: Future[EncodedRows]) -> None:
+        """
+        Добавить порцию в очередь записи
+
+        Parameters
+        ----------
+        path - путь к файлу порции
+        size - прочитано байт файла для порции
+        future - результат разбора порции
+        """
+
+        self.pending.append((path, size, future))
+
+    def write_next(self) -> None:
+        """
+        Дождаться разбора первой порции очереди и записать ее
+        в одной транзакции
+        """
+
+        path, size, future = self.pending.popleft()
+        try:
+            batch = future.result()
+            with self.expenses.transaction():
+                category_ids, keep = _category_ids(batch.categories, batch.numbers,
+                                                   self.resolver, self.mapping)
+                columns = {name: _select(values, keep)
+                           for name, values in batch.columns.items()}
+                columns['category_id'] = category_ids
+                self.expenses.add_columns(columns)
+        except ValueError as error:
+            raise ValueError(f'{path}: {error}') from None
+        state = self.state
+        state.rows += batch.rows
+        state.imported += len(category_ids)
+        state.skipped += batch.rows - len(category_ids)
+        state.bytes_read += size
+        state.elapsed = time.perf_counter() - state.started
+        if self.progress is not None:
+            self.progress(state)
+
+    def flush(self) -> None:
+        """
+        Записать все порции очереди
+        """
+
+        while self.pending:
+            self.write_next()
+
+
+def import_csv_parallel(paths: Sequence[str], expenses: SQLiteRepository[Expense],
+                        categories: AbstractRepository[Category],
+                        mapping: CsvMapping = CsvMapping(), chunk_size: int = 10_000,
+                        workers: int | None = None,
+                        progress: Callable[[ImportProgress], None] | None = None
+                        ) -> ImportProgress:
+    """
+    Импортировать расходы из CSV файлов, разбирая порции в workers
+    процессах. Порции записываются вызывающим процессом по одной
+    транзакции на порцию в порядке файлов и записей, поэтому результат
+    и pk расходов совпадают с последовательным импортом файлов import_csv.
+    Поля в кавычках могут содержать переводы строк, но кавычки вне таких
+    полей не допускаются (запись ищется по четности числа кавычек)
+
+    Parameters
+    ----------
+    paths - пути к CSV файлам
+    expenses - репозиторий расходов
+    categories - репозиторий категорий
+    mapping - соответствие столбцов (одно для всех файлов)
+    chunk_size - количество записей в порции
+    workers - количество процессов (None - по числу ядер процессора)
+    progress - функция, вызываемая после записи каждой порции
+
+    Returns
+    -------
+    Итоговый ImportProgress
+    """
+
+    state = ImportProgress(total_bytes=sum(os.path.getsize(path) for path in paths))
+    resolver = CategoryResolver(categories, mapping.unknown_category == 'create')
+    writer = _OrderedWriter(expenses, resolver, mapping, state, progress)
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(workers) as executor:
+        try:
+            for path in paths:
+                for data, columns, first_row, size in _blocks(path, mapping, chunk_size):
+                    writer.push(path, size, executor.submit(
+                        _parse_block, data, columns, mapping, first_row))
+                    # в памяти не больше двух порций на процесс
+                    if len(writer.pending) >= 2 * workers:
+                        writer.write_next()
+            writer.flush()
+        except BaseException:
+            executor.shutdown(cancel_futures=True)
+            raise
+    state.elapsed = time.perf_counter() - state.started
+    return state
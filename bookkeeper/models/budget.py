@@ -4,12 +4,69 @@
 
 from dataclasses import dataclass
 from typing import Literal
-from datetime import datetime
+from datetime import datetime, timedelta
 
+from bookkeeper.analytics.fenwick import DailySpendIndex
 from bookkeeper.repository.abstract_repository import AbstractRepository
+from bookkeeper.repository.query import Between
 from bookkeeper.models.expense import Expense
 
 
+def period_bounds(interval: str, current_date: datetime) -> tuple[datetime, datetime]:
+    """
+    Получить границы периода ("День", "Неделя" или "Месяц"),
+    содержащего дату current_date. Неделя начинается с понедельника
+
+    Returns
+    -------
+    Пара (начало периода, последний момент периода) включительно
+    """
+
+    start = datetime(current_date.year, current_date.month, current_date.day)
+    if interval == 'День':
+        end = start + timedelta(days=1)
+    elif interval == 'Неделя':
+        start -= timedelta(days=start.weekday())
+        end = start + timedelta(days=7)
+    elif interval == 'Месяц':
+        start = start.replace(day=1)
+        end = (start + timedelta(days=31)).replace(day=1)
+    else:
+        raise KeyError(f'unknown interval {interval}')
+
+    return start, end - timedelta(microseconds=1)
+
+
+def rolling_bounds(days: int, current_date: datetime) -> tuple[datetime, datetime]:
+    """
+    Получить границы скользящего окна из days последних дней,
+    включая день current_date
+
+    Returns
+    -------
+    Пара (начало окна, последний момент окна) включительно
+    """
+
+    if days < 1:
+        raise ValueError('`days` must be positive')
+    _, end = period_bounds('День', current_date)
+    start = datetime(current_date.year, current_date.month, current_date.day)
+    return start - timedelta(days=days - 1), end
+
+
+def year_to_date_bounds(current_date: datetime) -> tuple[datetime, datetime]:
+    """
+    Получить границы периода с начала года по день current_date включительно
+
+    Returns
+    -------
+    Пара (начало периода, последний момент периода) включительно
+    """
+
+    _, end = period_bounds('День', current_date)
+    return datetime(current_date.year, 1, 1), end
+
+
 @dataclass(slots=True)
 class Budget:
     """
@@ -24,32 +81,33 @@ class Budget:
 
     def update_amount(self, repo: AbstractRepository[Expense]) -> None:
         """
-        Обновить траты за выбранный интервал на основе репозитория затрат
+        Обновить траты за выбранный интервал на основе репозитория затрат.
+        Сумма вычисляется репозиторием по диапазону дат
 
         Parameters
         ----------
         repo - репозиторий с затратами
         """
 
-        if self.interval == 'День':
-            def comparator(x: datetime, y: datetime) -> bool:
-                return (x.year == y.year and x.month == y.month
-                        and x.day == y.day)
-        elif self.interval == 'Неделя':
-            def comparator(x: datetime, y: datetime) -> bool:
-                return (x.year == y.year and
-                        x.isocalendar().week == y.isocalendar().week)
-        elif self.interval == 'Месяц':
-            def comparator(x: datetime, y: datetime) -> bool:
-                return x.year == y.year and x.month == y.month
-        else:
-            raise KeyError(f'unknown interval {self.interval}')
-
-        current_date = datetime.today()
-        all_expenses = repo.get_all()
-        last_expenses = []
-        for expense in all_expenses:
-            if comparator(expense.date, current_date):
-                last_expenses.append(expense)
-
-        self.amount = sum([e.amount for e in last_expenses])
+        start, end = period_bounds(self.interval, datetime.today())
+        self.amount = repo.aggregate('sum', 'amount', where={'date': Between(start, end)})
+
+    def update_amount_from_index(self, index: DailySpendIndex,
+                                 window: tuple[datetime, datetime] | None = None,
+                                 category_id: int | None = None) -> None:
+        """
+        Обновить траты по индексу дневных трат за O(log n).
+        Окно может быть любым: скользящие 30 дней (rolling_bounds),
+        расчетный период, год (year_to_date_bounds) и т.п.
+
+        Parameters
+        ----------
+        index - индекс дневных трат
+        window - первый и последний день окна (по умолчанию - текущий
+        интервал бюджета)
+        category_id - учитывать только расходы категории
+        """
+
+        if window is None:
+            window = period_bounds(self.interval, datetime.today())
+        self.amount = index.range_sum(*window, category_id=category_id)
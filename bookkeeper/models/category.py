@@ -1,11 +1,13 @@
 """
 Модель категории расходов
 """
-from collections import defaultdict
 from dataclasses import dataclass
-from typing import Iterator
+from typing import Callable, Iterable, Iterator
 
 from ..repository.abstract_repository import AbstractRepository
+from ..repository.closure import Closure
+from ..repository.index import Index
+from .category_sync import TreeSync, sync_tree
 
 
 @dataclass
@@ -15,6 +17,9 @@ class Category:
     родителя (категория, подкатегорией которой является данная) в атрибуте parent.
     У категорий верхнего уровня parent = None
     """
+    db_indexes = (Index(('parent',)), Index(('name',)))
+    db_closure = Closure('parent')
+
     name: str
     parent: int | None = None
     pk: int = 0
@@ -55,7 +60,7 @@ class Category:
         if parent is None:
             return
         yield parent
-        yield from parent.get_all_parents(repo)
+        yield from repo.ancestors(parent.pk)
 
     def get_subcategories(self,
                           repo: AbstractRepository['Category']
@@ -70,20 +75,10 @@ class Category:
 
         Yields
         -------
-        Объекты Category, являющиеся подкатегориями разного уровня ниже данной.
+        Объекты Category, являющиеся подкатегориями разного уровня ниже данной,
+        по уровням иерархии.
         """
-
-        def get_children(graph: dict[int | None, list['Category']],
-                         root: int) -> Iterator['Category']:
-            """ dfs in graph from root """
-            for x in graph[root]:
-                yield x
-                yield from get_children(graph, x.pk)
-
-        subcats = defaultdict(list)
-        for cat in repo.get_all():
-            subcats[cat.parent].append(cat)
-        return get_children(subcats, self.pk)
+        yield from repo.descendants(self.pk)
 
     @classmethod
     def create_from_tree(
@@ -111,8 +106,53 @@ class Category:
         Список созданных объектов Category
         """
         created: dict[str, Category] = {}
+        depths: dict[str, int] = {}
+        levels: list[list[tuple[Category, str | None]]] = []
         for child, parent in tree:
-            cat = cls(child, created[parent].pk if parent is not None else None)
-            repo.add(cat)
+            depth = depths[parent] + 1 if parent is not None else 0
+            if depth == len(levels):
+                levels.append([])
+            cat = cls(child)
+            levels[depth].append((cat, parent))
             created[child] = cat
+            depths[child] = depth
+
+        # уровень дерева добавляется одной пачкой, когда ключи родителей известны
+        for level in levels:
+            for cat, parent in level:
+                cat.parent = created[parent].pk if parent is not None else None
+            repo.add_many(cat for cat, _ in level)
         return list(created.values())
+
+    @classmethod
+    def sync_from_tree(cls, paths: Iterable[tuple[str, ...]],
+                       repo: AbstractRepository['Category'],
+                       before_delete: Callable[[list[int]], None] | None = None
+                       ) -> TreeSync['Category']:
+        """
+        Привести дерево категорий репозитория к дереву paths, сохраняя pk
+        категорий, которые остались в дереве (и ссылающиеся на них расходы).
+        Категории сопоставляются по пути от верхнего уровня:
+        - совпадающий путь - категория не меняется;
+        - название, единственное среди несопоставленных категорий
+          и репозитория, и дерева, - перенос к новому родителю;
+        - единственная несопоставленная подкатегория родителя и в репозитории,
+          и в дереве - переименование.
+        Остальные категории дерева добавляются, остальные категории
+        репозитория удаляются. Изменения выполняются в одной транзакции
+        пачками: delete_many, add_many по уровням дерева, update_many.
+        Расходы удаленных категорий не удаляются: при проверке внешних ключей
+        их нужно удалить или перенести в before_delete
+
+        Parameters
+        ----------
+        paths - пути категорий в порядке обхода в глубину (bookkeeper.utils.iter_tree)
+        repo - репозиторий категорий
+        before_delete - вызывается в той же транзакции со списком pk удаляемых
+                        категорий до их удаления
+
+        Returns
+        -------
+        Объект TreeSync с внесенными изменениями
+        """
+        return sync_tree(paths, repo, cls, before_delete)
@@ -0,0 +1,260 @@
+"""
+Синхронизация дерева категорий репозитория с деревом путей
+(Category.sync_from_tree): разбор путей, сопоставление категорий
+и применение изменений
+"""
+from collections import Counter
+from copy import copy
+from dataclasses import dataclass, field
+from typing import Callable, Generic, Iterable, Protocol, TypeVar
+
+from ..repository.abstract_repository import AbstractRepository
+
+
+class Node(Protocol):  # pylint: disable=too-few-public-methods
+    """
+    Категория дерева: название, ссылка на родителя и pk
+    """
+    name: str
+    parent: int | None
+    pk: int
+
+
+C = TypeVar('C', bound=Node)
+
+
+@dataclass
+class TreeSync(Generic[C]):
+    """
+    Изменения, внесенные Category.sync_from_tree.
+    added - добавленные категории
+    renamed - переименованные категории
+    moved - категории, перенесенные к другому родителю
+    deleted - pk удаленных категорий
+    """
+    added: list[C] = field(default_factory=list)
+    renamed: list[C] = field(default_factory=list)
+    moved: list[C] = field(default_factory=list)
+    deleted: list[int] = field(default_factory=list)
+
+
+@dataclass
+class _Tree:
+    """
+    Новое дерево: названия, индексы родителей и глубины узлов в порядке
+    обхода, индексы подкатегорий узлов (None - верхний уровень)
+    """
+    names: list[str] = field(default_factory=list)
+    parents: list[int | None] = field(default_factory=list)
+    depths: list[int] = field(default_factory=list)
+    children: dict[int | None, list[int]] = field(default_factory=lambda: {None: []})
+
+    def levels(self, skip: Iterable[int]) -> list[list[int]]:
+        """
+        Узлы, кроме skip, сгруппированные по глубине
+        """
+        skipped = set(skip)
+        levels: list[list[int]] = []
+        for node, depth in enumerate(self.depths):
+            if node not in skipped:
+                levels.extend([] for _ in range(depth + 1 - len(levels)))
+                levels[depth].append(node)
+        return levels
+
+
+def parse_paths(paths: Iterable[tuple[str, ...]]) -> _Tree:
+    """
+    Прочитать дерево из путей в порядке обхода в глубину.
+    Если родитель не предшествует пути непосредственно в обходе,
+    выбрасывается ValueError
+    """
+    tree = _Tree()
+    stack: list[int] = []
+    for path in paths:
+        del stack[len(path) - 1:]
+        if len(stack) != len(path) - 1 or \
+                stack and tree.names[stack[-1]] != path[-2]:
+            raise ValueError(f'parent of {path} precedes it in the tree')
+        node, parent = len(tree.names), stack[-1] if stack else None
+        tree.children[parent].append(node)
+        tree.children[node] = []
+        stack.append(node)
+        tree.names.append(path[-1])
+        tree.parents.append(parent)
+        tree.depths.append(len(path) - 1)
+    return tree
+
+
+class _Stored(Generic[C]):
+    """
+    Категории репозитория по pk, по родителю, по паре (родитель, название)
+    и по названию. Ссылка на отсутствующую категорию - категория
+    верхнего уровня
+    """
+
+    def __init__(self, categories: Iterable[C]):
+        self.categories = {c.pk: c for c in categories}
+        self.by_parent: dict[int | None, list[int]] = {}
+        self.by_key: dict[tuple[int | None, str], list[int]] = {}
+        self.by_name: dict[str, list[int]] = {}
+        for pk in sorted(self.categories):
+            category = self.categories[pk]
+            parent = category.parent if category.parent in self.categories else None
+            self.by_parent.setdefault(parent, []).append(pk)
+            self.by_key.setdefault((parent, category.name), []).append(pk)
+            self.by_name.setdefault(category.name, []).append(pk)
+
+
+class _Matcher(Generic[C]):
+    """
+    Сопоставление узлов нового дерева категориям репозитория:
+    по пути, затем переносы по однозначному названию, затем
+    переименования единственной несопоставленной подкатегории
+    """
+
+    def __init__(self, tree: _Tree, stored: _Stored[C]):
+        self.tree = tree
+        self.stored = stored
+        self.matched: dict[int, int] = {}
+        self.used: set[int] = set()
+        self.descend(None)
+        # счетчики названий еще не сопоставленных категорий
+        self.new_free = Counter(name for node, name in enumerate(tree.names)
+                                if node not in self.matched)
+        self.stored_free = Counter(c.name for c in stored.categories.values()
+                                   if c.pk not in self.used)
+
+    def descend(self, start: int | None) -> list[int]:
+        """
+        Сопоставить подкатегории по названию вниз от start,
+        вернуть сопоставленные узлы
+        """
+        found = []
+        nodes = [start]
+        while nodes:
+            node = nodes.pop()
+            for child in self.tree.children[node]:
+                pk = None if child in self.matched else self._free_child(node, child)
+                if pk is not None:
+                    self.matched[child] = pk
+                    self.used.add(pk)
+                    found.append(child)
+                    nodes.append(child)
+        return found
+
+    def _free_child(self, node: int | None, child: int) -> int | None:
+        key = (self.pk(node), self.tree.names[child])
+        return next((pk for pk in self.stored.by_key.get(key, ())
+                     if pk not in self.used), None)
+
+    def claim(self, node: int, pk: int) -> None:
+        """
+        Сопоставить узел категории и его подкатегории по названию
+        """
+        self.matched[node] = pk
+        self.used.add(pk)
+        for child in [node, *self.descend(node)]:
+            self.new_free[self.tree.names[child]] -= 1
+            self.stored_free[self.stored.categories[self.matched[child]].name] -= 1
+
+    def pk(self, node: int | None) -> int | None:
+        """
+        pk категории сопоставленного узла (None - верхний уровень)
+        """
+        return None if node is None else self.matched[node]
+
+    def match_moves(self) -> None:
+        """
+        Переносы: название однозначно определяет категорию
+        """
+        for node, name in enumerate(self.tree.names):
+            if node not in self.matched and self.new_free[name] == 1 \
+                    and self.stored_free[name] == 1:
+                self.claim(node, next(pk for pk in self.stored.by_name[name]
+                                      if pk not in self.used))
+
+    def match_renames(self) -> None:
+        """
+        Переименования: единственная несопоставленная подкатегория родителя
+        """
+        checked: set[int | None] = set()
+        for node, parent in enumerate(self.tree.parents):
+            if node in self.matched or parent in checked or \
+                    parent is not None and parent not in self.matched:
+                continue
+            checked.add(parent)
+            new = [n for n in self.tree.children[parent] if n not in self.matched]
+            old = [pk for pk in self.stored.by_parent.get(self.pk(parent), ())
+                   if pk not in self.used]
+            if len(new) == 1 and len(old) == 1:
+                self.claim(node, old[0])
+
+
+def _add_levels(matcher: _Matcher[C], factory: Callable[[str, int | None], C],
+                repo: AbstractRepository[C], result: TreeSync[C]) -> None:
+    # уровень дерева добавляется одной пачкой, когда ключи родителей известны
+    tree = matcher.tree
+    for level in tree.levels(matcher.matched):
+        added = [factory(tree.names[node], matcher.pk(tree.parents[node]))
+                 for node in level]
+        repo.add_many(added)
+        for node, category in zip(level, added):
+            matcher.matched[node] = category.pk
+        result.added.extend(added)
+
+
+def _changes(matcher: _Matcher[C], result: TreeSync[C]) -> list[C]:
+    # родитель переносится раньше подкатегорий, поэтому цикла
+    # в иерархии не возникает и при промежуточных изменениях
+    changed = []
+    stored = matcher.stored.categories
+    for node, name in enumerate(matcher.tree.names):
+        old = stored.get(matcher.matched[node])
+        parent = matcher.pk(matcher.tree.parents[node])
+        if old is None or name == old.name and parent == old.parent:
+            continue
+        category = copy(old)
+        category.name, category.parent = name, parent
+        if name != old.name:
+            result.renamed.append(category)
+        if parent != old.parent:
+            result.moved.append(category)
+        changed.append(category)
+    return changed
+
+
+def sync_tree(paths: Iterable[tuple[str, ...]], repo: AbstractRepository[C],
+              factory: Callable[[str, int | None], C],
+              before_delete: Callable[[list[int]], None] | None = None
+              ) -> TreeSync[C]:
+    """
+    Привести дерево категорий repo к дереву paths (см. Category.sync_from_tree)
+
+    Parameters
+    ----------
+    paths - пути категорий в порядке обхода в глубину
+    repo - репозиторий категорий
+    factory - создание категории по названию и pk родителя
+    before_delete - вызывается в транзакции со списком pk удаляемых
+                    категорий перед их удалением
+
+    Returns
+    -------
+    Объект TreeSync с внесенными изменениями
+    """
+    matcher = _Matcher(parse_paths(paths), _Stored(repo.get_all()))
+    matcher.match_moves()
+    matcher.match_renames()
+
+    result: TreeSync[C] = TreeSync()
+    result.deleted = [pk for pk in matcher.stored.categories if pk not in matcher.used]
+    with repo.transaction():
+        if result.deleted:
+            if before_delete is not None:
+                before_delete(result.deleted)
+            repo.delete_many(result.deleted)
+        _add_levels(matcher, factory, repo, result)
+        changed = _changes(matcher, result)
+        if changed:
+            repo.update_many(changed)
+    return result
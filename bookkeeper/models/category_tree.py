@@ -0,0 +1,289 @@
+"""
+Модуль описывает индекс дерева категорий в памяти
+
+Индекс строится один раз по репозиторию категорий и хранит для каждой
+категории подкатегории, глубину, путь от корня (кэшируется) и номера входа
+и выхода обхода в глубину (эйлеров обход): A - предок B тогда и только тогда,
+когда отрезок [tin(B), tout(B)] лежит внутри [tin(A), tout(A)]. Номера
+выдаются с промежутками, поэтому добавление и перенос категории занимают
+отрезок внутри свободного промежутка родителя, не перенумеровывая дерево.
+Когда промежуток исчерпан, дерево перенумеровывается целиком (редко).
+"""
+
+from bisect import insort
+from copy import copy
+from typing import Iterable, Iterator
+
+from bookkeeper.models.category import Category
+from bookkeeper.repository.abstract_repository import AbstractRepository
+from bookkeeper.repository.query import In
+
+# расстояние между соседними номерами после перенумерации
+_SPACING = 1 << 64
+
+
+class CategoryTree:
+    """
+    Индекс дерева категорий. Индекс хранит копии категорий и не изменяет
+    репозиторий: после изменения категорий в репозитории следует вызвать
+    соответствующий метод индекса (add, rename, move, remove).
+
+    categories - категории. Категории со ссылкой на отсутствующего родителя
+    считаются категориями верхнего уровня, как в topological_order
+    (bookkeeper.analytics.spending).
+    Цикл в иерархии - ValueError
+    """
+
+    def __init__(self, categories: Iterable[Category] = ()) -> None:
+        self._nodes: dict[int, Category] = {}
+        # подкатегории по возрастанию pk, None - категории верхнего уровня
+        self._children: dict[int | None, list[int]] = {None: []}
+        self._depth: dict[int, int] = {}
+        self._tin: dict[int, int] = {}
+        self._tout: dict[int, int] = {}
+        # наибольший номер, занятый внутри отрезка категории
+        self._last: dict[int | None, int] = {}
+        self._paths: dict[int, tuple[int, ...]] = {}
+        self.relabels = 0
+
+        nodes = {category.pk: copy(category) for category in categories}
+        for category in nodes.values():
+            if category.parent not in nodes:
+                category.parent = None
+            self._nodes[category.pk] = category
+            self._children[category.pk] = []
+        for pk in sorted(nodes):
+            self._children[nodes[pk].parent].append(pk)
+        self._relabel()
+        if len(self._tin) != len(self._nodes):
+            raise ValueError('categories contain a cycle')
+
+    @classmethod
+    def from_repository(cls, repo: AbstractRepository[Category]) -> 'CategoryTree':
+        """
+        Построить индекс по всем категориям репозитория
+        """
+
+        return cls(repo.get_all())
+
+    def _relabel(self) -> None:
+        """
+        Перенумеровать обход в глубину и пересчитать глубины
+        """
+
+        self.relabels += 1
+        self._tin.clear()
+        self._tout.clear()
+        self._last.clear()
+        counter = 0
+        self._last[None] = 0
+        stack: list[tuple[int, int, bool]] = [(pk, 0, False)
+                                              for pk in reversed(self._children[None])]
+        while stack:
+            pk, depth, done = stack.pop()
+            counter += _SPACING
+            if done:
+                self._tout[pk] = counter
+                continue
+            self._tin[pk] = counter
+            self._depth[pk] = depth
+            stack.append((pk, depth, True))
+            stack.extend((child, depth + 1, False)
+                         for child in reversed(self._children[pk]))
+        for node, children in self._children.items():
+            if node is not None and node in self._tin:
+                self._last[node] = (self._tout[children[-1]] if children
+                                    else self._tin[node])
+        if self._children[None]:
+            self._last[None] = self._tout[self._children[None][-1]]
+
+    def _allocate(self, parent: int | None, size: int) -> tuple[int, int] | None:
+        """
+        Выделить отрезок для size номеров в конце свободного промежутка
+        родителя или вернуть None, если места нет
+
+        Returns
+        -------
+        Пара (первый номер, шаг между номерами)
+        """
+
+        low = self._last[parent]
+        # у верхнего уровня нет отрезка родителя, номера не ограничены сверху
+        high = (low + (size + 2) * _SPACING if parent is None
+                else self._tout[parent])
+        step = min((high - low) // (size + 2), _SPACING)
+        if step < 1:
+            return None
+        self._last[parent] = low + step * (size + 1)
+        return low + step, step
+
+    def _place(self, pk: int) -> None:
+        """
+        Пронумеровать поддерево pk в конце свободного промежутка его родителя
+        """
+
+        subtree = list(self.walk(pk))
+        parent = self._nodes[pk].parent
+        allocated = self._allocate(parent, 2 * len(subtree))
+        if allocated is None:
+            self._relabel()
+            return
+        label, step = allocated
+        depth = 0 if parent is None else self._depth[parent] + 1
+        stack: list[tuple[int, int, bool]] = [(pk, depth, False)]
+        while stack:
+            node, depth, done = stack.pop()
+            if done:
+                self._tout[node] = label
+                children = self._children[node]
+                self._last[node] = (self._tout[children[-1]] if children
+                                    else self._tin[node])
+            else:
+                self._tin[node] = label
+                self._depth[node] = depth
+                stack.append((node, depth, True))
+                stack.extend((child, depth + 1, False)
+                             for child in reversed(self._children[node]))
+            label += step
+
+    def __len__(self) -> int:
+        return len(self._nodes)
+
+    def __contains__(self, pk: object) -> bool:
+        return pk in self._nodes
+
+    def get(self, pk: int) -> Category | None:
+        """ Получить категорию по pk """
+        return self._nodes.get(pk)
+
+    def children(self, pk: int | None) -> list[int]:
+        """ Получить pk непосредственных подкатегорий (None - верхний уровень) """
+        return list(self._children[pk])
+
+    def depth(self, pk: int) -> int:
+        """ Получить глубину категории (0 - верхний уровень) """
+        return self._depth[pk]
+
+    def is_ancestor(self, ancestor: int, pk: int) -> bool:
+        """
+        Проверить за O(1), является ли ancestor предком категории pk
+        (сама категория своим предком не считается)
+        """
+
+        return (self._tin[ancestor] < self._tin[pk]
+                and self._tout[pk] < self._tout[ancestor])
+
+    def walk(self, pk: int | None = None) -> Iterator[int]:
+        """
+        Обойти поддерево в глубину (родитель раньше подкатегорий,
+        подкатегории по возрастанию pk). pk = None - все дерево
+        """
+
+        stack = [pk] if pk is not None else list(reversed(self._children[None]))
+        while stack:
+            node = stack.pop()
+            yield node
+            stack.extend(reversed(self._children[node]))
+
+    def descendant_ids(self, pk: int) -> list[int]:
+        """
+        Получить pk всех подкатегорий за O(k) по уровням иерархии,
+        как AbstractRepository.descendants
+        """
+
+        result = list(self._children[pk])
+        for node in result:
+            result.extend(self._children[node])
+        return result
+
+    def subtree_ids(self, pk: int) -> list[int]:
+        """
+        Получить pk категории и всех ее подкатегорий
+        """
+
+        return [pk] + self.descendant_ids(pk)
+
+    def subtree_condition(self, pk: int) -> In:
+        """
+        Условие where на category_id для отбора расходов категории
+        вместе с подкатегориями: {'category_id': tree.subtree_condition(pk)}
+        """
+
+        return In(tuple(self.subtree_ids(pk)))
+
+    def path(self, pk: int) -> tuple[int, ...]:
+        """
+        Получить pk категорий от верхнего уровня до pk включительно.
+        Пути кэшируются: повторный вызов - O(1)
+        """
+
+        path = self._paths.get(pk)
+        if path is None:
+            parent = self._nodes[pk].parent
+            path = (pk,) if parent is None else self.path(parent) + (pk,)
+            self._paths[pk] = path
+        return path
+
+    def breadcrumb(self, pk: int, separator: str = ' / ') -> str:
+        """
+        Получить названия категорий от верхнего уровня до pk через separator
+        """
+
+        return separator.join(self._nodes[node].name for node in self.path(pk))
+
+    def add(self, category: Category) -> None:
+        """
+        Добавить в индекс категорию, уже добавленную в репозиторий
+        """
+
+        if category.pk in self._nodes:
+            raise ValueError(f'category {category.pk} is already in the tree')
+        if category.parent is not None and category.parent not in self._nodes:
+            raise ValueError(f'parent {category.parent} is not in the tree')
+        self._nodes[category.pk] = copy(category)
+        self._children[category.pk] = []
+        insort(self._children[category.parent], category.pk)
+        self._place(category.pk)
+
+    def rename(self, pk: int, name: str) -> None:
+        """
+        Изменить название категории в индексе
+        """
+
+        self._nodes[pk].name = name
+
+    def move(self, pk: int, parent: int | None) -> None:
+        """
+        Перенести категорию вместе с подкатегориями к новому родителю за O(k),
+        где k - размер поддерева
+        """
+
+        if parent is not None and parent not in self._nodes:
+            raise ValueError(f'parent {parent} is not in the tree')
+        if parent is not None and (parent == pk or self.is_ancestor(pk, parent)):
+            raise ValueError(f'cannot move category {pk} into its own subtree')
+        category = self._nodes[pk]
+        self._children[category.parent].remove(pk)
+        category.parent = parent
+        insort(self._children[parent], pk)
+        for node in self.walk(pk):
+            self._paths.pop(node, None)
+        self._place(pk)
+
+    def remove(self, pk: int) -> list[int]:
+        """
+        Удалить категорию вместе с подкатегориями из индекса
+
+        Returns
+        -------
+        pk удаленных категорий
+        """
+
+        removed = self.subtree_ids(pk)
+        self._children[self._nodes[pk].parent].remove(pk)
+        for node in removed:
+            del self._nodes[node], self._children[node], self._depth[node]
+            del self._tin[node], self._tout[node]
+            self._last.pop(node, None)
+            self._paths.pop(node, None)
+        return removed
@@ -7,6 +7,8 @@ from datetime import datetime
 
 from typing import List
 from bookkeeper.repository.abstract_repository import AbstractRepository
+from bookkeeper.repository.index import Index
+from bookkeeper.repository.rollup import Rollup
 from bookkeeper.models.category import Category
 
 
@@ -20,6 +22,16 @@ class Expense:
     comment - комментарий к расходу
     pk - id записи в базе данных
     """
+    db_indexes = (
+        Index(('date',), include=('amount',)),
+        Index(('category_id', 'date'), include=('amount',)),
+    )
+    # суммы по дням и месяцам для бюджетов и отчетов
+    db_rollups = (
+        Rollup('day', group_by=('category_id',)),
+        Rollup('month', group_by=('category_id',)),
+    )
+
     date: datetime
     amount: float
     category_id: int
@@ -66,6 +78,6 @@ class Expense:
         category_id - id категории
         """
 
-        expenses = repo.get_all({"category_id": category_id})
-        for expense in expenses:
-            repo.delete(expense.pk)
+        primary_keys = [expense.pk for expense
+                        in repo.iter_all({"category_id": category_id})]
+        repo.delete_many(primary_keys)
@@ -8,7 +8,11 @@
 """
 
 from abc import ABC, abstractmethod
-from typing import Generic, TypeVar, Protocol, Any
+from contextlib import nullcontext
+from typing import (ContextManager, Generic, Iterable, Iterator, TypeVar, Protocol,
+                    Any)
+
+from bookkeeper.repository.query import AggregateFunc, In, Predicate, Query, aggregate
 
 
 class Model(Protocol):  # pylint: disable=too-few-public-methods
@@ -30,6 +34,14 @@ class AbstractRepository(ABC, Generic[T]):
     get_all
     update
     delete
+
+    Пакетные методы add_many, update_many, delete_many по умолчанию
+    вызывают одиночные методы, реализации могут их переопределить.
+    Методы find, iter_all и aggregate по умолчанию выполняются над
+    результатом get_all.
+    Методы иерархии descendants, ancestors, subtree_ids по умолчанию
+    обходят записи через get_all и get.
+    Метод transaction по умолчанию не обеспечивает атомарности.
     """
 
     @abstractmethod
@@ -58,3 +70,123 @@ class AbstractRepository(ABC, Generic[T]):
     @abstractmethod
     def delete(self, primary_key: int) -> None:
         """ Удалить запись """
+
+    def add_many(self, objs: Iterable[T]) -> list[int]:
+        """
+        Добавить несколько объектов в репозиторий, вернуть их id,
+        также записать id в атрибут pk каждого объекта.
+        """
+        return [self.add(obj) for obj in objs]
+
+    def update_many(self, objs: Iterable[T]) -> None:
+        """ Обновить данные о нескольких объектах. """
+        for obj in objs:
+            self.update(obj)
+
+    def delete_many(self, primary_keys: Iterable[int]) -> None:
+        """ Удалить несколько записей """
+        for primary_key in primary_keys:
+            self.delete(primary_key)
+
+    def find(self, query: Query) -> list[T]:
+        """
+        Получить записи по запросу Query: условия сравнения, сортировка,
+        постраничный вывод
+        """
+        return query.apply(self.get_all(query.equality() or None))
+
+    def iter_all(self, where: dict[str, Any] | None = None,
+                 batch_size: int = 1000) -> Iterator[T]:
+        """
+        Получить записи по условию where (как в find) по одной, не собирая
+        все записи в список. batch_size - количество записей, читаемых
+        из хранилища за один раз
+        """
+        if batch_size < 1:
+            raise ValueError('`batch_size` must be positive')
+        yield from self.find(Query(where=where or {}))
+
+    def aggregate(self, func: AggregateFunc, field: str = 'pk',
+                  where: dict[str, Any] | None = None,
+                  group_by: str | tuple[str, ...] | None = None) -> Any:
+        """
+        Вычислить агрегатную функцию ('sum', 'count', 'min', 'max') по полю
+        field для записей, удовлетворяющих условию where (как в find).
+        Если задан group_by, вернуть словарь {значение группы: результат}
+        """
+        return aggregate(self.find(Query(where=where or {})), func, field, group_by)
+
+    def descendants(self, primary_key: int, parent_field: str = 'parent') -> list[T]:
+        """
+        Получить всех потомков записи в иерархии, заданной полем parent_field
+        (ссылкой на pk родителя): непосредственных потомков, их потомков и т.д.
+        Записи упорядочены по уровню, внутри уровня - по pk
+        """
+        if self.get(primary_key) is None:
+            return []
+        children: dict[Any, list[T]] = {}
+        for obj in self.get_all():
+            children.setdefault(getattr(obj, parent_field), []).append(obj)
+
+        result: list[T] = []
+        visited = {primary_key}
+        level = [primary_key]
+        while level:
+            level_objs = sorted((child for pk in level for child in children.get(pk, ())
+                                 if child.pk not in visited), key=lambda obj: obj.pk)
+            visited.update(obj.pk for obj in level_objs)
+            result.extend(level_objs)
+            level = [obj.pk for obj in level_objs]
+        return result
+
+    def ancestors(self, primary_key: int, parent_field: str = 'parent') -> list[T]:
+        """
+        Получить всех предков записи в иерархии, заданной полем parent_field:
+        от родителя до записи верхнего уровня
+        """
+        result: list[T] = []
+        visited = {primary_key}
+        obj = self.get(primary_key)
+        while obj is not None:
+            parent = getattr(obj, parent_field)
+            if parent is None or parent in visited:
+                break
+            visited.add(parent)
+            obj = self.get(parent)
+            if obj is not None:
+                result.append(obj)
+        return result
+
+    def subtree_ids(self, primary_key: int, parent_field: str = 'parent') -> list[int]:
+        """
+        Получить pk записи и всех ее потомков (пустой список, если записи нет)
+        """
+        if self.get(primary_key) is None:
+            return []
+        return [primary_key] + [obj.pk for obj
+                                in self.descendants(primary_key, parent_field)]
+
+    def subtree_condition(self, primary_key: int,
+                          parent_field: str = 'parent') -> Predicate:
+        """
+        Получить условие where на поле-ссылку для отбора записей, ссылающихся
+        на запись primary_key или любого ее потомка:
+        {'category_id': categories.subtree_condition(pk)}
+        """
+        return In(self.subtree_ids(primary_key, parent_field))
+
+    def data_version(self) -> Any:
+        """
+        Получить версию данных хранилища: значение меняется при изменении
+        записей, в том числе другими процессами. None, если хранилище
+        не отслеживает версии
+        """
+        return None
+
+    def transaction(self) -> ContextManager[Any]:
+        """
+        Получить контекстный менеджер транзакции: изменения внутри блока with
+        фиксируются вместе при выходе из блока и откатываются при исключении.
+        Транзакции могут быть вложенными
+        """
+        return nullcontext()
@@ -0,0 +1,231 @@
+"""
+Модуль описывает асинхронный интерфейс репозитория
+
+Асинхронный репозиторий повторяет методы AbstractRepository в виде корутин.
+AsyncRepositoryAdapter выполняет вызовы любого синхронного репозитория
+в пуле потоков, не блокируя цикл событий. AsyncSQLiteRepository выполняет
+все запросы в отдельном потоке с собственным соединением с базой данных.
+"""
+
+from abc import ABC, abstractmethod
+from concurrent.futures import Executor, ThreadPoolExecutor
+from functools import partial
+from typing import Any, AsyncIterator, Callable, Generic, Iterable, Type, TypeVar
+
+import asyncio
+
+from bookkeeper.repository.abstract_repository import AbstractRepository, T
+from bookkeeper.repository.query import AggregateFunc, Query, aggregate
+from bookkeeper.repository.sqlite_connection import (DEFAULT_PROFILE, PragmaProfile,
+                                                     SQLiteConnectionManager)
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+
+R = TypeVar('R')
+
+
+class AsyncAbstractRepository(ABC, Generic[T]):
+    """
+    Абстрактный асинхронный репозиторий.
+    Абстрактные методы:
+    add
+    get
+    get_all
+    update
+    delete
+
+    Остальные методы по умолчанию выражены через абстрактные,
+    как в AbstractRepository.
+    """
+
+    @abstractmethod
+    async def add(self, obj: T) -> int:
+        """
+        Добавить объект в репозиторий, вернуть id объекта,
+        также записать id в атрибут pk.
+        """
+
+    @abstractmethod
+    async def get(self, primary_key: int) -> T | None:
+        """ Получить объект по id """
+
+    @abstractmethod
+    async def get_all(self, where: dict[str, Any] | None = None) -> list[T]:
+        """
+        Получить все записи по некоторому условию
+        where - условие в виде словаря {'название_поля': значение}
+        если условие не задано (по умолчанию), вернуть все записи
+        """
+
+    @abstractmethod
+    async def update(self, obj: T) -> None:
+        """ Обновить данные об объекте. Объект должен содержать поле pk. """
+
+    @abstractmethod
+    async def delete(self, primary_key: int) -> None:
+        """ Удалить запись """
+
+    async def add_many(self, objs: Iterable[T]) -> list[int]:
+        """ Добавить несколько объектов в репозиторий, вернуть их id """
+        return [await self.add(obj) for obj in objs]
+
+    async def update_many(self, objs: Iterable[T]) -> None:
+        """ Обновить данные о нескольких объектах """
+        for obj in objs:
+            await self.update(obj)
+
+    async def delete_many(self, primary_keys: Iterable[int]) -> None:
+        """ Удалить несколько записей """
+        for primary_key in primary_keys:
+            await self.delete(primary_key)
+
+    async def find(self, query: Query) -> list[T]:
+        """ Получить записи по запросу Query """
+        return query.apply(await self.get_all(query.equality() or None))
+
+    async def iter_all(self, where: dict[str, Any] | None = None,
+                       batch_size: int = 1000) -> AsyncIterator[T]:
+        """
+        Получить записи по условию where по одной. Записи читаются
+        порциями по batch_size в порядке pk, каждая порция - отдельным запросом
+        """
+        if batch_size < 1:
+            raise ValueError('`batch_size` must be positive')
+        query = Query(where=where or {}, order_by=('pk',), limit=batch_size)
+        while True:
+            batch = await self.find(query)
+            for obj in batch:
+                yield obj
+            if len(batch) < batch_size:
+                return
+            query = query.next_page(batch[-1])
+
+    async def aggregate(self, func: AggregateFunc, field: str = 'pk',
+                        where: dict[str, Any] | None = None,
+                        group_by: str | tuple[str, ...] | None = None) -> Any:
+        """
+        Вычислить агрегатную функцию по полю field для записей,
+        удовлетворяющих условию where (см. AbstractRepository.aggregate)
+        """
+        objs = await self.find(Query(where=where or {}))
+        return aggregate(objs, func, field, group_by)
+
+
+class AsyncRepositoryAdapter(AsyncAbstractRepository[T]):
+    """
+    Асинхронный репозиторий поверх синхронного: каждый вызов выполняется
+    в пуле потоков executor. По умолчанию создается пул из одного потока,
+    так что вызовы к репозиторию выполняются по очереди. Для параллельного
+    чтения из SQLite можно передать пул из нескольких потоков - запросы
+    получат разные соединения из пула SQLiteConnectionManager.
+
+    repo - синхронный репозиторий
+    executor - пул потоков, в котором выполняются вызовы
+    """
+
+    def __init__(self, repo: AbstractRepository[T],
+                 executor: Executor | None = None) -> None:
+        self.repo = repo
+        self._owns_executor = executor is None
+        self.executor = (executor if executor is not None
+                         else ThreadPoolExecutor(1, thread_name_prefix='repository'))
+
+    async def _call(self, func: Callable[..., R], *args: Any) -> R:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, partial(func, *args))
+
+    async def run(self, func: Callable[[AbstractRepository[T]], R]) -> R:
+        """
+        Выполнить функцию с синхронным репозиторием в потоке пула, например
+        несколько операций внутри repo.transaction()
+        """
+
+        return await self._call(func, self.repo)
+
+    async def close(self) -> None:
+        """
+        Завершить работу собственного пула потоков
+        """
+
+        if self._owns_executor:
+            # уже поставленные в очередь вызовы будут выполнены
+            self.executor.shutdown(wait=False)
+
+    async def __aenter__(self) -> 'AsyncRepositoryAdapter[T]':
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.close()
+
+    async def add(self, obj: T) -> int:
+        return await self._call(self.repo.add, obj)
+
+    async def add_many(self, objs: Iterable[T]) -> list[int]:
+        return await self._call(self.repo.add_many, list(objs))
+
+    async def get(self, primary_key: int) -> T | None:
+        return await self._call(self.repo.get, primary_key)
+
+    async def get_all(self, where: dict[str, Any] | None = None) -> list[T]:
+        return await self._call(self.repo.get_all, where)
+
+    async def find(self, query: Query) -> list[T]:
+        return await self._call(self.repo.find, query)
+
+    async def aggregate(self, func: AggregateFunc, field: str = 'pk',
+                        where: dict[str, Any] | None = None,
+                        group_by: str | tuple[str, ...] | None = None) -> Any:
+        return await self._call(self.repo.aggregate, func, field, where, group_by)
+
+    async def descendants(self, primary_key: int,
+                          parent_field: str = 'parent') -> list[T]:
+        """ См. AbstractRepository.descendants """
+        return await self._call(self.repo.descendants, primary_key, parent_field)
+
+    async def ancestors(self, primary_key: int, parent_field: str = 'parent') -> list[T]:
+        """ См. AbstractRepository.ancestors """
+        return await self._call(self.repo.ancestors, primary_key, parent_field)
+
+    async def subtree_ids(self, primary_key: int,
+                          parent_field: str = 'parent') -> list[int]:
+        """ См. AbstractRepository.subtree_ids """
+        return await self._call(self.repo.subtree_ids, primary_key, parent_field)
+
+    async def update(self, obj: T) -> None:
+        await self._call(self.repo.update, obj)
+
+    async def update_many(self, objs: Iterable[T]) -> None:
+        await self._call(self.repo.update_many, list(objs))
+
+    async def delete(self, primary_key: int) -> None:
+        await self._call(self.repo.delete, primary_key)
+
+    async def delete_many(self, primary_keys: Iterable[int]) -> None:
+        await self._call(self.repo.delete_many, list(primary_keys))
+
+
+class AsyncSQLiteRepository(AsyncRepositoryAdapter[T]):
+    """
+    Асинхронный репозиторий SQLite. Все запросы выполняются в отдельном
+    потоке через собственное соединение с базой данных, не разделяемое
+    с синхронными репозиториями. Параллельные вызовы выполняются по очереди,
+    не блокируя цикл событий.
+
+    db_file - путь к файлу базы данных
+    cls - класс модели
+    profile - профиль pragma соединения
+    """
+
+    def __init__(self, db_file: str, cls: Type[T],
+                 profile: str | PragmaProfile = DEFAULT_PROFILE) -> None:
+        self.connection = SQLiteConnectionManager(db_file, readers=0, profile=profile)
+        self.sqlite_repo = SQLiteRepository(db_file, cls, self.connection)
+        super().__init__(self.sqlite_repo)
+
+    async def create_table(self) -> None:
+        """ Создать таблицу модели и ее индексы """
+        await self._call(self.sqlite_repo.create_table)
+
+    async def close(self) -> None:
+        """ Закрыть соединение и завершить поток """
+        await self._call(self.connection.close)
+        await super().close()
@@ -0,0 +1,240 @@
+"""
+Модуль описывает кэширующую обертку над репозиторием
+
+Обертка хранит недавно полученные по pk объекты в LRU кэше ограниченного
+размера и, по желанию, всю таблицу целиком (для небольших таблиц, например
+категорий и бюджетов). Изменения через обертку сбрасывают затронутые записи,
+изменения в обход обертки (другие репозитории, другие процессы) обнаруживаются
+по версии данных хранилища (AbstractRepository.data_version). При чтении
+версия запрашивается не чаще раза в check_interval секунд, поэтому попадание
+в кэш обычно не обращается к хранилищу; перед записью через обертку версия
+проверяется всегда.
+"""
+
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Iterable, Iterator
+
+import time
+
+from bookkeeper.repository.abstract_repository import AbstractRepository, T
+from bookkeeper.repository.query import (AggregateFunc, Predicate, Query, aggregate,
+                                         matches)
+
+
+@dataclass(frozen=True)
+class CacheInfo:
+    """
+    Статистика кэша.
+    hits - количество запросов, обслуженных из кэша
+    misses - количество запросов, переданных в репозиторий
+    maxsize - максимальный размер LRU кэша
+    currsize - текущий размер LRU кэша
+    table_cached - загружена ли таблица целиком
+    """
+    hits: int
+    misses: int
+    maxsize: int
+    currsize: int
+    table_cached: bool
+
+
+class CachedRepository(AbstractRepository[T]):
+    """
+    Кэширующий репозиторий поверх другого репозитория.
+    Возвращаемые объекты общие для всех обращений к кэшу, изменять их
+    следует только с последующим вызовом update.
+
+    repo - исходный репозиторий
+    maxsize - максимальное количество объектов в LRU кэше get
+    cache_all - кэшировать всю таблицу: get_all, find, aggregate и запросы
+    иерархии выполняются над копией таблицы в памяти
+    check_interval - наименьший промежуток в секундах между проверками
+    версии данных: изменения в обход обертки видны с этой задержкой
+    (0 - проверять при каждом обращении)
+    """
+
+    def __init__(self, repo: AbstractRepository[T], maxsize: int = 256,
+                 cache_all: bool = False, check_interval: float = 1.0) -> None:
+        if maxsize < 0:
+            raise ValueError('`maxsize` must not be negative')
+        if check_interval < 0:
+            raise ValueError('`check_interval` must not be negative')
+        self.repo = repo
+        self.maxsize = maxsize
+        self.cache_all = cache_all
+        self.check_interval = check_interval
+        self.hits = 0
+        self.misses = 0
+        self._lru: OrderedDict[int, T] = OrderedDict()
+        self._table: dict[int, T] | None = None
+        self._version = repo.data_version()
+        self._checked = time.monotonic()
+
+    def cache_info(self) -> CacheInfo:
+        """
+        Получить статистику кэша
+        """
+
+        return CacheInfo(self.hits, self.misses, self.maxsize, len(self._lru),
+                         self._table is not None)
+
+    def clear(self) -> None:
+        """
+        Сбросить кэш
+        """
+
+        self._lru.clear()
+        self._table = None
+
+    def _validate(self, force: bool = False) -> None:
+        # данные изменены в обход обертки; версия запрашивается не чаще
+        # раза в check_interval секунд, перед собственной записью - всегда
+        now = time.monotonic()
+        if not force and now - self._checked < self.check_interval:
+            return
+        self._checked = now
+        version = self.repo.data_version()
+        if version != self._version:
+            self.clear()
+            self._version = version
+
+    def _invalidate(self, primary_keys: Iterable[int]) -> None:
+        for primary_key in primary_keys:
+            self._lru.pop(primary_key, None)
+        self._table = None
+        # собственное изменение не должно сбрасывать остальной кэш; изменения
+        # в обход обертки до записи уже проверены в _validate(force=True)
+        self._version = self.repo.data_version()
+        self._checked = time.monotonic()
+
+    def _get_table(self) -> dict[int, T]:
+        self._validate()
+        if self._table is None:
+            self.misses += 1
+            self._table = {obj.pk: obj for obj in self.repo.get_all()}
+        else:
+            self.hits += 1
+        return self._table
+
+    def add(self, obj: T) -> int:
+        self._validate(force=True)
+        primary_key = self.repo.add(obj)
+        self._invalidate([primary_key])
+        return primary_key
+
+    def add_many(self, objs: Iterable[T]) -> list[int]:
+        self._validate(force=True)
+        primary_keys = self.repo.add_many(objs)
+        self._invalidate(primary_keys)
+        return primary_keys
+
+    def get(self, primary_key: int) -> T | None:
+        if self.cache_all:
+            return self._get_table().get(primary_key)
+
+        self._validate()
+        obj = self._lru.get(primary_key)
+        if obj is not None:
+            self.hits += 1
+            self._lru.move_to_end(primary_key)
+            return obj
+
+        self.misses += 1
+        obj = self.repo.get(primary_key)
+        if obj is not None and self.maxsize:
+            self._lru[primary_key] = obj
+            if len(self._lru) > self.maxsize:
+                self._lru.popitem(last=False)
+        return obj
+
+    def get_all(self, where: dict[str, Any] | None = None) -> list[T]:
+        if not self.cache_all:
+            return self.repo.get_all(where)
+        table = self._get_table()
+        if where is None:
+            return list(table.values())
+        return [obj for obj in table.values() if matches(obj, where)]
+
+    def iter_all(self, where: dict[str, Any] | None = None,
+                 batch_size: int = 1000) -> Iterator[T]:
+        if not self.cache_all:
+            return self.repo.iter_all(where, batch_size)
+        return iter(self.get_all(where))
+
+    def find(self, query: Query) -> list[T]:
+        if not self.cache_all:
+            return self.repo.find(query)
+        return query.apply(self._get_table().values())
+
+    def aggregate(self, func: AggregateFunc, field: str = 'pk',
+                  where: dict[str, Any] | None = None,
+                  group_by: str | tuple[str, ...] | None = None) -> Any:
+        if not self.cache_all:
+            return self.repo.aggregate(func, field, where, group_by)
+        return aggregate(self.get_all(where), func, field, group_by)
+
+    def descendants(self, primary_key: int, parent_field: str = 'parent') -> list[T]:
+        if not self.cache_all:
+            return self.repo.descendants(primary_key, parent_field)
+        return super().descendants(primary_key, parent_field)
+
+    def ancestors(self, primary_key: int, parent_field: str = 'parent') -> list[T]:
+        if not self.cache_all:
+            return self.repo.ancestors(primary_key, parent_field)
+        return super().ancestors(primary_key, parent_field)
+
+    def subtree_ids(self, primary_key: int, parent_field: str = 'parent') -> list[int]:
+        if not self.cache_all:
+            return self.repo.subtree_ids(primary_key, parent_field)
+        return super().subtree_ids(primary_key, parent_field)
+
+    def subtree_condition(self, primary_key: int,
+                          parent_field: str = 'parent') -> Predicate:
+        # условие применяется к другим репозиториям, поэтому его строит
+        # исходный репозиторий (например, подзапрос по таблице замыкания)
+        return self.repo.subtree_condition(primary_key, parent_field)
+
+    def update(self, obj: T) -> None:
+        self._validate(force=True)
+        try:
+            self.repo.update(obj)
+        finally:
+            self._invalidate([obj.pk])
+
+    def update_many(self, objs: Iterable[T]) -> None:
+        self._validate(force=True)
+        objs = list(objs)
+        try:
+            self.repo.update_many(objs)
+        finally:
+            self._invalidate(obj.pk for obj in objs)
+
+    def delete(self, primary_key: int) -> None:
+        self._validate(force=True)
+        try:
+            self.repo.delete(primary_key)
+        finally:
+            self._invalidate([primary_key])
+
+    def delete_many(self, primary_keys: Iterable[int]) -> None:
+        self._validate(force=True)
+        primary_keys = list(primary_keys)
+        try:
+            self.repo.delete_many(primary_keys)
+        finally:
+            self._invalidate(primary_keys)
+
+    def data_version(self) -> Any:
+        return self.repo.data_version()
+
+    @contextmanager
+    def transaction(self) -> Iterator[Any]:
+        try:
+            with self.repo.transaction() as tx:
+                yield tx
+        finally:
+            # откат возвращает прежние данные: версия проверяется
+            # при следующем обращении
+            self._checked = -float('inf')
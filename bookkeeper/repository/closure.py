@@ -0,0 +1,127 @@
+"""
+Модуль описывает таблицу замыкания (closure table) иерархии модели
+
+Модель объявляет иерархию в атрибуте класса db_closure. SQLiteRepository
+создает таблицу <таблица>_closure(ancestor, descendant, depth) со строкой
+для каждой пары "предок - потомок" (в том числе (pk, pk, 0)) и триггеры
+AFTER INSERT/UPDATE/DELETE, которые поддерживают ее при добавлении, переносе
+и удалении записей. Запросы по иерархии (потомки, предки, расходы категории
+с подкатегориями) выполняются одним соединением по индексу вместо
+рекурсивного запроса.
+"""
+
+from dataclasses import dataclass, field
+from typing import Any
+
+from bookkeeper.repository.query import Predicate
+
+
+@dataclass(frozen=True)
+class Closure:
+    """
+    Таблица замыкания иерархии, заданной полем parent_field (ссылкой на pk
+    родителя). Перенос записи в собственное поддерево отклоняется триггером
+    (sqlite3.IntegrityError), поэтому поддерживаемая триггерами иерархия
+    не содержит циклов
+    """
+    parent_field: str = 'parent'
+
+    def table_name(self, table_name: str) -> str:
+        """
+        Получить название таблицы замыкания для таблицы модели
+        """
+
+        return f'{table_name}_closure'
+
+    def create_sql(self, table_name: str) -> list[str]:
+        """
+        Получить SQL запросы создания таблицы замыкания и индекса по потомку
+        в том виде, в котором SQLite хранит их в sqlite_master
+        """
+
+        closure = self.table_name(table_name)
+        return [f'CREATE TABLE {closure} (ancestor INTEGER NOT NULL, '
+                f'descendant INTEGER NOT NULL, depth INTEGER NOT NULL, '
+                f'PRIMARY KEY (ancestor, descendant)) WITHOUT ROWID',
+                f'CREATE INDEX {closure}_descendant ON {closure} (descendant, depth)']
+
+    def triggers_sql(self, table_name: str) -> dict[str, str]:
+        """
+        Получить SQL запросы создания триггеров, поддерживающих таблицу
+        замыкания, в том виде, в котором SQLite хранит их в sqlite_master
+
+        Returns
+        -------
+        Словарь {название триггера: SQL запрос}
+        """
+
+        closure, parent = self.table_name(table_name), self.parent_field
+        subtree = f'SELECT descendant FROM {closure} WHERE ancestor = {{}}.pk'
+        link = (f'INSERT INTO {closure} (ancestor, descendant, depth) '
+                f'SELECT up.ancestor, down.descendant, up.depth + down.depth + 1 '
+                f'FROM {closure} AS up, {closure} AS down '
+                f'WHERE up.descendant = NEW.{parent} AND down.ancestor = NEW.pk;')
+        # связи поддерева с предками прежнего положения
+        unlink = (f'DELETE FROM {closure} '
+                  f'WHERE descendant IN ({subtree.format("OLD")}) '
+                  f'AND ancestor IN (SELECT ancestor FROM {closure} '
+                  f'WHERE descendant = OLD.pk AND ancestor != OLD.pk);')
+        return {
+            f'{closure}_insert': (
+                f'CREATE TRIGGER {closure}_insert AFTER INSERT ON {table_name} '
+                f'BEGIN INSERT INTO {closure} (ancestor, descendant, depth) '
+                f'VALUES (NEW.pk, NEW.pk, 0); {link} END'),
+            f'{closure}_update': (
+                f'CREATE TRIGGER {closure}_update AFTER UPDATE OF {parent} '
+                f'ON {table_name} WHEN OLD.{parent} IS NOT NEW.{parent} BEGIN '
+                f'SELECT RAISE(ABORT, \'{table_name}: cycle in hierarchy\') '
+                f'WHERE NEW.{parent} IN ({subtree.format("NEW")}); '
+                f'{unlink} {link} END'),
+            f'{closure}_delete': (
+                # подкатегории удаленной записи остаются поддеревом без предков
+                f'CREATE TRIGGER {closure}_delete AFTER DELETE ON {table_name} '
+                f'BEGIN {unlink} DELETE FROM {closure} '
+                f'WHERE ancestor = OLD.pk OR descendant = OLD.pk; END'),
+        }
+
+    def rebuild_sql(self, table_name: str) -> list[str]:
+        """
+        Получить SQL запросы пересчета таблицы замыкания по таблице модели.
+        Глубина рекурсии ограничена количеством записей, поэтому цикл
+        в иерархии (в базе данных, измененной без триггеров) не приводит
+        к бесконечному запросу
+        """
+
+        closure, parent = self.table_name(table_name), self.parent_field
+        return [f'DELETE FROM {closure}',
+                f'INSERT INTO {closure} (ancestor, descendant, depth) '
+                f'WITH RECURSIVE tree(ancestor, descendant, depth) AS '
+                f'(SELECT pk, pk, 0 FROM {table_name} UNION '
+                f'SELECT tree.ancestor, {table_name}.pk, tree.depth + 1 '
+                f'FROM {table_name} JOIN tree '
+                f'ON {table_name}.{parent} = tree.descendant '
+                f'WHERE tree.depth < (SELECT count(*) FROM {table_name})) '
+                f'SELECT ancestor, descendant, min(depth) FROM tree GROUP BY 1, 2']
+
+
+@dataclass(frozen=True)
+class InSubtree(Predicate):
+    """
+    Условие "значение поля - pk записи поддерева ancestor" по таблице
+    замыкания table. В SQL это подзапрос по первичному ключу таблицы
+    замыкания, вычисляемый в момент выполнения запроса; вне SQL значение
+    проверяется по members - составу поддерева на момент создания условия.
+    Создается методом subtree_condition репозитория иерархии
+    """
+    table: str
+    ancestor: int
+    members: frozenset[int] = field(default_factory=frozenset, compare=False)
+
+    def matches(self, value: Any) -> bool:
+        return value in self.members
+
+    def to_sql(self, column: str) -> str:
+        return f'{column} IN (SELECT descendant FROM {self.table} WHERE ancestor = ?)'
+
+    def params(self) -> list[Any]:
+        return [self.ancestor]
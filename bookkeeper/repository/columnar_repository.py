@@ -0,0 +1,555 @@
+"""
+Модуль описывает колоночный репозиторий расходов на основе NumPy
+
+Каждое поле Expense хранится в отдельном массиве: дата - int64 (микросекунды
+от начала эпохи), сумма - float64, категория - int32, pk - int64. Комментарии
+хранятся в пуле строк, в массиве лежат номера строк пула. Условия where,
+сортировка, агрегатные функции и группировка по периодам вычисляются над
+массивами целиком, объекты Expense создаются только для выдаваемых записей.
+"""
+
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Any, Callable, Iterable, Iterator, Literal, Sequence
+
+import numpy as np
+import numpy.typing as npt
+
+from bookkeeper.analytics.bucketing import bucket_ids, bucket_starts
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.abstract_repository import AbstractRepository
+from bookkeeper.repository.query import (AggregateFunc, Between, Ge, Gt, In, Le, Lt,
+                                         Predicate, Query)
+
+EPOCH = datetime(1970, 1, 1)
+MICROSECOND = timedelta(microseconds=1)
+DAY_MICROSECONDS = 86_400_000_000
+
+COLUMNS = ('pk', 'date', 'amount', 'category_id', 'comment')
+
+_COMPARISONS: dict[type, Callable[[Any, Any], Any]] = {
+    Lt: np.less, Le: np.less_equal, Gt: np.greater, Ge: np.greater_equal,
+}
+
+Interval = Literal['День', 'Неделя', 'Месяц']
+
+
+def to_microseconds(value: datetime) -> int:
+    """
+    Перевести дату в количество микросекунд от начала эпохи
+    """
+
+    return (value - EPOCH) // MICROSECOND
+
+
+def period_starts(dates: npt.NDArray[np.int64], interval: str) -> npt.NDArray[np.int64]:
+    """
+    Вычислить начало периода ("День", "Неделя" или "Месяц") для каждой даты.
+    Неделя начинается с понедельника
+
+    Parameters
+    ----------
+    dates - даты в микросекундах от начала эпохи
+    interval - название периода
+
+    Returns
+    -------
+    Номера дней от начала эпохи, с которых начинаются периоды
+    """
+
+    return bucket_starts(bucket_ids(dates, interval), interval).astype(np.int64)
+
+
+class ColumnarExpenseRepository(AbstractRepository[Expense]):
+    """
+    Колоночный репозиторий расходов. Удаленные записи помечаются
+    в массиве alive и вычищаются, когда их становится больше половины.
+    pk выдаются по возрастанию, поэтому поиск записи по pk - двоичный.
+    Внутри транзакции ведется журнал отмены, как в MemoryRepository.
+
+    capacity - начальный размер массивов
+    """
+
+    def __init__(self, capacity: int = 1024) -> None:
+        capacity = max(capacity, 1)
+        self._pk = np.zeros(capacity, np.int64)
+        self._date = np.zeros(capacity, np.int64)
+        self._amount = np.zeros(capacity, np.float64)
+        self._category = np.zeros(capacity, np.int32)
+        self._comment = np.zeros(capacity, np.int32)
+        self._alive = np.zeros(capacity, np.bool_)
+        self._size = 0
+        self._dead = 0
+        self._next_pk = 1
+        self._pool: list[str] = []
+        self._pool_ids: dict[str, int] = {}
+        self._ranks: npt.NDArray[np.int64] | None = None
+        self._undo: list[list[Callable[[], None]]] = []
+        self._version = 0
+
+    def __len__(self) -> int:
+        return self._size - self._dead
+
+    # хранение
+
+    def _reserve(self, count: int) -> None:
+        capacity = len(self._pk)
+        if self._size + count <= capacity:
+            return
+        while capacity < self._size + count:
+            capacity *= 2
+        for name in ('_pk', '_date', '_amount', '_category', '_comment', '_alive'):
+            old = getattr(self, name)
+            new = np.zeros(capacity, old.dtype)
+            new[:self._size] = old[:self._size]
+            setattr(self, name, new)
+
+    def _intern(self, comments: Iterable[str]) -> npt.NDArray[np.int32]:
+        ids = []
+        for comment in comments:
+            comment_id = self._pool_ids.get(comment)
+            if comment_id is None:
+                comment_id = self._pool_ids[comment] = len(self._pool)
+                self._pool.append(comment)
+                self._ranks = None
+            ids.append(comment_id)
+        return np.array(ids, np.int32)
+
+    def _comment_ranks(self) -> npt.NDArray[np.int64]:
+        # порядковые номера строк пула в отсортированном порядке
+        if self._ranks is None:
+            order = sorted(range(len(self._pool)), key=self._pool.__getitem__)
+            self._ranks = np.empty(len(self._pool), np.int64)
+            self._ranks[order] = np.arange(len(self._pool))
+        return self._ranks
+
+    def _log(self, undo: Callable[[], None]) -> None:
+        if self._undo:
+            self._undo[-1].append(undo)
+
+    def _append(self, dates: npt.NDArray[np.int64], amounts: npt.NDArray[np.float64],
+                categories: npt.NDArray[np.int32],
+                comments: npt.NDArray[np.int32]) -> npt.NDArray[np.int64]:
+        count = len(dates)
+        if not len(amounts) == len(categories) == len(comments) == count:
+            raise ValueError('columns must have the same length')
+        self._reserve(count)
+        start, end = self._size, self._size + count
+        primary_keys = np.arange(self._next_pk, self._next_pk + count, dtype=np.int64)
+        self._pk[start:end] = primary_keys
+        self._date[start:end] = dates
+        self._amount[start:end] = amounts
+        self._category[start:end] = categories
+        self._comment[start:end] = comments
+        self._alive[start:end] = True
+        self._size = end
+        self._next_pk += count
+        self._version += 1
+
+        def undo() -> None:
+            self._alive[start:end] = False
+            self._size = start
+        self._log(undo)
+        return primary_keys
+
+    def _rows(self, primary_keys: Sequence[int]) -> tuple[npt.NDArray[np.intp],
+                                                          npt.NDArray[np.bool_]]:
+        """
+        Найти строки записей по pk
+
+        Returns
+        -------
+        Номера строк и признак того, что запись найдена
+        """
+
+        keys = np.asarray(primary_keys, np.int64)
+        rows = np.searchsorted(self._pk[:self._size], keys)
+        if self._size == 0:
+            return rows, np.zeros(len(keys), np.bool_)
+        clipped = np.minimum(rows, self._size - 1)
+        found = ((rows < self._size) & (self._pk[clipped] == keys)
+                 & self._alive[clipped])
+        return clipped, found
+
+    def _compact(self) -> None:
+        keep = self._alive[:self._size]
+        count = int(keep.sum())
+        for name in ('_pk', '_date', '_amount', '_category', '_comment', '_alive'):
+            array = getattr(self, name)
+            array[:count] = array[:self._size][keep]
+        self._alive[count:self._size] = False
+        self._size = count
+        self._dead = 0
+
+    def _objects(self, rows: npt.NDArray[np.intp]) -> list[Expense]:
+        dates = self._date[rows].astype('datetime64[us]').tolist()
+        pool = self._pool
+        comments = [pool[i] for i in self._comment[rows].tolist()]
+        return list(map(Expense, dates, self._amount[rows].tolist(),
+                        self._category[rows].tolist(), comments,
+                        self._pk[rows].tolist()))
+
+    # запросы
+
+    def _check_fields(self, fields: Iterable[str]) -> None:
+        unknown = set(fields) - set(COLUMNS)
+        if unknown:
+            raise ValueError(f'unknown fields {sorted(unknown)} for expenses')
+
+    def _data_arrays(self) -> list[npt.NDArray[Any]]:
+        # столбцы значений полей расхода, кроме pk
+        return [self._date, self._amount, self._category, self._comment]
+
+    def _column(self, name: str) -> npt.NDArray[Any]:
+        columns: dict[str, npt.NDArray[Any]] = {
+            'pk': self._pk, 'date': self._date, 'amount': self._amount,
+            'category_id': self._category, 'comment': self._comment,
+        }
+        return columns[name][:self._size]
+
+    def _sortable(self, name: str) -> npt.NDArray[Any]:
+        # комментарии сравниваются по порядковым номерам в пуле
+        if name == 'comment':
+            return self._comment_ranks()[self._comment[:self._size]]
+        return self._column(name)
+
+    def _decode(self, name: str, values: npt.NDArray[Any]) -> list[Any]:
+        """
+        Преобразовать значения из _sortable в значения атрибутов Expense
+        """
+
+        if name == 'date':
+            return list(values.astype('datetime64[us]').tolist())
+        if name == 'comment':
+            by_rank = sorted(self._pool)
+            return [by_rank[rank] for rank in values.tolist()]
+        return list(values.tolist())
+
+    @staticmethod
+    def _encode(name: str, value: Any) -> Any:
+        return to_microseconds(value) if name == 'date' else value
+
+    def _condition(self, name: str, cond: Any) -> npt.NDArray[np.bool_]:
+        if name == 'comment':
+            pool_mask = np.fromiter(
+                (cond.matches(s) if isinstance(cond, Predicate) else s == cond
+                 for s in self._pool), np.bool_, len(self._pool))
+            return pool_mask[self._comment[:self._size]]
+
+        column = self._column(name)
+        mask: npt.NDArray[np.bool_]
+        if cond is None:
+            mask = np.zeros(self._size, np.bool_)
+        elif isinstance(cond, In):
+            mask = np.isin(column, [self._encode(name, v) for v in cond.values
+                                    if v is not None])
+        elif isinstance(cond, Between):
+            low, high = self._encode(name, cond.low), self._encode(name, cond.high)
+            mask = (column >= low) & (column <= high)
+        elif type(cond) in _COMPARISONS:
+            mask = _COMPARISONS[type(cond)](column, self._encode(name, cond.value))
+        elif isinstance(cond, Predicate):
+            values = self._decode(name, column)
+            mask = np.fromiter(map(cond.matches, values), np.bool_, len(values))
+        else:
+            mask = column == self._encode(name, cond)
+        return mask
+
+    def _after(self, query: Query) -> npt.NDArray[np.bool_]:
+        """
+        Маска записей, находящихся после курсора query.after
+        """
+
+        assert query.after is not None
+        result = np.zeros(self._size, np.bool_)
+        prefix = np.ones(self._size, np.bool_)
+        for (name, desc), bound in zip(query.order, query.after):
+            if name == 'comment':
+                ids = self._comment[:self._size]
+                greater = np.array([(s < bound) if desc else (s > bound)
+                                    for s in self._pool], np.bool_)[ids]
+                equal = np.array([s == bound for s in self._pool], np.bool_)[ids]
+            else:
+                column, bound = self._column(name), self._encode(name, bound)
+                greater = column < bound if desc else column > bound
+                equal = column == bound
+            result |= prefix & greater
+            prefix &= equal
+        return result
+
+    def _mask(self, where: dict[str, Any] | None) -> npt.NDArray[np.bool_]:
+        mask = self._alive[:self._size].copy()
+        for name, cond in (where or {}).items():
+            self._check_fields([name])
+            mask &= self._condition(name, cond)
+        return mask
+
+    def mask(self, where: dict[str, Any] | None = None) -> npt.NDArray[np.bool_]:
+        """
+        Получить маску записей, удовлетворяющих условию where, в порядке
+        массивов, возвращаемых columns()
+        """
+
+        return self._mask(where)[self._alive[:self._size]]
+
+    def columns(self, where: dict[str, Any] | None = None
+                ) -> dict[str, npt.NDArray[Any]]:
+        """
+        Получить копии столбцов записей, удовлетворяющих условию where,
+        в порядке pk: pk, date (datetime64[us]), amount, category_id
+        """
+
+        rows = np.flatnonzero(self._mask(where))
+        return {
+            'pk': self._pk[rows],
+            'date': self._date[rows].astype('datetime64[us]'),
+            'amount': self._amount[rows],
+            'category_id': self._category[rows],
+        }
+
+    def find(self, query: Query) -> list[Expense]:
+        self._check_fields(query.fields())
+        mask = self._mask(query.where)
+        if query.after is not None:
+            mask &= self._after(query)
+        rows = np.flatnonzero(mask)
+
+        end = None if query.limit is None else query.offset + query.limit
+        if query.order:
+            keys = []
+            for name, desc in query.order:
+                key = self._sortable(name)[rows]
+                keys.append(-key if desc else key)
+            if end is not None and end < len(rows):
+                # достаточно отсортировать записи, не дальше end-й по первому ключу
+                kth = np.partition(keys[0], end - 1)[end - 1]
+                selected = keys[0] <= kth
+                rows = rows[selected]
+                keys = [key[selected] for key in keys]
+            rows = rows[np.lexsort(keys[::-1])]
+        return self._objects(rows[query.offset:end])
+
+    def get_all(self, where: dict[str, Any] | None = None) -> list[Expense]:
+        return self.find(Query(where=where or {}))
+
+    def iter_all(self, where: dict[str, Any] | None = None,
+                 batch_size: int = 1000) -> Iterator[Expense]:
+        if batch_size < 1:
+            raise ValueError('`batch_size` must be positive')
+        rows = np.flatnonzero(self._mask(where))
+        for start in range(0, len(rows), batch_size):
+            yield from self._objects(rows[start:start + batch_size])
+
+    def aggregate(self, func: AggregateFunc, field: str = 'pk',
+                  where: dict[str, Any] | None = None,
+                  group_by: str | tuple[str, ...] | None = None) -> Any:
+        if func not in ('sum', 'count', 'min', 'max'):
+            raise ValueError(f'unknown aggregate function {func}')
+        groups = (() if group_by is None
+                  else (group_by,) if isinstance(group_by, str) else group_by)
+        self._check_fields({field, *groups})
+        if func == 'sum' and field == 'comment':
+            raise ValueError('cannot sum text field comment')
+
+        rows = np.flatnonzero(self._mask(where))
+        values = self._sortable(field)[rows]
+        if group_by is None:
+            if func == 'count':
+                return len(rows)
+            if func == 'sum':
+                return values.sum().item() if len(rows) else 0
+            if not len(rows):
+                return None
+            return self._decode(field, np.array([getattr(values, func)()]))[0]
+
+        group_keys = [self._sortable(name)[rows] for name in groups]
+        unique, inverse = self._groups(group_keys)
+
+        if func == 'count':
+            results = np.bincount(inverse, minlength=len(unique))
+        elif func == 'sum' and values.dtype.kind == 'f':
+            results = np.bincount(inverse, weights=values, minlength=len(unique))
+        elif func == 'sum':
+            results = np.zeros(len(unique), values.dtype)
+            np.add.at(results, inverse, values)
+        else:
+            # каждая группа начинается со своего первого значения
+            first = np.unique(inverse, return_index=True)[1]
+            results = values[first]
+            getattr(np, 'minimum' if func == 'min' else 'maximum').at(
+                results, inverse, values)
+
+        decoded = (self._decode(field, results) if func in ('min', 'max')
+                   else results.tolist())
+        key_columns = [self._decode(name, unique[:, i]) for i, name in enumerate(groups)]
+        keys = (key_columns[0] if isinstance(group_by, str)
+                else list(zip(*key_columns)))
+        return dict(zip(keys, decoded))
+
+    @staticmethod
+    def _groups(keys: list[npt.NDArray[Any]]
+                ) -> tuple[npt.NDArray[Any], npt.NDArray[np.intp]]:
+        """
+        Разбить строки на группы по значениям ключей
+
+        Returns
+        -------
+        Значения ключей групп (по строке на группу) и номер группы каждой строки
+        """
+
+        key = keys[0]
+        if (len(keys) == 1 and key.dtype.kind in 'iu' and len(key)
+                and 0 <= key.min() and key.max() < 4 * len(key) + 1024):
+            # небольшие целые ключи (id категорий) группируются без сортировки
+            present = np.bincount(key) > 0
+            slots = np.cumsum(present) - 1
+            return np.flatnonzero(present).reshape(-1, 1), slots[key]
+        unique, inverse = np.unique(np.stack(keys, axis=1), axis=0, return_inverse=True)
+        return unique, inverse.reshape(-1)
+
+    def sum_by_period(self, interval: Interval, where: dict[str, Any] | None = None,
+                      by_category: bool = False) -> dict[Any, float]:
+        """
+        Вычислить суммы расходов по периодам
+
+        Parameters
+        ----------
+        interval - "День", "Неделя" (с понедельника) или "Месяц"
+        where - условие отбора, как в find
+        by_category - дополнительно группировать по категориям
+
+        Returns
+        -------
+        Словарь {начало периода: сумма} или {(начало периода, категория): сумма}
+        """
+
+        rows = np.flatnonzero(self._mask(where))
+        ids = bucket_ids(self._date[rows], interval)
+        keys: list[npt.NDArray[Any]] = [ids]
+        if by_category:
+            keys.append(self._category[rows])
+        unique, inverse = self._groups(keys)
+        sums = np.bincount(inverse, weights=self._amount[rows], minlength=len(unique))
+        periods = bucket_starts(unique[:, 0], interval).astype('datetime64[us]').tolist()
+        if by_category:
+            return dict(zip(zip(periods, unique[:, 1].tolist()), sums.tolist()))
+        return dict(zip(periods, sums.tolist()))
+
+    # изменение
+
+    def add(self, obj: Expense) -> int:
+        return self.add_many([obj])[0]
+
+    def add_many(self, objs: Iterable[Expense]) -> list[int]:
+        objs = list(objs)
+        for obj in objs:
+            if getattr(obj, 'pk', None) != 0:
+                raise ValueError(f'trying to add object {obj} with filled `pk` attribute')
+
+        dates = np.array([obj.date for obj in objs], 'datetime64[us]').view(np.int64)
+        primary_keys = self._append(
+            dates, np.array([obj.amount for obj in objs], np.float64),
+            np.array([obj.category_id for obj in objs], np.int32),
+            self._intern(obj.comment for obj in objs)).tolist()
+        for primary_key, obj in zip(primary_keys, objs):
+            obj.pk = primary_key
+        return list(primary_keys)
+
+    def add_columns(self, dates: npt.ArrayLike, amounts: npt.ArrayLike,
+                    category_ids: npt.ArrayLike,
+                    comments: Sequence[str] | None = None) -> npt.NDArray[np.int64]:
+        """
+        Добавить записи из столбцов без создания объектов Expense
+
+        Parameters
+        ----------
+        dates - даты (datetime64 или микросекунды от начала эпохи)
+        amounts - суммы
+        category_ids - id категорий
+        comments - комментарии, по умолчанию пустые
+
+        Returns
+        -------
+        Массив pk добавленных записей
+        """
+
+        dates = np.asarray(dates)
+        if dates.dtype.kind == 'M':
+            dates = dates.astype('datetime64[us]').view(np.int64)
+        amounts = np.asarray(amounts, np.float64)
+        if comments is None:
+            comment_ids = self._intern(['']).repeat(len(amounts))
+        else:
+            comment_ids = self._intern(comments)
+        return self._append(dates.astype(np.int64), amounts,
+                            np.asarray(category_ids, np.int32), comment_ids)
+
+    def get(self, primary_key: int) -> Expense | None:
+        rows, found = self._rows([primary_key])
+        if not found[0]:
+            return None
+        return self._objects(rows)[0]
+
+    def update(self, obj: Expense) -> None:
+        self.update_many([obj])
+
+    def update_many(self, objs: Iterable[Expense]) -> None:
+        objs = list(objs)
+        rows, found = self._rows([obj.pk for obj in objs])
+        if not found.all():
+            raise ValueError('trying to update objects that are not in the repository')
+
+        old = [array[rows] for array in self._data_arrays()]
+        self._date[rows] = np.array([obj.date for obj in objs],
+                                    'datetime64[us]').view(np.int64)
+        self._amount[rows] = [obj.amount for obj in objs]
+        self._category[rows] = [obj.category_id for obj in objs]
+        self._comment[rows] = self._intern(obj.comment for obj in objs)
+        self._version += 1
+
+        def undo() -> None:
+            # при повторе pk в objs восстанавливается самое раннее значение
+            # массивы могли быть перевыделены при добавлении записей
+            for array, values in zip(self._data_arrays(), old):
+                array[rows[::-1]] = values[::-1]
+        self._log(undo)
+
+    def delete(self, primary_key: int) -> None:
+        self.delete_many([primary_key])
+
+    def delete_many(self, primary_keys: Iterable[int]) -> None:
+        primary_keys = list(dict.fromkeys(primary_keys))
+        rows, found = self._rows(primary_keys)
+        if not found.all():
+            raise KeyError([pk for pk, ok in zip(primary_keys, found) if not ok])
+
+        self._alive[rows] = False
+        self._dead += len(rows)
+        self._version += 1
+
+        def undo() -> None:
+            self._alive[rows] = True
+            self._dead -= len(rows)
+        self._log(undo)
+
+        # внутри транзакции строки не сдвигаются, чтобы журнал отмены был верен
+        if not self._undo and self._dead > self._size // 2:
+            self._compact()
+
+    def data_version(self) -> int:
+        return self._version
+
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        self._undo.append([])
+        try:
+            yield
+        except BaseException:
+            for undo in reversed(self._undo.pop()):
+                undo()
+            self._version += 1
+            raise
+        else:
+            log = self._undo.pop()
+            if self._undo:
+                self._undo[-1].extend(log)
@@ -0,0 +1,48 @@
+"""
+Модуль описывает объявление вторичных индексов модели
+
+Модель перечисляет индексы в атрибуте класса db_indexes, репозиторий создает
+и проверяет их при инициализации таблицы.
+"""
+
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class Index:
+    """
+    Вторичный индекс таблицы модели.
+    columns - ключевые столбцы индекса
+    include - столбцы, добавляемые в конец ключа, чтобы индекс был покрывающим
+    where - условие частичного индекса (SQL выражение)
+    unique - уникальный индекс
+    name - название индекса, по умолчанию <таблица>_<столбцы>
+    """
+    columns: tuple[str, ...]
+    include: tuple[str, ...] = ()
+    where: str | None = None
+    unique: bool = False
+    name: str | None = None
+
+    def index_name(self, table_name: str) -> str:
+        """
+        Получить название индекса для таблицы
+        """
+
+        if self.name is not None:
+            return self.name
+        return f'{table_name}_{"_".join(self.columns)}'
+
+    def create_sql(self, table_name: str) -> str:
+        """
+        Получить SQL запрос создания индекса в том виде,
+        в котором SQLite хранит его в sqlite_master
+        """
+
+        unique = 'UNIQUE ' if self.unique else ''
+        columns = ', '.join(self.columns + self.include)
+        name = self.index_name(table_name)
+        sql = f'CREATE {unique}INDEX {name} ON {table_name} ({columns})'
+        if self.where is not None:
+            sql += f' WHERE {self.where}'
+        return sql
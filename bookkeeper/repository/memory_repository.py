@@ -2,44 +2,345 @@
 Модуль описывает репозиторий, работающий в оперативной памяти
 """
 
+from contextlib import contextmanager
 from itertools import count
-from typing import Any
+from operator import attrgetter
+from typing import Any, Callable, Iterable, Iterator
 
 from bookkeeper.repository.abstract_repository import AbstractRepository, T
+from bookkeeper.repository.query import (AggregateFunc, In, Predicate, Query, aggregate,
+                                         matches)
+
+
+# снимок объекта: значения атрибутов из __slots__ и копия __dict__ (None - нет)
+Snapshot = tuple[tuple[Any, ...], dict[str, Any] | None]
+
+# незаданный атрибут из __slots__
+_UNSET = object()
+
+# по классам: имена атрибутов из __slots__, их получение, есть ли __dict__
+_LAYOUTS: dict[type, tuple[tuple[str, ...], Callable[[Any], Any], bool]] = {}
+
+
+def _layout(cls: type) -> tuple[tuple[str, ...], Callable[[Any], Any], bool]:
+    layout = _LAYOUTS.get(cls)
+    if layout is None:
+        found: list[str] = []
+        for klass in cls.__mro__:
+            slots = getattr(klass, '__slots__', ())
+            found.extend((slots,) if isinstance(slots, str) else slots)
+        names = tuple(name for name in found if name not in ('__dict__', '__weakref__'))
+        getter = attrgetter(*names) if len(names) > 1 else (
+            lambda obj: tuple(getattr(obj, name) for name in names))
+        layout = _LAYOUTS[cls] = (names, getter, cls.__dictoffset__ != 0)
+    return layout
+
+
+def _snapshot(obj: Any) -> Snapshot:
+    """
+    Снимок атрибутов объекта, в том числе объявленных в __slots__
+    """
+
+    names, getter, has_dict = _layout(type(obj))
+    try:
+        values = getter(obj)
+    except AttributeError:
+        values = tuple(getattr(obj, name, _UNSET) for name in names)
+    return values, (obj.__dict__.copy() if has_dict else None)
+
+
+def _restore(obj: Any, snapshot: Snapshot) -> None:
+    """
+    Вернуть атрибуты объекта к снимку _snapshot
+    """
+
+    names = _layout(type(obj))[0]
+    values, attributes = snapshot
+    # object.__setattr__ работает и для frozen dataclass
+    for name, value in zip(names, values):
+        if value is _UNSET:
+            if hasattr(obj, name):
+                object.__delattr__(obj, name)
+        else:
+            object.__setattr__(obj, name, value)
+    if attributes is not None:
+        obj.__dict__.clear()
+        obj.__dict__.update(attributes)
 
 
 class MemoryRepository(AbstractRepository[T]):
     """
     Репозиторий, работающий в оперативной памяти. Хранит данные в словаре.
+    Внутри транзакции ведется журнал отмены: прежние значения измененных
+    записей, по которому изменения откатываются при исключении. Для записей,
+    уже записанных в транзакции, прежние значения берутся из снимков атрибутов,
+    сделанных при записи, поэтому откатывается и изменение такого объекта
+    на месте до повторного вызова update. Снимки хранятся до конца внешней
+    транзакции. Изменение на месте объекта, записанного до транзакции,
+    не откатывается: восстанавливаются ссылка на объект и индексы.
+
+    indexes - поля, по которым строятся хэш-индексы {значение поля: pk записей}.
+    Индексы поддерживаются при изменениях и используются для условий
+    на равенство и In в get_all, find, iter_all и aggregate: просматриваются
+    только записи наименьшего подходящего блока индекса. Для запросов
+    иерархии индекс по полю родителя строится автоматически.
     """
 
-    def __init__(self) -> None:
+    def __init__(self, indexes: Iterable[str] = ()) -> None:
         self._container: dict[int, T] = {}
         self._counter = count(1)
+        # снимки атрибутов записей на момент последней записи в транзакции
+        self._saved: dict[int, Snapshot] = {}
+        # журнал отмены: (pk, прежний объект и снимок - None, если записан
+        # до транзакции, или None - записи не было)
+        self._undo: list[list[tuple[int, tuple[T, Snapshot | None] | None]]] = []
+        self._version = 0
+        # индекс по полю: {значение: {pk: None}} и значения, с которыми
+        # записи попали в индекс (объект могут изменить до вызова update)
+        self._indexes: dict[str, dict[Any, dict[int, None]]] = {}
+        self._indexed_values: dict[str, dict[int, Any]] = {}
+        for field in indexes:
+            self._index(field)
+
+    @property
+    def indexes(self) -> list[str]:
+        """ Поля, по которым построены индексы """
+        return list(self._indexes)
+
+    def _index(self, field: str) -> dict[Any, dict[int, None]]:
+        index = self._indexes.get(field)
+        if index is None:
+            index = {}
+            values = {}
+            for primary_key, obj in self._container.items():
+                value = values[primary_key] = getattr(obj, field)
+                index.setdefault(value, {})[primary_key] = None
+            self._indexes[field] = index
+            self._indexed_values[field] = values
+        return index
+
+    def _set(self, primary_key: int, obj: T | None) -> None:
+        """
+        Записать объект (None - удалить запись), обновив индексы
+        """
+
+        for field, index in self._indexes.items():
+            values = self._indexed_values[field]
+            if primary_key in values:
+                if obj is not None and values[primary_key] == getattr(obj, field):
+                    continue
+                old = values.pop(primary_key)
+                bucket = index[old]
+                del bucket[primary_key]
+                if not bucket:
+                    del index[old]
+            if obj is not None:
+                value = values[primary_key] = getattr(obj, field)
+                index.setdefault(value, {})[primary_key] = None
+
+        if obj is None:
+            self._container.pop(primary_key, None)
+            self._saved.pop(primary_key, None)
+        else:
+            self._container[primary_key] = obj
+            if self._undo:
+                self._saved[primary_key] = _snapshot(obj)
+        self._version += 1
+
+    def _previous(self, primary_key: int) -> tuple[T, Snapshot | None] | None:
+        obj = self._container.get(primary_key)
+        return None if obj is None else (obj, self._saved.get(primary_key))
+
+    def _put(self, primary_key: int, obj: T) -> None:
+        if self._undo:
+            self._undo[-1].append((primary_key, self._previous(primary_key)))
+        self._set(primary_key, obj)
+
+    def _remove(self, primary_key: int) -> None:
+        if primary_key not in self._container:
+            raise KeyError(primary_key)
+        if self._undo:
+            self._undo[-1].append((primary_key, self._previous(primary_key)))
+        self._set(primary_key, None)
+
+    def _rollback(self, log: list[tuple[int, tuple[T, Snapshot | None] | None]]
+                  ) -> None:
+        for primary_key, previous in reversed(log):
+            if previous is None:
+                self._set(primary_key, None)
+                continue
+            obj, saved = previous
+            # объект мог быть изменен после записи: восстанавливается снимок
+            if saved is not None:
+                _restore(obj, saved)
+            self._set(primary_key, obj)
+
+    def data_version(self) -> int:
+        return self._version
+
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        self._undo.append([])
+        try:
+            yield
+        except BaseException:
+            self._rollback(self._undo.pop())
+            raise
+        else:
+            log = self._undo.pop()
+            if self._undo:
+                self._undo[-1].extend(log)
+        finally:
+            if not self._undo:
+                self._saved.clear()
 
     def add(self, obj: T) -> int:
         if getattr(obj, 'pk', None) != 0:
             raise ValueError(f'trying to add object {obj} with filled `pk` attribute')
 
         primary_key = next(self._counter)
-        self._container[primary_key] = obj
         obj.pk = primary_key
+        self._put(primary_key, obj)
 
         return primary_key
 
+    def add_many(self, objs: Iterable[T]) -> list[int]:
+        objs = list(objs)
+        for obj in objs:
+            if getattr(obj, 'pk', None) != 0:
+                raise ValueError(f'trying to add object {obj} with filled `pk` attribute')
+
+        added = {next(self._counter): obj for obj in objs}
+        for primary_key, obj in added.items():
+            obj.pk = primary_key
+        if self._undo:
+            self._undo[-1].extend((primary_key, None) for primary_key in added)
+        if self._indexes:
+            for primary_key, obj in added.items():
+                self._set(primary_key, obj)
+        else:
+            self._container.update(added)
+            if self._undo:
+                self._saved.update((primary_key, _snapshot(obj))
+                                   for primary_key, obj in added.items())
+            self._version += 1
+
+        return list(added)
+
     def get(self, primary_key: int) -> T | None:
         return self._container.get(primary_key)
 
+    def _candidates(self, where: dict[str, Any] | None) -> Iterable[T]:
+        """
+        Получить записи, среди которых находятся удовлетворяющие условию:
+        наименьший подходящий блок индекса или все записи
+        """
+
+        if not where or not self._indexes:
+            return self._container.values()
+
+        best: list[dict[int, None]] | None = None
+        for field, cond in where.items():
+            index = self._indexes.get(field)
+            if index is None:
+                continue
+            if isinstance(cond, In):
+                keys = cond.values
+            elif isinstance(cond, Predicate):
+                continue
+            else:
+                keys = (cond,)
+            try:
+                buckets = [index[key] for key in keys if key in index]
+            except TypeError:
+                # нехэшируемое значение
+                continue
+            if best is None or sum(map(len, buckets)) < sum(map(len, best)):
+                best = buckets
+
+        if best is None:
+            return self._container.values()
+        primary_keys = sorted(pk for bucket in best for pk in bucket)
+        return [self._container[pk] for pk in primary_keys]
+
     def get_all(self, where: dict[str, Any] | None = None) -> list[T]:
         if where is None:
             return list(self._container.values())
-        return [obj for obj in self._container.values()
+        return [obj for obj in self._candidates(where)
                 if all(getattr(obj, attr) == value for attr, value in where.items())]
 
+    def find(self, query: Query) -> list[T]:
+        return query.apply(self._candidates(query.where))
+
+    def iter_all(self, where: dict[str, Any] | None = None,
+                 batch_size: int = 1000) -> Iterator[T]:
+        if batch_size < 1:
+            raise ValueError('`batch_size` must be positive')
+        # снимок ссылок позволяет изменять репозиторий во время обхода
+        for obj in tuple(self._candidates(where)):
+            if where is None or matches(obj, where):
+                yield obj
+
+    def aggregate(self, func: AggregateFunc, field: str = 'pk',
+                  where: dict[str, Any] | None = None,
+                  group_by: str | tuple[str, ...] | None = None) -> Any:
+        objs = (obj for obj in self._candidates(where)
+                if where is None or matches(obj, where))
+        return aggregate(objs, func, field, group_by)
+
+    def descendants(self, primary_key: int, parent_field: str = 'parent') -> list[T]:
+        if primary_key not in self._container:
+            return []
+        children = self._index(parent_field)
+        result: list[T] = []
+        visited = {primary_key}
+        level = [primary_key]
+        while level:
+            level = sorted(child for parent in level for child in children.get(parent, ())
+                           if child not in visited)
+            visited.update(level)
+            result.extend(self._container[child] for child in level)
+        return result
+
+    def ancestors(self, primary_key: int, parent_field: str = 'parent') -> list[T]:
+        result: list[T] = []
+        visited = {primary_key}
+        obj = self._container.get(primary_key)
+        while obj is not None:
+            parent = getattr(obj, parent_field)
+            if parent is None or parent in visited:
+                break
+            visited.add(parent)
+            obj = self._container.get(parent)
+            if obj is not None:
+                result.append(obj)
+        return result
+
+    def subtree_ids(self, primary_key: int, parent_field: str = 'parent') -> list[int]:
+        if primary_key not in self._container:
+            return []
+        return [primary_key] + [obj.pk for obj
+                                in self.descendants(primary_key, parent_field)]
+
     def update(self, obj: T) -> None:
         if obj.pk == 0:
             raise ValueError('attempt to update object with unknown primary key')
-        self._container[obj.pk] = obj
+        self._put(obj.pk, obj)
+
+    def update_many(self, objs: Iterable[T]) -> None:
+        objs = list(objs)
+        if any(obj.pk == 0 for obj in objs):
+            raise ValueError('attempt to update object with unknown primary key')
+        for obj in objs:
+            self._put(obj.pk, obj)
 
     def delete(self, primary_key: int) -> None:
-        self._container.pop(primary_key)
+        self._remove(primary_key)
+
+    def delete_many(self, primary_keys: Iterable[int]) -> None:
+        primary_keys = list(dict.fromkeys(primary_keys))
+        missing = [pk for pk in primary_keys if pk not in self._container]
+        if missing:
+            raise KeyError(missing)
+        for primary_key in primary_keys:
+            self._remove(primary_key)
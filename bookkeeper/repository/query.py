@@ -0,0 +1,282 @@
+"""
+Модуль описывает объект запроса к репозиторию и условия сравнения
+
+Условие where - словарь {'название_поля': значение}, где значение либо
+сравнивается на равенство, либо является одним из условий Lt, Le, Gt, Ge,
+In, Between. Порядок задается кортежем названий полей, минус перед названием
+означает сортировку по убыванию. Постраничный вывод возможен через
+limit/offset или через курсор after - значения полей order_by последней
+записи предыдущей страницы.
+"""
+
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field, replace
+from heapq import nlargest, nsmallest
+from typing import Any, Callable, Iterable, Literal
+
+
+class Predicate(ABC):
+    """
+    Условие на значение поля
+    """
+
+    @abstractmethod
+    def matches(self, value: Any) -> bool:
+        """ Проверить, удовлетворяет ли значение условию """
+
+    @abstractmethod
+    def to_sql(self, column: str) -> str:
+        """ Получить SQL выражение с параметрами ? для столбца """
+
+    @abstractmethod
+    def params(self) -> list[Any]:
+        """ Получить значения параметров SQL выражения """
+
+
+@dataclass(frozen=True)
+class _Compare(Predicate):
+    value: Any
+    op = ''
+
+    def matches(self, value: Any) -> bool:
+        if value is None:
+            return False
+        return bool(_OPERATORS[self.op](value, self.value))
+
+    def to_sql(self, column: str) -> str:
+        return f'{column} {self.op} ?'
+
+    def params(self) -> list[Any]:
+        return [self.value]
+
+
+_OPERATORS: dict[str, Callable[[Any, Any], Any]] = {
+    '<': lambda a, b: a < b,
+    '<=': lambda a, b: a <= b,
+    '>': lambda a, b: a > b,
+    '>=': lambda a, b: a >= b,
+}
+
+
+class Lt(_Compare):
+    """ Значение поля меньше value """
+    op = '<'
+
+
+class Le(_Compare):
+    """ Значение поля не больше value """
+    op = '<='
+
+
+class Gt(_Compare):
+    """ Значение поля больше value """
+    op = '>'
+
+
+class Ge(_Compare):
+    """ Значение поля не меньше value """
+    op = '>='
+
+
+@dataclass(frozen=True)
+class In(Predicate):
+    """ Значение поля входит в набор values """
+    values: tuple[Any, ...]
+
+    def __init__(self, values: Iterable[Any]) -> None:
+        object.__setattr__(self, 'values', tuple(values))
+
+    def matches(self, value: Any) -> bool:
+        return value in self.values
+
+    def to_sql(self, column: str) -> str:
+        if not self.values:
+            return '0'
+        return f'{column} IN ({", ".join("?" * len(self.values))})'
+
+    def params(self) -> list[Any]:
+        return list(self.values)
+
+
+@dataclass(frozen=True)
+class Between(Predicate):
+    """ Значение поля лежит в отрезке [low, high] """
+    low: Any
+    high: Any
+
+    def matches(self, value: Any) -> bool:
+        return value is not None and bool(self.low <= value <= self.high)
+
+    def to_sql(self, column: str) -> str:
+        return f'{column} BETWEEN ? AND ?'
+
+    def params(self) -> list[Any]:
+        return [self.low, self.high]
+
+
+def matches(obj: Any, where: dict[str, Any]) -> bool:
+    """
+    Проверить, удовлетворяет ли объект условию where
+    """
+
+    for attr, cond in where.items():
+        value = getattr(obj, attr)
+        if isinstance(cond, Predicate):
+            if not cond.matches(value):
+                return False
+        elif value != cond:
+            return False
+    return True
+
+
+def _sort_key(value: Any) -> tuple[bool, Any]:
+    # как и в SQLite, None меньше любого значения
+    return value is not None, value
+
+
+def _attr_key(name: str) -> Callable[[Any], tuple[bool, Any]]:
+    return lambda obj: _sort_key(getattr(obj, name))
+
+
+@dataclass(frozen=True)
+class Query:
+    """
+    Запрос к репозиторию.
+    where - условие отбора
+    order_by - поля сортировки, '-поле' - по убыванию
+    limit - максимальное количество записей
+    offset - количество пропускаемых записей
+    after - значения полей order_by, после которых начинается выборка
+    """
+    where: dict[str, Any] = field(default_factory=dict)
+    order_by: tuple[str, ...] = ()
+    limit: int | None = None
+    offset: int = 0
+    after: tuple[Any, ...] | None = None
+
+    def __post_init__(self) -> None:
+        if self.after is not None and len(self.after) != len(self.order_by):
+            raise ValueError('`after` must contain a value for every `order_by` field')
+
+    @property
+    def order(self) -> list[tuple[str, bool]]:
+        """
+        Поля сортировки в виде пар (название, по убыванию)
+        """
+
+        return [(name[1:], True) if name.startswith('-') else (name, False)
+                for name in self.order_by]
+
+    def fields(self) -> set[str]:
+        """
+        Все поля, упомянутые в запросе
+        """
+
+        return set(self.where) | {name for name, _ in self.order}
+
+    def equality(self) -> dict[str, Any]:
+        """
+        Часть условия where, состоящая только из сравнений на равенство
+        """
+
+        return {k: v for k, v in self.where.items() if not isinstance(v, Predicate)}
+
+    def next_page(self, last: Any) -> 'Query':
+        """
+        Получить запрос следующей страницы после объекта last
+        """
+
+        return replace(self, offset=0,
+                       after=tuple(getattr(last, name) for name, _ in self.order))
+
+    def is_after(self, obj: Any) -> bool:
+        """
+        Проверить, находится ли объект после курсора after в порядке order_by
+        """
+
+        if self.after is None:
+            return True
+        for (name, desc), bound in zip(self.order, self.after):
+            value, bound_key = _sort_key(getattr(obj, name)), _sort_key(bound)
+            if value != bound_key:
+                return value < bound_key if desc else value > bound_key
+        return False
+
+    def apply(self, objs: Iterable[Any]) -> list[Any]:
+        """
+        Выполнить запрос над набором объектов: отфильтровать, отсортировать
+        и выбрать нужную страницу
+        """
+
+        selected: Iterable[Any] = (obj for obj in objs
+                                   if matches(obj, self.where) and self.is_after(obj))
+        order = self.order
+        end = None if self.limit is None else self.offset + self.limit
+
+        if order and len({desc for _, desc in order}) == 1:
+            desc = order[0][1]
+
+            def key(obj: Any) -> tuple[tuple[bool, Any], ...]:
+                return tuple(_sort_key(getattr(obj, name)) for name, _ in order)
+
+            if end is not None:
+                top = nlargest if desc else nsmallest
+                return top(end, selected, key=key)[self.offset:]
+            return sorted(selected, key=key, reverse=desc)[self.offset:]
+
+        result = list(selected)
+        for name, desc in reversed(order):
+            result.sort(key=_attr_key(name), reverse=desc)
+        return result[self.offset:end]
+
+
+AggregateFunc = Literal['sum', 'count', 'min', 'max']
+
+
+def _group_key(obj: Any, group_by: str | tuple[str, ...]) -> Any:
+    if isinstance(group_by, str):
+        return getattr(obj, group_by)
+    return tuple(getattr(obj, name) for name in group_by)
+
+
+def aggregate(objs: Iterable[Any], func: AggregateFunc, field_name: str,
+              group_by: str | tuple[str, ...] | None = None) -> Any:
+    """
+    Вычислить агрегатную функцию по полю за один проход по объектам.
+    Значения None пропускаются, как в SQL.
+
+    Parameters
+    ----------
+    objs - объекты
+    func - 'sum', 'count', 'min' или 'max'
+    field_name - поле, по которому вычисляется функция
+    group_by - поле или кортеж полей группировки
+
+    Returns
+    -------
+    Значение функции (0 для пустых sum и count, None для min и max)
+    или словарь {ключ группы: значение}, если задан group_by
+    """
+
+    if func not in ('sum', 'count', 'min', 'max'):
+        raise ValueError(f'unknown aggregate function {func}')
+
+    results: dict[Any, Any] = {}
+    for obj in objs:
+        value = getattr(obj, field_name)
+        key = None if group_by is None else _group_key(obj, group_by)
+        if key not in results:
+            results[key] = 0 if func in ('sum', 'count') else None
+        if value is None:
+            continue
+        current = results[key]
+        if func == 'sum':
+            results[key] = current + value
+        elif func == 'count':
+            results[key] = current + 1
+        elif current is None or (value < current if func == 'min' else value > current):
+            results[key] = value
+
+    if group_by is None:
+        return results.get(None, 0 if func in ('sum', 'count') else None)
+    return results
@@ -0,0 +1,167 @@
+"""
+Модуль описывает объявление сводных таблиц (rollup) модели
+
+Модель перечисляет сводные таблицы в атрибуте класса db_rollups. SQLiteRepository
+создает для каждой таблицу вида <таблица>_daily(day, <группы>, total, count)
+и триггеры AFTER INSERT/UPDATE/DELETE, которые поддерживают ее в актуальном
+состоянии при любых изменениях файла базы данных, в том числе другими
+процессами. Запросы aggregate, которые можно ответить по сводной таблице
+(сумма или количество по диапазону дат, выровненному по границам периодов),
+выполняются по ней, и их стоимость зависит от количества периодов,
+а не от количества записей.
+"""
+
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Literal
+
+from bookkeeper.repository.query import Between, Ge, Gt, Le, Lt, Predicate
+
+_PERIODS = {
+    # период: (название столбца, суффикс таблицы, SQL выражение ключа, формат ключа)
+    'day': ('day', 'daily', "date({})", '%Y-%m-%d'),
+    'month': ('month', 'monthly', "strftime('%Y-%m', {})", '%Y-%m'),
+}
+
+
+def _is_start(value: Any, period: str) -> bool:
+    # значения дат хранятся с точностью до секунды
+    if not isinstance(value, datetime):
+        return False
+    value = value.replace(microsecond=0)
+    return value.time() == datetime.min.time() and (period == 'day' or value.day == 1)
+
+
+def _is_end(value: Any, period: str) -> bool:
+    return isinstance(value, datetime) and _is_start(
+        value.replace(microsecond=0) + timedelta(seconds=1), period)
+
+
+@dataclass(frozen=True)
+class Rollup:
+    """
+    Сводная таблица: сумма поля value и количество записей по периодам
+    поля даты и столбцам группировки.
+    period - период: 'day' или 'month'
+    group_by - столбцы группировки
+    date_column - столбец даты
+    value - суммируемый столбец
+    """
+    period: Literal['day', 'month']
+    group_by: tuple[str, ...] = ()
+    date_column: str = 'date'
+    value: str = 'amount'
+
+    @property
+    def key_column(self) -> str:
+        """ Столбец периода сводной таблицы ('day' или 'month') """
+        return _PERIODS[self.period][0]
+
+    def table_name(self, table_name: str) -> str:
+        """
+        Получить название сводной таблицы для таблицы модели
+        """
+
+        return f'{table_name}_{_PERIODS[self.period][1]}'
+
+    def _key_sql(self, row: str) -> str:
+        return _PERIODS[self.period][2].format(f'{row}.{self.date_column}')
+
+    def key(self, value: datetime) -> str:
+        """
+        Получить значение ключа периода, содержащего дату value
+        """
+
+        return value.strftime(_PERIODS[self.period][3])
+
+    def create_sql(self, table_name: str, column_types: dict[str, str]) -> str:
+        """
+        Получить SQL запрос создания сводной таблицы.
+        Строки с NULL в столбцах группировки не сливаются
+        (UNIQUE допускает повторяющиеся NULL), но суммы по ним остаются верными
+        """
+
+        columns = [self.key_column, *self.group_by]
+        groups = ''.join(f', {c} {column_types[c]}' for c in self.group_by)
+        return (f'CREATE TABLE {self.table_name(table_name)} '
+                f'({self.key_column} TEXT{groups}, total REAL NOT NULL, '
+                f'count INTEGER NOT NULL, UNIQUE ({", ".join(columns)}))')
+
+    def _add_sql(self, table_name: str) -> str:
+        rollup = self.table_name(table_name)
+        columns = ', '.join([self.key_column, *self.group_by])
+        values = ', '.join([self._key_sql('NEW'), *(f'NEW.{c}' for c in self.group_by)])
+        return (f'INSERT INTO {rollup} ({columns}, total, count) '
+                f'VALUES ({values}, coalesce(NEW.{self.value}, 0), 1) '
+                f'ON CONFLICT ({columns}) DO UPDATE '
+                f'SET total = total + excluded.total, count = count + 1;')
+
+    def _remove_sql(self, table_name: str) -> str:
+        rollup = self.table_name(table_name)
+        match = ' AND '.join([f'{self.key_column} IS {self._key_sql("OLD")}',
+                              *(f'{c} IS OLD.{c}' for c in self.group_by)])
+        return (f'UPDATE {rollup} SET total = total - coalesce(OLD.{self.value}, 0), '
+                f'count = count - 1 '
+                f'WHERE rowid = (SELECT rowid FROM {rollup} WHERE {match} LIMIT 1); '
+                f'DELETE FROM {rollup} WHERE {match} AND count = 0;')
+
+    def triggers_sql(self, table_name: str) -> dict[str, str]:
+        """
+        Получить SQL запросы создания триггеров, поддерживающих сводную таблицу,
+        в том виде, в котором SQLite хранит их в sqlite_master
+
+        Returns
+        -------
+        Словарь {название триггера: SQL запрос}
+        """
+
+        rollup = self.table_name(table_name)
+        columns = ', '.join(dict.fromkeys([self.date_column, self.value,
+                                           *self.group_by]))
+        add, remove = self._add_sql(table_name), self._remove_sql(table_name)
+        return {
+            f'{rollup}_insert': (f'CREATE TRIGGER {rollup}_insert AFTER INSERT '
+                                 f'ON {table_name} BEGIN {add} END'),
+            f'{rollup}_update': (f'CREATE TRIGGER {rollup}_update AFTER UPDATE '
+                                 f'OF {columns} ON {table_name} '
+                                 f'BEGIN {remove} {add} END'),
+            f'{rollup}_delete': (f'CREATE TRIGGER {rollup}_delete AFTER DELETE '
+                                 f'ON {table_name} BEGIN {remove} END'),
+        }
+
+    def rebuild_sql(self, table_name: str) -> list[str]:
+        """
+        Получить SQL запросы пересчета сводной таблицы по таблице модели
+        """
+
+        rollup = self.table_name(table_name)
+        columns = ', '.join([self.key_column, *self.group_by])
+        groups = ''.join(f', {c}' for c in self.group_by)
+        positions = ', '.join(str(i) for i in range(1, len(self.group_by) + 2))
+        return [f'DELETE FROM {rollup}',
+                f'INSERT INTO {rollup} ({columns}, total, count) '
+                f'SELECT {self._key_sql(table_name)}{groups}, '
+                f'sum(coalesce({self.value}, 0)), count(*) FROM {table_name} '
+                f'GROUP BY {positions}']
+
+    def key_condition(self, cond: Any) -> Predicate | None:
+        """
+        Перевести условие на столбец даты в условие на столбец периода.
+        Возможно, если границы условия совпадают с границами периодов
+
+        Returns
+        -------
+        Условие на столбец периода или None, если условие не выражается
+        через периоды
+        """
+
+        if isinstance(cond, Between):
+            if _is_start(cond.low, self.period) and _is_end(cond.high, self.period):
+                return Between(self.key(cond.low), self.key(cond.high))
+        elif isinstance(cond, (Ge, Lt)):
+            if _is_start(cond.value, self.period):
+                return type(cond)(self.key(cond.value))
+        elif isinstance(cond, (Gt, Le)):
+            if _is_end(cond.value, self.period):
+                return type(cond)(self.key(cond.value))
+        return None
@@ -0,0 +1,338 @@
+"""
+Модуль с описанием менеджера соединений с базой данных SQLite
+
+Менеджер держит долгоживущие соединения с файлом базы данных: одно соединение
+для записи и небольшой пул соединений для чтения. Все репозитории, созданные
+для одного файла, по умолчанию используют общий менеджер.
+
+Настройки производительности SQLite задаются профилем pragma, который
+применяется один раз при открытии каждого соединения.
+"""
+
+from contextlib import contextmanager
+from dataclasses import dataclass
+from queue import Empty, LifoQueue
+from types import TracebackType
+from typing import Iterator
+
+import os
+import sqlite3
+import threading
+
+
+@dataclass(frozen=True)
+class PragmaProfile:
+    """
+    Набор pragma, определяющих баланс надежности и скорости.
+    journal_mode - режим журнала (WAL позволяет читать во время записи)
+    synchronous - частота fsync: FULL, NORMAL или OFF
+    cache_size - размер кэша страниц, отрицательное значение - в КиБ
+    mmap_size - объем файла, отображаемого в память, в байтах
+    temp_store - хранение временных таблиц: DEFAULT, FILE или MEMORY
+    busy_timeout - время ожидания блокировки в миллисекундах
+    """
+    journal_mode: str = 'WAL'
+    synchronous: str = 'FULL'
+    cache_size: int = -2000
+    mmap_size: int = 0
+    temp_store: str = 'DEFAULT'
+    busy_timeout: int = 5000
+
+    def apply(self, con: sqlite3.Connection) -> None:
+        """
+        Установить pragma профиля в соединение
+        """
+
+        con.execute('PRAGMA foreign_keys = ON')
+        con.execute(f'PRAGMA busy_timeout = {int(self.busy_timeout)}')
+        con.execute(f'PRAGMA journal_mode = {self.journal_mode}')
+        con.execute(f'PRAGMA synchronous = {self.synchronous}')
+        con.execute(f'PRAGMA cache_size = {int(self.cache_size)}')
+        con.execute(f'PRAGMA mmap_size = {int(self.mmap_size)}')
+        con.execute(f'PRAGMA temp_store = {self.temp_store}')
+
+
+PROFILES: dict[str, PragmaProfile] = {
+    # fsync при каждой фиксации, как в режиме по умолчанию, но в WAL
+    'durable': PragmaProfile(),
+    # fsync только при контрольных точках WAL: последняя транзакция
+    # может потеряться при отключении питания, но не повредит базу
+    'balanced': PragmaProfile(synchronous='NORMAL', cache_size=-32000,
+                              mmap_size=256 * 2**20, temp_store='MEMORY'),
+    # для массовой загрузки данных: без fsync, большой кэш
+    'bulk-load': PragmaProfile(synchronous='OFF', cache_size=-256000,
+                               mmap_size=2**30, temp_store='MEMORY',
+                               busy_timeout=30000),
+}
+
+DEFAULT_PROFILE = 'durable'
+
+
+def get_profile(profile: str | PragmaProfile) -> PragmaProfile:
+    """
+    Получить профиль pragma по названию из PROFILES
+    """
+
+    if isinstance(profile, PragmaProfile):
+        return profile
+    try:
+        return PROFILES[profile]
+    except KeyError:
+        raise ValueError(f'unknown pragma profile {profile!r}, '
+                         f'expected one of {sorted(PROFILES)}') from None
+
+
+class SQLiteConnectionManager:
+    """
+    Менеджер соединений с SQLite. Соединение для записи защищено блокировкой
+    и используется одним потоком в каждый момент времени, соединения для чтения
+    выдаются из пула. Поток, открывший транзакцию записи, читает через
+    соединение записи, чтобы видеть свои незафиксированные изменения.
+
+    Соединения открываются лениво и закрываются методом close или при выходе
+    из блока with. После закрытия менеджер можно использовать снова,
+    соединения будут открыты заново.
+
+    profile - профиль pragma (PragmaProfile или название из PROFILES)
+    """
+
+    _registry: dict[str, 'SQLiteConnectionManager'] = {}
+    _registry_lock = threading.Lock()
+
+    def __init__(self, db_file: str, readers: int = 4,
+                 profile: str | PragmaProfile = DEFAULT_PROFILE) -> None:
+        self.db_file = db_file
+        self.profile = get_profile(profile)
+        # каждое соединение с :memory: - отдельная база, поэтому читаем
+        # через соединение записи
+        self.readers = 0 if db_file == ':memory:' else readers
+        self._writer: sqlite3.Connection | None = None
+        self._writer_lock = threading.RLock()
+        self._writer_owner: int | None = None
+        self._depth = 0
+        self._pool: LifoQueue[tuple[int, sqlite3.Connection]] = LifoQueue()
+        self._pool_lock = threading.Lock()
+        self._opened_readers = 0
+        self._generation = 0
+        # транзакции записи с изменениями: всего, по таблицам и не отнесенные
+        # к таблицам; строки, измененные в текущей транзакции, по таблицам
+        self._transactions = 0
+        self._changes: dict[str, int] = {}
+        self._untracked = 0
+        self._touched: dict[str, int] = {}
+
+    @classmethod
+    def shared(cls, db_file: str,
+               profile: str | PragmaProfile | None = None) -> 'SQLiteConnectionManager':
+        """
+        Получить общий менеджер для файла базы данных
+
+        Parameters
+        ----------
+        db_file - путь к файлу базы данных
+        profile - профиль pragma; если задан и отличается от профиля
+        существующего менеджера, соединения будут переоткрыты с новым профилем
+
+        Returns
+        -------
+        Один и тот же SQLiteConnectionManager для одного и того же файла
+        """
+
+        key = db_file if db_file == ':memory:' else os.path.abspath(db_file)
+        with cls._registry_lock:
+            manager = cls._registry.get(key)
+            if manager is None:
+                manager = cls(db_file, profile=profile or DEFAULT_PROFILE)
+                cls._registry[key] = manager
+            elif profile is not None:
+                manager.set_profile(profile)
+            return manager
+
+    def set_profile(self, profile: str | PragmaProfile) -> None:
+        """
+        Сменить профиль pragma. Открытые соединения закрываются
+        и будут открыты заново с новым профилем
+        """
+
+        profile = get_profile(profile)
+        if profile != self.profile:
+            self.profile = profile
+            self.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        con = sqlite3.connect(self.db_file, isolation_level=None,
+                              check_same_thread=False)
+        self.profile.apply(con)
+        return con
+
+    def _get_writer(self) -> sqlite3.Connection:
+        if self._writer is None:
+            self._writer = self._connect()
+        return self._writer
+
+    def owns_writer(self) -> bool:
+        """
+        Проверить, открыта ли транзакция записи в текущем потоке
+        """
+
+        return self._writer_owner == threading.get_ident()
+
+    @contextmanager
+    def writer(self, counted: bool = True) -> Iterator[sqlite3.Connection]:
+        """
+        Получить соединение для записи внутри транзакции. При успешном выходе
+        из блока транзакция фиксируется, при исключении - откатывается.
+        Вложенные блоки в том же потоке выполняются в точках сохранения
+        (SAVEPOINT) внешней транзакции: исключение откатывает только
+        изменения вложенного блока, фиксация происходит один раз при выходе
+        из внешнего блока.
+
+        counted=False - транзакция внешнего блока не меняет data_version
+        (запись, уже учтенная в версии вызывающего, например очередь
+        WriteBehindRepository); во вложенном блоке не действует
+        """
+
+        with self._writer_lock:
+            con = self._get_writer()
+            if self._depth:
+                savepoint = f'sp{self._depth}'
+                con.execute(f'SAVEPOINT {savepoint}')
+                self._depth += 1
+                try:
+                    yield con
+                except BaseException:
+                    con.execute(f'ROLLBACK TO {savepoint}')
+                    con.execute(f'RELEASE {savepoint}')
+                    raise
+                else:
+                    con.execute(f'RELEASE {savepoint}')
+                finally:
+                    self._depth -= 1
+                return
+
+            con.execute('BEGIN IMMEDIATE')
+            self._depth = 1
+            self._writer_owner = threading.get_ident()
+            start = con.total_changes
+            try:
+                yield con
+            except BaseException:
+                if con.in_transaction:
+                    con.execute('ROLLBACK')
+                raise
+            else:
+                con.execute('COMMIT')
+            finally:
+                self._depth = 0
+                self._writer_owner = None
+                if counted:
+                    self._count_changes(con.total_changes - start)
+                self._touched.clear()
+
+    transaction = writer
+
+    def mark_changes(self, table: str, rows: int) -> None:
+        """
+        Отнести изменения строк текущей транзакции записи к таблице:
+        по завершении транзакции изменится версия данных только этой
+        таблицы. Вызывается внутри writer()
+        """
+
+        if rows and self.owns_writer():
+            self._touched[table] = self._touched.get(table, 0) + rows
+
+    def _count_changes(self, changed: int) -> None:
+        # транзакция без изменений строк не меняет версию; изменения,
+        # не отнесенные к таблицам, меняют версию всех таблиц
+        if not changed and not self._touched:
+            return
+        self._transactions += 1
+        for table in self._touched:
+            self._changes[table] = self._changes.get(table, 0) + 1
+        if changed > sum(self._touched.values()):
+            self._untracked += 1
+
+    def data_version(self, table: str | None = None) -> tuple[int, int, int]:
+        """
+        Получить версию данных базы или таблицы table. Значение меняется
+        после каждой транзакции записи этого менеджера, изменившей строки
+        (зафиксированной или откатанной; для таблицы - изменившей строки
+        таблицы или не отнесенной к таблицам через mark_changes),
+        и после изменений, зафиксированных другими соединениями,
+        в том числе из других процессов (PRAGMA data_version)
+        """
+
+        with self._writer_lock:
+            con = self._get_writer()
+            version = con.execute('PRAGMA data_version').fetchone()[0]
+            count = (self._transactions if table is None
+                     else self._changes.get(table, 0) + self._untracked)
+            # после переоткрытия соединения счетчик PRAGMA начинается заново
+            return self._generation, version, count
+
+    def _checkout(self) -> tuple[int, sqlite3.Connection]:
+        try:
+            return self._pool.get_nowait()
+        except Empty:
+            pass
+
+        with self._pool_lock:
+            if self._opened_readers < self.readers:
+                self._opened_readers += 1
+                return self._generation, self._connect()
+
+        return self._pool.get()
+
+    def _checkin(self, generation: int, con: sqlite3.Connection) -> None:
+        with self._pool_lock:
+            if generation != self._generation:
+                con.close()
+                return
+        self._pool.put((generation, con))
+
+    @contextmanager
+    def reader(self) -> Iterator[sqlite3.Connection]:
+        """
+        Получить соединение для чтения из пула. Если в текущем потоке открыта
+        транзакция записи или пул отключен, используется соединение записи.
+        """
+
+        if self.readers == 0 or self.owns_writer():
+            with self._writer_lock:
+                yield self._get_writer()
+            return
+
+        generation, con = self._checkout()
+        try:
+            yield con
+        finally:
+            self._checkin(generation, con)
+
+    def close(self) -> None:
+        """
+        Закрыть все соединения. Соединения, выданные для чтения в момент
+        вызова, будут закрыты при возврате в пул.
+        """
+
+        with self._writer_lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+
+        with self._pool_lock:
+            self._generation += 1
+            self._opened_readers = 0
+            while True:
+                try:
+                    _, con = self._pool.get_nowait()
+                except Empty:
+                    break
+                con.close()
+
+    def __enter__(self) -> 'SQLiteConnectionManager':
+        return self
+
+    def __exit__(self, exc_type: type[BaseException] | None,
+                 exc_value: BaseException | None,
+                 traceback: TracebackType | None) -> None:
+        self.close()
@@ -0,0 +1,180 @@
+"""
+Модуль с описанием преобразования объектов моделей в строки таблицы SQLite
+и обратно
+
+Отображение строится один раз для класса модели: тексты запросов, порядок
+столбцов и преобразователи значений вычисляются заранее, поэтому при чтении
+строки не нужно разбирать описание курсора и аннотации типов.
+"""
+
+from dataclasses import fields as dataclass_fields, is_dataclass
+from datetime import datetime
+from inspect import get_annotations
+from types import NoneType
+from typing import Any, Callable, Generic, Literal, Type, get_args, get_origin
+
+from bookkeeper.repository.abstract_repository import T
+
+DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+_SQL_TYPES: dict[type, str] = {
+    int: 'INTEGER',
+    str: 'TEXT',
+    float: 'REAL',
+    datetime: 'DATETIME'
+}
+
+
+def resolve_type(field: Any) -> Any:
+    """
+    Получить базовый тип поля: для Optional[X] - X,
+    для Literal - тип его значений
+    """
+
+    args = get_args(field)
+    if get_origin(field) is Literal:
+        return type(args[0])
+    if args and NoneType in args:
+        rest = [arg for arg in args if arg is not NoneType]
+        if len(rest) == 1:
+            return resolve_type(rest[0])
+    return field
+
+
+def sql_type(field: Any) -> str:
+    """
+    Получить тип столбца SQLite для аннотации поля
+    """
+
+    return _SQL_TYPES[resolve_type(field)]
+
+
+def decode_datetime(value: Any) -> datetime | None:
+    """
+    Разобрать дату из строки в формате ISO 'YYYY-MM-DD HH:MM:SS'
+    """
+
+    if value is None or value == 'NULL':
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        return datetime.strptime(value.strip('\''), DATETIME_FORMAT)
+
+
+def decode_nullable(value: Any) -> Any:
+    """
+    Строка 'NULL', записанная прежними версиями репозитория, означает None
+    """
+
+    if value == 'NULL':
+        return None
+    return value
+
+
+def encode_value(value: Any) -> Any:
+    """
+    Преобразовать значение атрибута в значение для подстановки в запрос.
+    Числа, строки и None передаются как есть
+    """
+
+    if isinstance(value, datetime):
+        return value.isoformat(' ', 'seconds')
+    return value
+
+
+class RowMapper(Generic[T]):
+    """
+    Отображение класса модели на таблицу SQLite.
+
+    columns - столбцы таблицы без pk в порядке аннотаций класса
+    select_columns - столбцы в порядке выборки (порядок аргументов конструктора
+    для dataclass, иначе pk и затем columns)
+    """
+
+    def __init__(self, cls: Type[T], table_name: str) -> None:
+        self.cls = cls
+        self.table_name = table_name
+        self.fields: dict[str, Any] = get_annotations(cls, eval_str=True)
+        self.fields.pop('pk')
+        self.columns = list(self.fields)
+
+        init_fields: list[str] = []
+        if is_dataclass(cls):
+            init_fields = [f.name for f in dataclass_fields(cls) if f.init]
+        if sorted(init_fields) == sorted(self.columns + ['pk']):
+            self.select_columns = init_fields
+            self._factory: Callable[..., T] = cls
+        else:
+            self.select_columns = ['pk'] + self.columns
+            self._factory = self._build_by_attributes
+
+        self._converters: list[tuple[int, Callable[[Any], Any]]] = []
+        self._column_converters: dict[str, Callable[[Any], Any]] = {}
+        for i, name in enumerate(self.select_columns):
+            converter = self._converter(self.fields.get(name, int))
+            if converter is not None:
+                self._converters.append((i, converter))
+                self._column_converters[name] = converter
+
+        names = ', '.join(self.columns)
+        table = table_name
+        params = ', '.join('?' * len(self.columns))
+        self.select_sql = f'SELECT {", ".join(self.select_columns)} FROM {table}'
+        self.get_sql = f'{self.select_sql} WHERE pk = ?'
+        self.insert_sql = f'INSERT INTO {table}({names}) VALUES({params})'
+        self.insert_with_pk_sql = (f'INSERT INTO {table}({names}, pk) '
+                                   f'VALUES({params}, ?)')
+        assignments = ', '.join(f'{c} = ?' for c in self.columns)
+        self.update_sql = f'UPDATE {table} SET {assignments} WHERE pk = ?'
+        self.delete_sql = f'DELETE FROM {table} WHERE pk = ?'
+
+    @staticmethod
+    def _converter(field: Any) -> Callable[[Any], Any] | None:
+        base = resolve_type(field)
+        if base is datetime:
+            return decode_datetime
+        if base is str or base is not field:
+            return decode_nullable
+        return None
+
+    def _build_by_attributes(self, *values: Any) -> T:
+        obj = self.cls.__new__(self.cls)
+        for name, value in zip(self.select_columns, values):
+            setattr(obj, name, value)
+        return obj
+
+    def decode(self, row: tuple[Any, ...]) -> T:
+        """
+        Создать объект модели из строки, выбранной запросом select_sql
+        """
+
+        if not self._converters:
+            return self._factory(*row)
+        values = list(row)
+        for i, converter in self._converters:
+            values[i] = converter(values[i])
+        return self._factory(*values)
+
+    def decode_value(self, column: str, value: Any) -> Any:
+        """
+        Преобразовать значение одного столбца в значение атрибута
+        """
+
+        converter = self._column_converters.get(column)
+        return value if converter is None else converter(value)
+
+    def decode_all(self, rows: list[tuple[Any, ...]]) -> list[T]:
+        """
+        Создать объекты модели из списка строк
+        """
+
+        decode = self.decode
+        return [decode(row) for row in rows]
+
+    def encode(self, obj: T) -> list[Any]:
+        """
+        Получить значения столбцов columns для объекта
+        """
+
+        return [encode_value(getattr(obj, name)) for name in self.columns]
@@ -2,56 +2,245 @@
 Модуль с описанием реализации репозитория на основе sqlite
 """
 
-from inspect import get_annotations
-from typing import Any, Dict, Type, get_args
+from contextlib import contextmanager
 from datetime import datetime
+from types import TracebackType
+from typing import Any, ContextManager, Iterable, Iterator, Mapping, Sequence, Type
 
 import sqlite3
 
 from bookkeeper.repository.abstract_repository import AbstractRepository, T
+from bookkeeper.repository.closure import Closure, InSubtree
+from bookkeeper.repository.index import Index
+from bookkeeper.repository.query import AggregateFunc, Predicate, Query
+from bookkeeper.repository.rollup import Rollup
+from bookkeeper.repository.sqlite_connection import SQLiteConnectionManager
+from bookkeeper.repository.sqlite_mapper import RowMapper, encode_value, sql_type
+
+# SQL выражения начала периода для столбца дат
+_PERIOD_SQL = {
+    'День': 'date({})',
+    'Неделя': "date({}, 'weekday 0', '-6 days')",
+    'Месяц': "date({}, 'start of month')",
+}
 
 
 class SQLiteRepository(AbstractRepository[T]):
     """
         Репозиторий, работающий с SQLite. Хранит данные в DB файле, взаимодействуя
-        через SQL запросы
+        через SQL запросы. Соединения берутся из SQLiteConnectionManager,
+        по умолчанию общего для всех репозиториев одного файла.
+        Индексы, объявленные в атрибуте db_indexes модели, создаются
+        вместе с таблицей или методом ensure_indexes, сводные таблицы
+        из атрибута db_rollups - вместе с таблицей или методом ensure_rollups,
+        таблица замыкания иерархии из атрибута db_closure - вместе с таблицей
+        или методом ensure_closure
     """
 
-    def __init__(self, db_file: str, cls: Type[T]) -> None:
+    def __init__(self, db_file: str, cls: Type[T],
+                 connection: SQLiteConnectionManager | None = None) -> None:
         self.db_file = db_file
+        self.connection = (connection if connection is not None
+                           else SQLiteConnectionManager.shared(db_file))
         self.table_name = cls.__name__.lower()
-        self.fields = get_annotations(cls, eval_str=True)
-        self.fields.pop('pk')
+        self.mapper = RowMapper(cls, self.table_name)
+        self.fields = self.mapper.fields
+        self.indexes: tuple[Index, ...] = tuple(getattr(cls, 'db_indexes', ()))
+        self.rollups: tuple[Rollup, ...] = tuple(getattr(cls, 'db_rollups', ()))
+        self.closure: Closure | None = getattr(cls, 'db_closure', None)
         self.generic_type: Type[T] = cls
 
-    @staticmethod
-    def set_pragmas(cur: sqlite3.Cursor) -> None:
+    def close(self) -> None:
+        """
+        Закрыть соединения с базой данных
+        """
+
+        self.connection.close()
+
+    def transaction(self) -> ContextManager[Any]:
         """
-        Установить в курсор необходимые pragma
+        Транзакция в общем соединении для записи: все репозитории, использующие
+        тот же SQLiteConnectionManager, фиксируют изменения внутри блока with
+        одним COMMIT. Вложенные транзакции выполняются в точках сохранения
         """
 
-        cur.execute('PRAGMA foreign_keys = ON')
+        return self.connection.transaction()
+
+    @contextmanager
+    def writer(self, counted: bool = True) -> Iterator[sqlite3.Connection]:
+        """
+        Соединение для записи в таблицу (см. SQLiteConnectionManager.writer):
+        строки, измененные в блоке, в том числе триггерами, меняют версию
+        данных этой таблицы
+        """
 
-    _types: Dict[type, str] = {
-        int: 'INTEGER',
-        str: 'TEXT',
-        float: 'REAL',
-        datetime: 'DATETIME'
-    }
+        with self.connection.writer(counted) as con:
+            start = con.total_changes
+            try:
+                yield con
+            finally:
+                self.connection.mark_changes(self.table_name,
+                                             con.total_changes - start)
+
+    def data_version(self) -> tuple[int, int, int]:
+        """
+        Версия данных таблицы (см. SQLiteConnectionManager.data_version):
+        меняется при изменении строк таблицы через этот менеджер и при любых
+        изменениях файла другими соединениями
+        """
+
+        return self.connection.data_version(self.table_name)
+
+    def __enter__(self) -> 'SQLiteRepository[T]':
+        return self
+
+    def __exit__(self, exc_type: type[BaseException] | None,
+                 exc_value: BaseException | None,
+                 traceback: TracebackType | None) -> None:
+        self.close()
 
     def create_table(self) -> None:
         """
         Создать дефолтную таблицу в базе данных
         """
 
-        with sqlite3.connect(self.db_file) as con:
+        with self.connection.writer() as con:
             cur = con.cursor()
-            self.set_pragmas(cur)
-            fields = ', '.join([f'{k} {self._types[v]}' for k, v in self.fields.items()])
+            fields = ', '.join([f'{k} {sql_type(v)}' for k, v in self.fields.items()])
             cur.execute(
                 f"CREATE TABLE IF NOT EXISTS {self.table_name} "
                 f"(pk INTEGER PRIMARY KEY, {fields})"
             )
+            self.ensure_indexes()
+            self.ensure_rollups()
+            self.ensure_closure()
+
+    def ensure_indexes(self) -> list[str]:
+        """
+        Создать недостающие индексы модели и пересоздать индексы,
+        определение которых изменилось
+
+        Returns
+        -------
+        Названия созданных индексов
+        """
+
+        created = []
+        with self.connection.writer() as con:
+            for index in self.indexes:
+                self._check_fields(set(index.columns + index.include))
+                name = index.index_name(self.table_name)
+                sql = index.create_sql(self.table_name)
+                row = con.execute("SELECT sql FROM sqlite_master "
+                                  "WHERE type = 'index' AND name = ?", (name,)).fetchone()
+                if row is not None and row[0] == sql:
+                    continue
+                if row is not None:
+                    con.execute(f'DROP INDEX {name}')
+                con.execute(sql)
+                created.append(name)
+        return created
+
+    def ensure_rollups(self) -> list[str]:
+        """
+        Создать недостающие сводные таблицы модели и их триггеры. Таблицы,
+        определение которых изменилось, пересоздаются. Новые таблицы
+        заполняются по существующим записям
+
+        Returns
+        -------
+        Названия созданных сводных таблиц
+        """
+
+        created = []
+        column_types = {k: sql_type(v) for k, v in self.fields.items()}
+        with self.writer() as con:
+            for rollup in self.rollups:
+                self._check_fields({rollup.date_column, rollup.value, *rollup.group_by})
+                name = rollup.table_name(self.table_name)
+                expected = {name: rollup.create_sql(self.table_name, column_types),
+                            **rollup.triggers_sql(self.table_name)}
+                names = ', '.join('?' * len(expected))
+                rows = con.execute(f'SELECT name, sql FROM sqlite_master '
+                                   f'WHERE name IN ({names})', list(expected)).fetchall()
+                if dict(rows) == expected:
+                    continue
+                con.execute(f'DROP TABLE IF EXISTS {name}')
+                for trigger in rollup.triggers_sql(self.table_name):
+                    con.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+                for sql in expected.values():
+                    con.execute(sql)
+                for sql in rollup.rebuild_sql(self.table_name):
+                    con.execute(sql)
+                created.append(name)
+        return created
+
+    def rebuild_rollups(self) -> None:
+        """
+        Пересчитать сводные таблицы модели по ее записям
+        """
+
+        with self.writer() as con:
+            for rollup in self.rollups:
+                for sql in rollup.rebuild_sql(self.table_name):
+                    con.execute(sql)
+
+    def ensure_closure(self) -> bool:
+        """
+        Создать таблицу замыкания иерархии модели и ее триггеры, если их нет
+        или их определение изменилось, и заполнить ее по существующим записям
+
+        Returns
+        -------
+        True, если таблица замыкания создана
+        """
+
+        if self.closure is None:
+            return False
+        self._check_fields({self.closure.parent_field})
+        name = self.closure.table_name(self.table_name)
+        table_sql, index_sql = self.closure.create_sql(self.table_name)
+        expected = {name: table_sql, f'{name}_descendant': index_sql,
+                    **self.closure.triggers_sql(self.table_name)}
+        with self.writer() as con:
+            names = ', '.join('?' * len(expected))
+            rows = con.execute(f'SELECT name, sql FROM sqlite_master '
+                               f'WHERE name IN ({names})', list(expected)).fetchall()
+            if dict(rows) == expected:
+                return False
+            con.execute(f'DROP TABLE IF EXISTS {name}')
+            for trigger in self.closure.triggers_sql(self.table_name):
+                con.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+            for sql in expected.values():
+                con.execute(sql)
+            for sql in self.closure.rebuild_sql(self.table_name):
+                con.execute(sql)
+        return True
+
+    def rebuild_closure(self) -> None:
+        """
+        Пересчитать таблицу замыкания иерархии по записям модели
+        """
+
+        if self.closure is None:
+            return
+        with self.writer() as con:
+            for sql in self.closure.rebuild_sql(self.table_name):
+                con.execute(sql)
+
+    def explain(self, query: Query) -> list[str]:
+        """
+        Получить план выполнения запроса (EXPLAIN QUERY PLAN)
+
+        Returns
+        -------
+        Список строк плана, например 'SEARCH expense USING INDEX ...'
+        """
+
+        sql, params = self._compile(query)
+        with self.connection.reader() as con:
+            rows = con.execute(f'EXPLAIN QUERY PLAN {sql}', params).fetchall()
+        return [row[3] for row in rows]
 
     def add(self, obj: T) -> int:
         if getattr(obj, 'pk', None) is None:
@@ -59,119 +248,444 @@ class SQLiteRepository(AbstractRepository[T]):
         if getattr(obj, 'pk', None) != 0:
             raise ValueError(f'trying to add object {obj} with filled `pk` attribute')
 
-        names = ', '.join(self.fields.keys())
-        parameters = ', '.join("?" * len(self.fields))
-
-        values = [self._attr_to_sql(getattr(obj, x)) for x in self.fields]
-        with sqlite3.connect(self.db_file) as con:
+        with self.writer() as con:
             cur = con.cursor()
-            self.set_pragmas(cur)
-            query = f'INSERT INTO {self.table_name}({names}) VALUES({parameters})'
-            cur.execute(query, values)
+            cur.execute(self.mapper.insert_sql, self.mapper.encode(obj))
             if cur.lastrowid is not None:
                 obj.pk = cur.lastrowid
             else:
                 raise RuntimeError('failed to insert')
-        con.close()
         return obj.pk
 
-    def get(self, primary_key: int) -> T | None:
-        with sqlite3.connect(self.db_file) as con:
+    def add_many(self, objs: Iterable[T]) -> list[int]:
+        objs = list(objs)
+        for obj in objs:
+            if getattr(obj, 'pk', None) is None:
+                raise ValueError(f'trying to add object {obj} without `pk` attribute')
+            if getattr(obj, 'pk', None) != 0:
+                raise ValueError(f'trying to add object {obj} with filled `pk` attribute')
+
+        encode = self.mapper.encode
+        with self.writer() as con:
             cur = con.cursor()
-            self.set_pragmas(cur)
-            cur.execute(f'SELECT * FROM {self.table_name} WHERE pk={primary_key}')
-            raw_obj = cur.fetchone()
-            if raw_obj is None:
-                return None
+            cur.execute(f'SELECT coalesce(max(pk), 0) FROM {self.table_name}')
+            first_pk = cur.fetchone()[0] + 1
+            primary_keys = list(range(first_pk, first_pk + len(objs)))
+            cur.executemany(self.mapper.insert_with_pk_sql, (
+                encode(obj) + [primary_key]
+                for primary_key, obj in zip(primary_keys, objs)))
 
-        return self._to_obj(raw_obj, cur.description)
+        for primary_key, obj in zip(primary_keys, objs):
+            obj.pk = primary_key
+        return primary_keys
 
-    def get_all(self, where: dict[str, Any] | None = None) -> list[T]:
-        with sqlite3.connect(self.db_file) as con:
+    def add_columns(self, columns: Mapping[str, Sequence[Any]]) -> list[int]:
+        """
+        Добавить записи из столбцов без создания объектов модели. pk
+        назначаются по порядку, как в add_many
+
+        Parameters
+        ----------
+        columns - значения всех столбцов таблицы, кроме pk, по названиям
+        столбцов, в формате хранения (encode_value)
+
+        Returns
+        -------
+        Список pk добавленных записей
+        """
+
+        if sorted(columns) != sorted(self.mapper.columns):
+            raise ValueError(f'expected columns {self.mapper.columns}, '
+                             f'got {sorted(columns)}')
+        values = [columns[name] for name in self.mapper.columns]
+        count = len(values[0])
+        if any(len(column) != count for column in values):
+            raise ValueError('columns must have the same length')
+
+        with self.writer() as con:
             cur = con.cursor()
-            self.set_pragmas(cur)
-            if where:
-                conditions = ", ".join([f"{k}=?" for k in where.keys()])
-                query = f'SELECT * FROM {self.table_name} WHERE {conditions}'
-                cur.execute(query, [self._attr_to_sql(v) for v in where.values()])
+            cur.execute(f'SELECT coalesce(max(pk), 0) FROM {self.table_name}')
+            first_pk = cur.fetchone()[0] + 1
+            primary_keys = range(first_pk, first_pk + count)
+            cur.executemany(self.mapper.insert_with_pk_sql, zip(*values, primary_keys))
+        return list(primary_keys)
+
+    def get(self, primary_key: int) -> T | None:
+        with self.connection.reader() as con:
+            raw_obj = con.execute(self.mapper.get_sql, (primary_key,)).fetchone()
+
+        if raw_obj is None:
+            return None
+        return self.mapper.decode(raw_obj)
+
+    def get_all(self, where: dict[str, Any] | None = None) -> list[T]:
+        return self.find(Query(where=where or {}))
+
+    def find(self, query: Query) -> list[T]:
+        sql, params = self._compile(query)
+        with self.connection.reader() as con:
+            raw_objs = con.execute(sql, params).fetchall()
+
+        return self.mapper.decode_all(raw_objs)
+
+    def iter_all(self, where: dict[str, Any] | None = None,
+                 batch_size: int = 1000) -> Iterator[T]:
+        """
+        Получить записи по условию where, читая строки порциями по batch_size
+        через fetchmany и создавая объекты по мере обхода. Соединение для
+        чтения занято, пока генератор не исчерпан или не закрыт, и видит
+        один и тот же снимок базы данных
+        """
+
+        if batch_size < 1:
+            raise ValueError('`batch_size` must be positive')
+        sql, params = self._compile(Query(where=where or {}))
+        decode = self.mapper.decode
+        with self.connection.reader() as con:
+            cur = con.execute(sql, params)
+            while rows := cur.fetchmany(batch_size):
+                for row in rows:
+                    yield decode(row)
+
+    def aggregate(self, func: AggregateFunc, field: str = 'pk',
+                  where: dict[str, Any] | None = None,
+                  group_by: str | tuple[str, ...] | None = None) -> Any:
+        if func not in ('sum', 'count', 'min', 'max'):
+            raise ValueError(f'unknown aggregate function {func}')
+        groups = (() if group_by is None
+                  else (group_by,) if isinstance(group_by, str) else group_by)
+        self._check_fields({field, *groups})
+
+        compiled = self._rollup_sql(func, field, where or {}, groups)
+        if compiled is None:
+            where_sql, params = self._compile_where(Query(where=where or {}))
+            columns = ', '.join([*groups, f'{func}({field})'])
+            sql = f'SELECT {columns} FROM {self.table_name}{where_sql}'
+            if groups:
+                sql += f' GROUP BY {", ".join(groups)}'
+        else:
+            sql, params = compiled
+        with self.connection.reader() as con:
+            rows = con.execute(sql, params).fetchall()
+
+        decode = self.mapper.decode_value
+        if group_by is None:
+            value = decode(field, rows[0][0]) if func in ('min', 'max') else rows[0][0]
+            return value if value is not None or func in ('min', 'max') else 0
+        results: dict[Any, Any] = {}
+        for *key, value in rows:
+            key = [decode(name, v) for name, v in zip(groups, key)]
+            if func in ('min', 'max'):
+                value = decode(field, value)
+            results[key[0] if isinstance(group_by, str) else tuple(key)] = value
+        return results
+
+    def _rollup_where(self, rollup: Rollup, where: dict[str, Any],
+                      groups: tuple[str, ...]) -> dict[str, Any] | None:
+        """
+        Перевести условие на таблицу модели в условие на сводную таблицу
+        или вернуть None, если запрос не выражается через сводную таблицу
+        """
+
+        if not set(groups) <= set(rollup.group_by):
+            return None
+        rollup_where: dict[str, Any] = {}
+        for name, cond in where.items():
+            if name == rollup.date_column:
+                key_cond = rollup.key_condition(cond)
+                if key_cond is None:
+                    return None
+                rollup_where[rollup.key_column] = key_cond
+            elif name in rollup.group_by:
+                rollup_where[name] = cond
+            else:
+                return None
+        return rollup_where
+
+    def _rollup_sql(self, func: AggregateFunc, field: str, where: dict[str, Any],
+                    groups: tuple[str, ...]) -> tuple[str, list[Any]] | None:
+        """
+        Составить запрос агрегата по сводной таблице (самой крупной из
+        подходящих) или вернуть None, если агрегат по ним не вычисляется
+        """
+
+        for rollup in sorted(self.rollups, key=lambda r: r.period != 'month'):
+            if func == 'sum' and field == rollup.value:
+                column = 'total'
+            elif func == 'count' and field == 'pk':
+                column = 'count'
             else:
-                query = f'SELECT * FROM {self.table_name}'
-                cur.execute(query)
-            raw_objs = cur.fetchall()
-            if not raw_objs:
-                return []
-
-        return [self._to_obj(raw_obj, cur.description) for raw_obj in raw_objs]
-
-    datetime_format = '%Y-%m-%d %H:%M:%S'
-
-    def _attr_to_sql(self, value: Any) -> str:
-        if isinstance(value, str):
-            return value
-        if isinstance(value, datetime):
-            return f'{datetime.strftime(value, self.datetime_format)}'
-        if value is None:
-            return 'NULL'
-        return str(value)
-
-    def _sql_to_attr(self, field: Type[Any], value: Any) -> Any:
-        if value == 'NULL':
+                continue
+            rollup_where = self._rollup_where(rollup, where, groups)
+            if rollup_where is None:
+                continue
+            where_sql, params = self._compile_where(Query(where=rollup_where))
+            columns = ', '.join([*groups, f'sum({column})'])
+            sql = f'SELECT {columns} FROM {rollup.table_name(self.table_name)}'
+            sql += where_sql
+            if groups:
+                sql += f' GROUP BY {", ".join(groups)}'
+            return sql, params
+        return None
+
+    def sum_by_period(self, interval: str, where: dict[str, Any] | None = None,
+                      by_category: bool = False, date_field: str = 'date',
+                      value_field: str = 'amount',
+                      category_field: str = 'category_id') -> dict[Any, float]:
+        """
+        Вычислить суммы по периодам одним запросом с группировкой в базе данных.
+        Если условие выражается через сводную таблицу с подходящим периодом,
+        запрос выполняется по ней
+
+        Parameters
+        ----------
+        interval - "День", "Неделя" (с понедельника) или "Месяц"
+        where - условие отбора
+        by_category - дополнительно группировать по category_field
+        date_field - поле даты
+        value_field - суммируемое поле
+        category_field - поле категории
+
+        Returns
+        -------
+        Словарь {начало периода: сумма} или {(начало периода, категория): сумма}
+        """
+
+        if interval not in _PERIOD_SQL:
+            raise KeyError(f'unknown interval {interval}')
+        groups = (category_field,) if by_category else ()
+        self._check_fields({date_field, value_field, *groups})
+        where = where or {}
+
+        table, key, column = self.table_name, date_field, value_field
+        for rollup in sorted(self.rollups, key=lambda r: r.period != 'month'):
+            if (rollup.date_column != date_field or rollup.value != value_field
+                    or rollup.period == 'month' and interval != 'Месяц'):
+                continue
+            rollup_where = self._rollup_where(rollup, where, groups)
+            if rollup_where is not None:
+                table, column, where = rollup.table_name(self.table_name), 'total', \
+                    rollup_where
+                # ключ месячной сводной таблицы - 'YYYY-MM'
+                key = (f"{rollup.key_column} || '-01'" if rollup.period == 'month'
+                       else rollup.key_column)
+                break
+        else:
+            self._check_fields(set(where))
+
+        where_sql, params = self._compile_where(Query(where=where))
+        period = _PERIOD_SQL[interval].format(key)
+        columns = ', '.join([period, *groups, f'sum({column})'])
+        sql = (f'SELECT {columns} FROM {table}{where_sql} '
+               f'GROUP BY {", ".join(str(i) for i in range(1, len(groups) + 2))}')
+        with self.connection.reader() as con:
+            rows = con.execute(sql, params).fetchall()
+
+        results: dict[Any, float] = {}
+        for start, *group, total in rows:
+            if start is None:
+                continue
+            start = datetime.fromisoformat(start)
+            results[(start, group[0]) if by_category else start] = total
+        return results
+
+    def _hierarchy_sql(self, parent_field: str, upwards: bool) -> str:
+        """
+        Составить рекурсивный запрос потомков (или предков) записи с pk = ?.
+        Глубина рекурсии ограничена количеством записей, поэтому цикл
+        в иерархии не приводит к бесконечному запросу
+        """
+
+        self._check_fields({parent_field})
+        table = self.table_name
+        if upwards:
+            anchor = f'SELECT {parent_field}, 1 FROM {table} WHERE pk = ?'
+            step = (f'SELECT {table}.{parent_field}, tree.depth + 1 '
+                    f'FROM {table} JOIN tree ON {table}.pk = tree.pk')
+        else:
+            anchor = f'SELECT pk, 0 FROM {table} WHERE pk = ?'
+            step = (f'SELECT {table}.pk, tree.depth + 1 '
+                    f'FROM {table} JOIN tree ON {table}.{parent_field} = tree.pk')
+        columns = ', '.join(f'{table}.{c}' for c in self.mapper.select_columns)
+        return (f'WITH RECURSIVE tree(pk, depth) AS ({anchor} UNION ALL {step} '
+                f'WHERE tree.depth < (SELECT count(*) FROM {table})) '
+                f'SELECT {columns} FROM {table} JOIN '
+                f'(SELECT pk, min(depth) AS depth FROM tree GROUP BY pk) AS levels '
+                f'ON {table}.pk = levels.pk WHERE {table}.pk != ? '
+                f'ORDER BY levels.depth, {table}.pk')
+
+    def _closure_table(self, parent_field: str) -> str | None:
+        """
+        Название таблицы замыкания иерархии parent_field или None, если
+        у модели ее нет
+        """
+
+        if self.closure is None or self.closure.parent_field != parent_field:
             return None
-        if str == field or str in get_args(field):
-            value = value.strip('\'')
-            return str(value)
-        if datetime == field or datetime in get_args(field):
-            value = value.strip('\'')
-            return datetime.strptime(value, self.datetime_format)
-        return value
-
-    def _to_obj(self, raw_obj: Any, desc: Any) -> T:
-        obj = self.generic_type.__new__(self.generic_type)
-        setattr(obj, 'pk', raw_obj[0])
-        for i, field in enumerate(desc):
-            if field[0] in self.fields:
-                field_val = self.fields[field[0]]
-                setattr(obj, field[0], self._sql_to_attr(field_val, raw_obj[i]))
+        return self.closure.table_name(self.table_name)
+
+    def _closure_sql(self, closure: str, upwards: bool) -> str:
+        """
+        Составить запрос потомков (или предков) записи с pk = ?
+        по таблице замыкания
+        """
+
+        table = self.table_name
+        this, other = ('descendant', 'ancestor') if upwards else \
+            ('ancestor', 'descendant')
+        columns = ', '.join(f'{table}.{c}' for c in self.mapper.select_columns)
+        return (f'SELECT {columns} FROM {closure} JOIN {table} '
+                f'ON {table}.pk = {closure}.{other} '
+                f'WHERE {closure}.{this} = ? AND {closure}.depth > 0 '
+                f'ORDER BY {closure}.depth, {table}.pk')
+
+    def descendants(self, primary_key: int, parent_field: str = 'parent') -> list[T]:
+        closure = self._closure_table(parent_field)
+        if closure is not None:
+            sql, params = self._closure_sql(closure, upwards=False), [primary_key]
+        else:
+            sql = self._hierarchy_sql(parent_field, upwards=False)
+            params = [primary_key, primary_key]
+        with self.connection.reader() as con:
+            rows = con.execute(sql, params).fetchall()
+        return self.mapper.decode_all(rows)
+
+    def ancestors(self, primary_key: int, parent_field: str = 'parent') -> list[T]:
+        closure = self._closure_table(parent_field)
+        if closure is not None:
+            sql, params = self._closure_sql(closure, upwards=True), [primary_key]
+        else:
+            sql = self._hierarchy_sql(parent_field, upwards=True)
+            params = [primary_key, primary_key]
+        with self.connection.reader() as con:
+            rows = con.execute(sql, params).fetchall()
+        return self.mapper.decode_all(rows)
+
+    def subtree_ids(self, primary_key: int, parent_field: str = 'parent') -> list[int]:
+        self._check_fields({parent_field})
+        table = self.table_name
+        closure = self._closure_table(parent_field)
+        if closure is not None:
+            sql = (f'SELECT descendant FROM {closure} WHERE ancestor = ? '
+                   f'ORDER BY depth, descendant')
+        else:
+            # UNION отбрасывает повторы, поэтому цикл в иерархии не зацикливает запрос
+            sql = (f'WITH RECURSIVE tree(pk) AS (SELECT pk FROM {table} WHERE pk = ? '
+                   f'UNION SELECT {table}.pk FROM {table} '
+                   f'JOIN tree ON {table}.{parent_field} = tree.pk) '
+                   f'SELECT pk FROM tree')
+        with self.connection.reader() as con:
+            rows = con.execute(sql, (primary_key,)).fetchall()
+        return [row[0] for row in rows]
+
+    def subtree_condition(self, primary_key: int,
+                          parent_field: str = 'parent') -> Predicate:
+        """
+        Если у модели есть таблица замыкания, условие - подзапрос по ней
+        (InSubtree), и запрос расходов категории с подкатегориями выполняется
+        одним соединением по индексу
+        """
+
+        closure = self._closure_table(parent_field)
+        if closure is None:
+            return super().subtree_condition(primary_key, parent_field)
+        members = frozenset(self.subtree_ids(primary_key, parent_field))
+        return InSubtree(closure, primary_key, members)
+
+    def _check_fields(self, fields: set[str]) -> None:
+        unknown = fields - set(self.mapper.columns) - {'pk'}
+        if unknown:
+            raise ValueError(f'unknown fields {sorted(unknown)} '
+                             f'for table {self.table_name}')
+
+    def _compile_where(self, query: Query) -> tuple[str, list[Any]]:
+        """
+        Составить параметризованное условие WHERE по условию и курсору запроса
+        """
+
+        conditions = []
+        params: list[Any] = []
+        for column, cond in query.where.items():
+            if isinstance(cond, Predicate):
+                conditions.append(cond.to_sql(column))
+                params.extend(encode_value(v) for v in cond.params())
+            elif cond is None:
+                conditions.append(f'{column} IS NULL')
             else:
-                setattr(obj, field[0], raw_obj[i])
+                conditions.append(f'{column} = ?')
+                params.append(encode_value(cond))
+
+        order = query.order
+        if query.after is not None:
+            # (a, b) после (x, y): a > x OR (a = x AND b > y)
+            alternatives = []
+            for i, (column, desc) in enumerate(order):
+                terms = [f'{c} = ?' for c, _ in order[:i]]
+                terms.append(f'{column} {"<" if desc else ">"} ?')
+                alternatives.append(f'({" AND ".join(terms)})')
+                params.extend(encode_value(v) for v in query.after[:i + 1])
+            conditions.append(f'({" OR ".join(alternatives)})')
 
-        return obj
+        if not conditions:
+            return '', params
+        return f' WHERE {" AND ".join(conditions)}', params
+
+    def _compile(self, query: Query) -> tuple[str, list[Any]]:
+        """
+        Составить параметризованный SELECT запрос по объекту Query
+        """
+
+        self._check_fields(query.fields())
+        where_sql, params = self._compile_where(query)
+        sql = self.mapper.select_sql + where_sql
+        if query.order:
+            sql += ' ORDER BY ' + ', '.join(f'{c} DESC' if desc else c
+                                            for c, desc in query.order)
+        if query.limit is not None or query.offset:
+            sql += ' LIMIT ? OFFSET ?'
+            params.extend([-1 if query.limit is None else query.limit, query.offset])
+        return sql, params
 
     def update(self, obj: T) -> None:
-        if getattr(obj, 'pk', None) is None:
-            raise ValueError(f'trying to update object {obj} '
-                             f'without `pk` attribute')
-        if self.get(obj.pk) is None:
-            raise ValueError(f'trying to update object {obj} '
-                             f'that is not in the repository')
+        self.update_many([obj])
+
+    def update_many(self, objs: Iterable[T]) -> None:
+        objs = list(objs)
+        for obj in objs:
+            if getattr(obj, 'pk', None) is None:
+                raise ValueError(f'trying to update object {obj} '
+                                 f'without `pk` attribute')
 
-        with sqlite3.connect(self.db_file) as con:
+        encode = self.mapper.encode
+        with self.writer() as con:
             cur = con.cursor()
-            self.set_pragmas(cur)
-            fields = ', '.join([f'{v}=?' for v in self.fields.keys()])
-            query = f"UPDATE {self.table_name} SET {fields} WHERE pk={obj.pk}"
-            values = [self._attr_to_sql(getattr(obj, v)) for v in self.fields.keys()]
-            cur.execute(query, values)
+            cur.executemany(self.mapper.update_sql, (
+                encode(obj) + [obj.pk] for obj in objs))
+            if cur.rowcount != len(objs):
+                # исключение откатывает транзакцию целиком
+                raise ValueError('trying to update objects '
+                                 'that are not in the repository')
 
     def delete(self, primary_key: int) -> None:
-        if self.get(primary_key) is None:
-            raise KeyError(f"failed to find object with "
-                           f"pk={primary_key} in the repository")
+        self.delete_many([primary_key])
 
-        with sqlite3.connect(self.db_file) as con:
+    def delete_many(self, primary_keys: Iterable[int]) -> None:
+        primary_keys = list(dict.fromkeys(primary_keys))
+        with self.writer() as con:
             cur = con.cursor()
-            self.set_pragmas(cur)
-            query = f"DELETE FROM {self.table_name} WHERE pk= {primary_key}"
-            cur.execute(query)
+            cur.executemany(self.mapper.delete_sql,
+                            ((primary_key,) for primary_key in primary_keys))
+            if cur.rowcount != len(primary_keys):
+                raise KeyError(f"failed to find objects with "
+                               f"pk in {primary_keys} in the repository")
 
     def delete_all(self) -> None:
         """
         Удалить все записи из базы данных
         """
 
-        with sqlite3.connect(self.db_file) as con:
+        with self.writer() as con:
             cur = con.cursor()
-            self.set_pragmas(cur)
             query = f"DELETE FROM {self.table_name}"
             cur.execute(query)
 
@@ -180,8 +694,14 @@ class SQLiteRepository(AbstractRepository[T]):
         Удалить таблицу из нижележащей базы данных
         """
 
-        with sqlite3.connect(self.db_file) as con:
+        with self.writer() as con:
             cur = con.cursor()
-            self.set_pragmas(cur)
             query = f"DROP TABLE {self.table_name}"
             cur.execute(query)
+            for rollup in self.rollups:
+                cur.execute(f'DROP TABLE IF EXISTS {rollup.table_name(self.table_name)}')
+            if self.closure is not None:
+                cur.execute(f'DROP TABLE IF EXISTS '
+                            f'{self.closure.table_name(self.table_name)}')
+            # удаление таблицы не учитывается в total_changes
+            self.connection.mark_changes(self.table_name, 1)
@@ -0,0 +1,341 @@
+"""
+Модуль описывает режим отложенной записи для SQLiteRepository
+
+Изменения ставятся в очередь в памяти и сразу получают pk, а фоновый поток
+записывает их пачками: одна транзакция (и один fsync) на пачку вместо одной
+на каждый вызов. Пачка записывается, когда в очереди набирается max_batch
+изменений или проходит max_delay секунд с момента пробуждения потока.
+"""
+
+from copy import copy
+from dataclasses import replace
+from itertools import groupby
+from types import TracebackType
+from typing import Any, ContextManager, Iterable, Iterator
+
+import sqlite3
+import threading
+import time
+
+from bookkeeper.repository.abstract_repository import AbstractRepository, T
+from bookkeeper.repository.query import AggregateFunc, Query
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+
+# (номер изменения, вид изменения, параметры запроса)
+_Operation = tuple[int, str, list[Any]]
+
+
+class WriteBehindRepository(AbstractRepository[T]):
+    """
+    Репозиторий SQLite с отложенной записью.
+
+    pk новых записей выдаются сразу, начиная с max(pk) таблицы, поэтому
+    пока репозиторий работает, таблицу не должны пополнять другие
+    репозитории. get и find видят изменения из очереди, остальные методы
+    чтения сначала дожидаются записи очереди (flush). Если пачку не удалось
+    записать (например, из-за обновления несуществующей записи), изменения
+    пачки записываются по одному: ошибочные пропускаются, остальные
+    сохраняются, а первая ошибка возбуждается при следующем вызове flush
+    или изменяющего метода.
+
+    Внутри транзакции (transaction() или writer() общего менеджера соединений)
+    изменения записываются сразу и входят в эту транзакцию.
+
+    repo - репозиторий SQLite, через который записываются изменения
+    max_batch - количество изменений, при котором пачка записывается сразу
+    max_delay - максимальное время ожидания изменения в очереди, в секундах
+    """
+
+    def __init__(self, repo: SQLiteRepository[T], max_batch: int = 1000,
+                 max_delay: float = 0.05) -> None:
+        if max_batch < 1:
+            raise ValueError('`max_batch` must be positive')
+        self.repo = repo
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._cond = threading.Condition()
+        self._queue: list[_Operation] = []
+        # последнее изменение каждой записи из очереди: (номер, объект или None)
+        self._pending: dict[int, tuple[int, T | None]] = {}
+        self._seq = 0
+        self._done = 0
+        self._next_pk: int | None = None
+        self._error: BaseException | None = None
+        # записи очереди, в которых часть изменений не записалась
+        self._failures = 0
+        self._flush_requested = False
+        self._closing = False
+        self._thread: threading.Thread | None = None
+        mapper = repo.mapper
+        self._sql = {'insert': mapper.insert_with_pk_sql, 'update': mapper.update_sql,
+                     'delete': mapper.delete_sql}
+
+    # очередь
+
+    def _raise_error(self) -> None:
+        with self._cond:
+            error, self._error = self._error, None
+        if error is not None:
+            raise error
+
+    def _allocate(self, count: int) -> list[int]:
+        if self._next_pk is None:
+            # соединение берется без блокировки очереди: фоновый поток
+            # захватывает их в обратном порядке
+            with self.repo.connection.reader() as con:
+                row = con.execute(f'SELECT coalesce(max(pk), 0) '
+                                  f'FROM {self.repo.table_name}').fetchone()
+            with self._cond:
+                if self._next_pk is None:
+                    self._next_pk = row[0] + 1
+        with self._cond:
+            assert self._next_pk is not None
+            first = self._next_pk
+            self._next_pk += count
+        return list(range(first, first + count))
+
+    def _enqueue(self, operations: list[tuple[str, int, list[Any], T | None]]) -> None:
+        self._raise_error()
+        with self._cond:
+            for kind, primary_key, params, obj in operations:
+                self._seq += 1
+                self._queue.append((self._seq, kind, params))
+                self._pending[primary_key] = (self._seq, obj)
+            if self._thread is None or not self._thread.is_alive():
+                self._closing = False
+                name = f'write-behind-{self.repo.table_name}'
+                self._thread = threading.Thread(target=self._run, daemon=True, name=name)
+                self._thread.start()
+            self._cond.notify_all()
+        if self.repo.connection.owns_writer():
+            self._drain(raise_errors=True)
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._queue and not self._closing:
+                    self._cond.wait()
+                if not self._queue:
+                    return
+                deadline = time.monotonic() + self.max_delay
+                while (len(self._queue) < self.max_batch and not self._flush_requested
+                       and not self._closing):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                self._flush_requested = False
+            self._drain(raise_errors=False)
+
+    def _drain(self, raise_errors: bool) -> None:
+        """
+        Записать очередь одной транзакцией. Очередь забирается после получения
+        соединения для записи, поэтому изменения записываются в порядке вызовов
+        """
+
+        batch: list[_Operation] = []
+        errors: list[Exception] = []
+        try:
+            # своя транзакция записи очереди не меняет версию данных менеджера:
+            # изменения уже учтены в номере последнего изменения очереди
+            with self.repo.writer(counted=False) as con:
+                with self._cond:
+                    batch, self._queue = self._queue, []
+                errors = self._write(con, batch)
+        except Exception as error:  # pylint: disable=broad-exception-caught
+            errors = [error]
+        finally:
+            with self._cond:
+                if batch and errors:
+                    # незаписанные изменения пропадают из очереди
+                    self._failures += 1
+                if batch:
+                    self._done = batch[-1][0]
+                    self._pending = {pk: entry for pk, entry in self._pending.items()
+                                     if entry[0] > self._done}
+                self._cond.notify_all()
+        if errors:
+            if len(errors) > 1:
+                errors[0].add_note(f'{len(errors) - 1} more queued changes failed')
+            if raise_errors:
+                raise errors[0]
+            with self._cond:
+                if self._error is None:
+                    self._error = errors[0]
+
+    def _write(self, con: sqlite3.Connection, batch: list[_Operation]) -> list[Exception]:
+        """
+        Записать пачку изменений. Если пачка не записалась, изменения
+        записываются по одному, каждое в своей точке сохранения
+
+        Returns
+        -------
+        Ошибки изменений, которые не удалось записать
+        """
+
+        try:
+            with self.repo.connection.writer():
+                self._write_groups(con, batch)
+            return []
+        except Exception:  # pylint: disable=broad-exception-caught
+            if len(batch) == 1:
+                raise
+        errors: list[Exception] = []
+        for operation in batch:
+            try:
+                with self.repo.connection.writer():
+                    self._write_groups(con, [operation])
+            except Exception as error:  # pylint: disable=broad-exception-caught
+                errors.append(error)
+        return errors
+
+    def _write_groups(self, con: sqlite3.Connection, batch: list[_Operation]) -> None:
+        for kind, group in groupby(batch, key=lambda operation: operation[1]):
+            params = [operation[2] for operation in group]
+            cur = con.executemany(self._sql[kind], params)
+            if kind == 'update' and cur.rowcount != len(params):
+                raise ValueError('trying to update objects '
+                                 'that are not in the repository')
+            if kind == 'delete' and cur.rowcount != len(params):
+                raise KeyError(f'failed to find objects with pk in '
+                               f'{[p[0] for p in params]} in the repository')
+
+    def flush(self) -> None:
+        """
+        Дождаться записи всех изменений, поставленных в очередь до вызова.
+        Возбуждает ошибку записи, если она произошла
+        """
+
+        if self.repo.connection.owns_writer():
+            self._drain(raise_errors=True)
+        else:
+            with self._cond:
+                target = self._seq
+                self._flush_requested = True
+                self._cond.notify_all()
+                while self._done < target:
+                    self._cond.wait()
+        self._raise_error()
+
+    def close(self) -> None:
+        """
+        Записать очередь, остановить фоновый поток и закрыть соединения
+        """
+
+        self.flush()
+        with self._cond:
+            self._closing = True
+            self._cond.notify_all()
+            thread = self._thread
+        if thread is not None:
+            thread.join()
+        self.repo.close()
+
+    def __enter__(self) -> 'WriteBehindRepository[T]':
+        return self
+
+    def __exit__(self, exc_type: type[BaseException] | None,
+                 exc_value: BaseException | None,
+                 traceback: TracebackType | None) -> None:
+        self.close()
+
+    # изменение
+
+    def add(self, obj: T) -> int:
+        return self.add_many([obj])[0]
+
+    def add_many(self, objs: Iterable[T]) -> list[int]:
+        objs = list(objs)
+        for obj in objs:
+            if getattr(obj, 'pk', None) != 0:
+                raise ValueError(f'trying to add object {obj} with filled `pk` attribute')
+
+        primary_keys = self._allocate(len(objs))
+        for primary_key, obj in zip(primary_keys, objs):
+            obj.pk = primary_key
+        encode = self.repo.mapper.encode
+        self._enqueue([('insert', obj.pk, encode(obj) + [obj.pk], copy(obj))
+                       for obj in objs])
+        return primary_keys
+
+    def update(self, obj: T) -> None:
+        self.update_many([obj])
+
+    def update_many(self, objs: Iterable[T]) -> None:
+        objs = list(objs)
+        for obj in objs:
+            if not getattr(obj, 'pk', 0):
+                raise ValueError('attempt to update object with unknown primary key')
+        encode = self.repo.mapper.encode
+        self._enqueue([('update', obj.pk, encode(obj) + [obj.pk], copy(obj))
+                       for obj in objs])
+
+    def delete(self, primary_key: int) -> None:
+        self.delete_many([primary_key])
+
+    def delete_many(self, primary_keys: Iterable[int]) -> None:
+        self._enqueue([('delete', primary_key, [primary_key], None)
+                       for primary_key in dict.fromkeys(primary_keys)])
+
+    def transaction(self) -> ContextManager[Any]:
+        self.flush()
+        return self.repo.transaction()
+
+    # чтение
+
+    def get(self, primary_key: int) -> T | None:
+        with self._cond:
+            entry = self._pending.get(primary_key)
+        if entry is not None:
+            return copy(entry[1]) if entry[1] is not None else None
+        return self.repo.get(primary_key)
+
+    def get_all(self, where: dict[str, Any] | None = None) -> list[T]:
+        self.flush()
+        return self.repo.get_all(where)
+
+    def find(self, query: Query) -> list[T]:
+        # изменения из очереди накладываются на результат запроса к таблице,
+        # поэтому обновление представления не вынуждает записывать очередь
+        with self._cond:
+            pending = dict(self._pending)
+        if not pending:
+            return self.repo.find(query)
+        # изменения очереди вытесняют из страницы не больше len(pending) строк
+        limit = (None if query.limit is None
+                 else query.offset + query.limit + len(pending))
+        objs = {obj.pk: obj for obj in self.repo.find(replace(query, limit=limit,
+                                                              offset=0))}
+        for primary_key, (_, obj) in pending.items():
+            objs.pop(primary_key, None)
+            if obj is not None:
+                objs[primary_key] = copy(obj)
+        return query.apply(sorted(objs.values(), key=lambda obj: obj.pk))
+
+    def iter_all(self, where: dict[str, Any] | None = None,
+                 batch_size: int = 1000) -> Iterator[T]:
+        self.flush()
+        return self.repo.iter_all(where, batch_size)
+
+    def aggregate(self, func: AggregateFunc, field: str = 'pk',
+                  where: dict[str, Any] | None = None,
+                  group_by: str | tuple[str, ...] | None = None) -> Any:
+        self.flush()
+        return self.repo.aggregate(func, field, where, group_by)
+
+    def descendants(self, primary_key: int, parent_field: str = 'parent') -> list[T]:
+        self.flush()
+        return self.repo.descendants(primary_key, parent_field)
+
+    def ancestors(self, primary_key: int, parent_field: str = 'parent') -> list[T]:
+        self.flush()
+        return self.repo.ancestors(primary_key, parent_field)
+
+    def subtree_ids(self, primary_key: int, parent_field: str = 'parent') -> list[int]:
+        self.flush()
+        return self.repo.subtree_ids(primary_key, parent_field)
+
+    def data_version(self) -> Any:
+        with self._cond:
+            seq, failures = self._seq, self._failures
+        return seq, failures, self.repo.data_version()
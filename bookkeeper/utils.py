@@ -16,6 +16,48 @@ def _lines_with_indent(lines: Iterable[str]) -> Iterator[tuple[int, str]]:
         yield _get_indent(line), line.strip()
 
 
+def iter_tree(lines: Iterable[str]) -> Iterator[tuple[str, ...]]:
+    """
+    Прочитать структуру дерева из текста на основе отступов по одной строке.
+    Для каждого элемента вернуть путь - названия элементов от верхнего уровня
+    до него включительно - в порядке обхода в глубину (родитель раньше
+    потомков). Пустые строки игнорируются.
+
+    Пример. Текст
+    parent
+        child1
+            child2
+
+    даст пути ('parent',), ('parent', 'child1'), ('parent', 'child1', 'child2')
+
+    Parameters
+    ----------
+    lines - Итерируемый объект, содержащий строки текста (файл или список строк)
+
+    Yields
+    -------
+    Пути элементов
+    """
+    path: list[str] = []
+    # отступы элементов пути, -1 - уровень над элементами верхнего уровня
+    indents = [-1]
+    for i, (indent, name) in enumerate(_lines_with_indent(lines)):
+        if indent <= indents[-1]:
+            while indent < indents[-1]:
+                indents.pop()
+                path.pop()
+            if indent != indents[-1]:
+                raise IndentationError(
+                    f'unindent does not match any outer indentation '
+                    f'level in line {i}:\n'
+                )
+            indents.pop()
+            path.pop()
+        path.append(name)
+        indents.append(indent)
+        yield tuple(path)
+
+
 def read_tree(lines: Iterable[str]) -> list[tuple[str, str | None]]:
     """
     Прочитать структуру дерева из текста на основе отступов. Вернуть список
@@ -42,22 +84,5 @@ def read_tree(lines: Iterable[str]) -> list[tuple[str, str | None]]:
     -------
     Список пар "потомок-родитель"
     """
-    parents: list[tuple[str | None, int]] = []
-    last_indent = -1
-    last_name = None
-    result: list[tuple[str, str | None]] = []
-    for i, (indent, name) in enumerate(_lines_with_indent(lines)):
-        if indent > last_indent:
-            parents.append((last_name, last_indent))
-        elif indent < last_indent:
-            while indent < last_indent:
-                _, last_indent = parents.pop()
-            if indent != last_indent:
-                raise IndentationError(
-                    f'unindent does not match any outer indentation '
-                    f'level in line {i}:\n'
-                )
-        result.append((name, parents[-1][0]))
-        last_name = name
-        last_indent = indent
-    return result
+    return [(path[-1], path[-2] if len(path) > 1 else None)
+            for path in iter_tree(lines)]
@@ -2,28 +2,52 @@
 Главный модуль приложения, запускающий главное окно
 """
 
+import argparse
+import os
 import sys
 
 from PySide6 import QtWidgets, QtGui  # ignore: type[no-untyped-def]
+from bookkeeper.repository.sqlite_connection import DEFAULT_PROFILE, PROFILES
 from bookkeeper.view.main_widgets.main_window import MainWindow
 
 APP_TITLE = "The Bookkeeper App"
 
 
+def parse_args(argv: list[str]) -> tuple[argparse.Namespace, list[str]]:
+    """
+    Разобрать аргументы приложения. Аргументы, которые приложение не знает,
+    возвращаются для передачи в QApplication
+    """
+
+    parser = argparse.ArgumentParser(description=APP_TITLE)
+    parser.add_argument(
+        '--db-profile', choices=sorted(PROFILES),
+        default=os.environ.get('BOOKKEEPER_DB_PROFILE', DEFAULT_PROFILE),
+        help='профиль производительности SQLite '
+             '(по умолчанию - переменная окружения BOOKKEEPER_DB_PROFILE)')
+    parser.add_argument(
+        '--write-behind', action='store_true',
+        help='записывать расходы в базу данных пачками в фоновом потоке')
+    args, rest = parser.parse_known_args(argv[1:])
+    return args, argv[:1] + rest
+
+
 def main() -> None:
     """
     main функция создает инстанс app, устаналивает стиль виджетов,
     устаналивает иконку и зарускает приложение
     """
 
-    app = QtWidgets.QApplication(sys.argv)
+    args, qt_argv = parse_args(sys.argv)
+    app = QtWidgets.QApplication(qt_argv)
 
     styles_file = "style.qss"
     with open(styles_file, "r", encoding="utf-8") as file:
         style_sheet = file.read()
         app.setStyleSheet(style_sheet)
 
-    window = MainWindow()
+    window = MainWindow(db_profile=args.db_profile,
+                        write_behind=args.write_behind)
     window.setWindowTitle(APP_TITLE)
 
     icon = QtGui.QIcon('icon.png')
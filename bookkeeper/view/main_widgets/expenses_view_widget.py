@@ -5,6 +5,7 @@ from typing import Any
 
 from PySide6 import QtWidgets, QtGui, QtCore
 from bookkeeper.controllers.expenses_controller import ExpensesController  # type: ignore
+from bookkeeper.csv_import import ImportProgress
 from bookkeeper.view.utility_widgets.table_widget import TableWidget
 
 
@@ -34,8 +35,12 @@ class ExpensesViewWidget(QtWidgets.QWidget):  # type: ignore
         self.expenses_table.customContextMenuRequested.connect(
             self.open_menu_callback)
 
+        self.import_button = QtWidgets.QPushButton("Импорт CSV")
+        self.import_button.clicked.connect(self.import_csv_trigger)
+
         self.layout.addWidget(self.label)
         self.layout.addWidget(self.expenses_table)
+        self.layout.addWidget(self.import_button)
         self.setLayout(self.layout)
 
         self.controller.set_model(self.expenses_table)
@@ -82,3 +87,35 @@ class ExpensesViewWidget(QtWidgets.QWidget):  # type: ignore
 
         self.controller.delete_expense(primary_key)
         self.controller.update_model()
+
+    def import_csv_trigger(self) -> None:
+        """
+        Триггер импорта расходов из CSV файла со столбцами date, amount,
+        category, comment с отображением хода импорта
+        """
+
+        path, _ = QtWidgets.QFileDialog.getOpenFileName(
+            self, "Импорт расходов", "", "CSV (*.csv);;Все файлы (*)")
+        if not path:
+            return
+
+        dialog = QtWidgets.QProgressDialog("Импорт расходов...", None, 0, 100, self)
+        dialog.setWindowModality(QtCore.Qt.WindowModality.WindowModal)
+        dialog.setMinimumDuration(0)
+
+        def show_progress(progress: ImportProgress) -> None:
+            dialog.setValue(int((progress.fraction or 0) * 100))
+            dialog.setLabelText(f"{progress.imported} расходов, "
+                                f"{progress.rows_per_second:.0f} строк/с")
+            QtWidgets.QApplication.processEvents()
+
+        try:
+            result = self.controller.import_csv(path, progress=show_progress)
+        except (OSError, ValueError) as error:
+            dialog.close()
+            QtWidgets.QMessageBox.warning(self, "Ошибка импорта", str(error))
+            return
+        dialog.close()
+        QtWidgets.QMessageBox.information(
+            self, "Импорт расходов",
+            f"Добавлено расходов: {result.imported}, пропущено строк: {result.skipped}")
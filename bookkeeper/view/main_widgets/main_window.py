@@ -4,9 +4,7 @@
 
 from typing import Any
 
-import sqlite3
-
-from PySide6 import QtWidgets
+from PySide6 import QtWidgets, QtGui
 
 from bookkeeper.view.main_widgets.expenses_view_widget import (
     ExpensesViewWidget)
@@ -22,7 +20,13 @@ from bookkeeper.controllers.expenses_controller import (  # type: ignore
 from bookkeeper.controllers.budget_controller import (  # type: ignore
     BudgetController)
 
+from bookkeeper.analytics.budget_engine import BudgetEngine
+from bookkeeper.repository.abstract_repository import AbstractRepository
+from bookkeeper.repository.cached_repository import CachedRepository
+from bookkeeper.repository.sqlite_connection import (DEFAULT_PROFILE,
+                                                     SQLiteConnectionManager)
 from bookkeeper.repository.sqlite_repository import SQLiteRepository
+from bookkeeper.repository.write_behind_repository import WriteBehindRepository
 from bookkeeper.models.category import Category
 from bookkeeper.models.expense import Expense
 from bookkeeper.models.budget import Budget
@@ -31,27 +35,51 @@ from bookkeeper.models.budget import Budget
 class MainWindow(QtWidgets.QWidget):  # type: ignore
     """
     Виджет главного окна инициализирует все базы данных, репозитории и виджеты
+
+    db_profile - профиль производительности SQLite
+    write_behind - записывать расходы в базу данных пачками в фоновом потоке
     """
 
-    def __init__(self, *args: Any, **kwargs: Any) -> None:
+    def __init__(self, *args: Any, db_profile: str = DEFAULT_PROFILE,
+                 write_behind: bool = False, **kwargs: Any) -> None:
         super().__init__(*args, **kwargs)
 
         # set up sqlite db and repos
         self.db_file = "book_keeper.db"
+        self.connection = SQLiteConnectionManager.shared(self.db_file, db_profile)
         self.create_categories_table()
         self.create_expenses_table()
         self.create_budget_table()
 
-        self.categories_repository = SQLiteRepository(self.db_file, Category)
-        self.expenses_repository = SQLiteRepository(self.db_file, Expense)
-        self.budget_repository = SQLiteRepository(self.db_file, Budget)
+        categories_repository = SQLiteRepository(self.db_file, Category,
+                                                 self.connection)
+        expenses_repository = SQLiteRepository(self.db_file, Expense, self.connection)
+        budget_repository = SQLiteRepository(self.db_file, Budget, self.connection)
+        categories_repository.ensure_indexes()
+        categories_repository.ensure_closure()
+        expenses_repository.ensure_indexes()
+        expenses_repository.ensure_rollups()
+
+        self.expenses_repository: AbstractRepository[Expense] = expenses_repository
+        if write_behind:
+            self.expenses_repository = WriteBehindRepository(expenses_repository)
+
+        # категорий и бюджетов немного, а читаются они на каждую строку таблицы
+        self.categories_repository = CachedRepository(categories_repository,
+                                                      cache_all=True)
+        self.budget_repository = CachedRepository(budget_repository, cache_all=True)
+
+        # суммы трат по бюджетам обновляются при каждом изменении расходов
+        self.budget_engine = BudgetEngine(self.expenses_repository)
 
         # controllers
         self.expenses_controller = ExpensesController(self.expenses_repository,
-                                                      self.categories_repository)
+                                                      self.categories_repository,
+                                                      self.budget_engine)
         self.categories_controller = CategoriesController(self.categories_repository)
         self.budget_controller = BudgetController(self.expenses_repository,
-                                                  self.budget_repository)
+                                                  self.budget_repository,
+                                                  self.budget_engine)
 
         # main widgets
         self.expenses_view_widget = ExpensesViewWidget(self.expenses_controller)
@@ -89,7 +117,7 @@ class MainWindow(QtWidgets.QWidget):  # type: ignore
         Инициализировать таблицу категорий
         """
 
-        with sqlite3.connect(self.db_file) as con:
+        with self.connection.writer() as con:
             cur = con.cursor()
             cur.execute(
                 "CREATE TABLE IF NOT EXISTS Category "
@@ -101,9 +129,8 @@ class MainWindow(QtWidgets.QWidget):  # type: ignore
         Инициализировать таблицу расходов
         """
 
-        with sqlite3.connect(self.db_file) as con:
+        with self.connection.writer() as con:
             cur = con.cursor()
-            cur.execute('PRAGMA foreign_keys = ON')
             cur.execute(
                 "CREATE TABLE IF NOT EXISTS Expense "
                 "(pk INTEGER PRIMARY KEY, amount REAL, category_id INTEGER, "
@@ -116,10 +143,22 @@ class MainWindow(QtWidgets.QWidget):  # type: ignore
         Инициализировать таблицу бюджетов
         """
 
-        with sqlite3.connect(self.db_file) as con:
+        with self.connection.writer() as con:
             cur = con.cursor()
             cur.execute(
                 "CREATE TABLE IF NOT EXISTS Budget "
                 "(pk INTEGER PRIMARY KEY, interval TEXT, amount REAL, "
                 "limit_amount REAL)"
             )
+
+    # pylint: disable-next=invalid-name
+    def closeEvent(self, event: QtGui.QCloseEvent) -> None:
+        """
+        Записать отложенные изменения и закрыть соединения с базой данных
+        при закрытии окна
+        """
+
+        if isinstance(self.expenses_repository, WriteBehindRepository):
+            self.expenses_repository.close()
+        self.connection.close()
+        super().closeEvent(event)
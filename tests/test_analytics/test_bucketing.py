@@ -0,0 +1,68 @@
+from datetime import date, datetime, timedelta
+
+import random
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from bookkeeper.analytics.bucketing import (bucket_id, bucket_ids,  # noqa: E402
+                                            bucket_starts, iso_weeks, sum_by_bucket,
+                                            to_datetime64)
+from bookkeeper.models.budget import period_bounds  # noqa: E402
+
+
+@pytest.fixture
+def dates():
+    rnd = random.Random(4)
+    start = datetime(1960, 1, 1)
+    return [start + timedelta(seconds=rnd.randrange(100 * 365 * 86400))
+            for _ in range(2000)]
+
+
+def test_to_datetime64():
+    d = datetime(2024, 3, 1, 12, 30, 15, 7)
+    assert to_datetime64([d]).tolist() == [d]
+    assert to_datetime64(np.array([d], 'datetime64[s]')).tolist() == \
+        [d.replace(microsecond=0)]
+    micro = (d - datetime(1970, 1, 1)) // timedelta(microseconds=1)
+    assert to_datetime64(np.array([micro])).tolist() == [d]
+
+
+@pytest.mark.parametrize('interval', ['День', 'Неделя', 'Месяц'])
+def test_buckets_match_period_bounds(dates, interval):
+    ids = bucket_ids(dates, interval)
+    starts = bucket_starts(ids, interval).astype('datetime64[us]').tolist()
+    for d, start, i in zip(dates, starts, ids.tolist()):
+        assert start == period_bounds(interval, d)[0]
+        assert bucket_id(d, interval) == i
+    # соседние периоды имеют соседние номера
+    first = period_bounds(interval, dates[0])
+    after = first[1] + timedelta(microseconds=1)
+    assert bucket_id(after, interval) == bucket_id(dates[0], interval) + 1
+
+
+def test_unknown_interval():
+    with pytest.raises(KeyError):
+        bucket_ids([datetime(2024, 1, 1)], 'Год')
+    with pytest.raises(KeyError):
+        bucket_starts([0], 'Год')
+
+
+def test_iso_weeks(dates):
+    years, weeks = iso_weeks(bucket_ids(dates, 'Неделя'))
+    for d, year, week in zip(dates, years.tolist(), weeks.tolist()):
+        assert (year, week) == tuple(d.isocalendar())[:2]
+    # первая неделя 2025 года начинается в 2024 году, 1 января 2021 - 53-я неделя 2020
+    ids = bucket_ids([datetime(2024, 12, 30), datetime(2021, 1, 1)], 'Неделя')
+    assert [tuple(p) for p in zip(*(a.tolist() for a in iso_weeks(ids)))] == \
+        [(2025, 1), (2020, 53)]
+
+
+def test_sum_by_bucket():
+    dates = [datetime(2024, 1, 31), datetime(2024, 1, 1), datetime(2024, 3, 5)]
+    ids, sums = sum_by_bucket(dates, [1.0, 2.0, 4.0], 'Месяц')
+    assert bucket_starts(ids, 'Месяц').tolist() == [date(2024, 1, 1), date(2024, 3, 1)]
+    assert sums.tolist() == [3.0, 4.0]
+    ids, sums = sum_by_bucket([], [], 'День')
+    assert len(ids) == 0 and len(sums) == 0
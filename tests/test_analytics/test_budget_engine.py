@@ -0,0 +1,205 @@
+from datetime import datetime, timedelta
+
+import random
+
+import pytest
+
+from bookkeeper.analytics.budget_engine import BudgetEngine
+from bookkeeper.models.budget import Budget
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.memory_repository import MemoryRepository
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+from bookkeeper.repository.write_behind_repository import WriteBehindRepository
+
+
+class Clock:
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    # среда
+    return Clock(datetime(2024, 4, 10, 12))
+
+
+@pytest.fixture
+def repo():
+    return MemoryRepository()
+
+
+def test_initial_totals(repo, clock):
+    repo.add(Expense(datetime(2024, 4, 10, 9), 100, 1))
+    repo.add(Expense(datetime(2024, 4, 8), 10, 1))
+    repo.add(Expense(datetime(2024, 4, 1), 1, 1))
+    repo.add(Expense(datetime(2024, 3, 31), 1000, 1))
+    engine = BudgetEngine(repo, clock=clock)
+    assert engine.totals() == {'День': 100, 'Неделя': 110, 'Месяц': 111}
+    assert engine.amount('Неделя') == 110
+    assert engine.verify() == {}
+
+
+def test_unknown_interval(repo):
+    with pytest.raises(KeyError):
+        BudgetEngine(repo, intervals=('Год',))
+
+
+def test_deltas(repo, clock):
+    engine = BudgetEngine(repo, clock=clock)
+    expense = Expense(datetime(2024, 4, 10, 9), 100, 1)
+    pk = engine.add(expense)
+    assert repo.get(pk) is expense
+    engine.add(Expense(datetime(2024, 4, 9), 50, 1))
+    engine.add(Expense(datetime(2023, 4, 9), 500, 1))
+    assert engine.totals() == {'День': 100, 'Неделя': 150, 'Месяц': 150}
+
+    engine.update(Expense(datetime(2024, 4, 2), 70, 1, pk=pk))
+    assert engine.totals() == {'День': 0, 'Неделя': 50, 'Месяц': 120}
+    engine.delete(pk)
+    assert engine.totals() == {'День': 0, 'Неделя': 50, 'Месяц': 50}
+    assert engine.verify() == {}
+
+
+def test_deltas_do_not_query_repository(repo, clock, monkeypatch):
+    engine = BudgetEngine(repo, clock=clock)
+
+    def fail(*args, **kwargs):
+        raise AssertionError('aggregate called')
+
+    monkeypatch.setattr(repo, 'aggregate', fail)
+    for i in range(10):
+        engine.add(Expense(datetime(2024, 4, 10), i, 1))
+    assert engine.amount('День') == 45
+
+
+def test_update_in_place(repo, clock):
+    engine = BudgetEngine(repo, clock=clock)
+    expense = Expense(datetime(2024, 4, 10), 100, 1)
+    engine.add(expense)
+    expense.amount = 30
+    engine.update(expense)
+    assert engine.amount('День') == 30
+
+
+def test_rollover(repo, clock):
+    engine = BudgetEngine(repo, clock=clock)
+    engine.add(Expense(datetime(2024, 4, 10), 100, 1))
+    engine.add(Expense(datetime(2024, 4, 11), 10, 1))
+    engine.add(Expense(datetime(2024, 4, 15), 1, 1))
+    engine.add(Expense(datetime(2024, 5, 1), 1000, 1))
+    assert engine.totals() == {'День': 100, 'Неделя': 110, 'Месяц': 111}
+
+    clock.now = datetime(2024, 4, 11, 0, 0, 1)
+    assert engine.totals() == {'День': 10, 'Неделя': 110, 'Месяц': 111}
+    clock.now = datetime(2024, 4, 15)
+    assert engine.totals() == {'День': 1, 'Неделя': 1, 'Месяц': 111}
+    clock.now = datetime(2024, 5, 1)
+    assert engine.totals() == {'День': 1000, 'Неделя': 1000, 'Месяц': 1000}
+    assert engine.verify() == {}
+
+
+def test_external_changes(repo, clock):
+    engine = BudgetEngine(repo, clock=clock)
+    engine.add(Expense(datetime(2024, 4, 10), 100, 1))
+    repo.add(Expense(datetime(2024, 4, 10), 5, 1))
+    assert engine.amount('День') == 105
+    Expense.delete_expenses_of_category(repo, 1)
+    assert engine.amount('День') == 0
+
+
+def test_verify_detects_mismatch(repo, clock):
+    engine = BudgetEngine(repo, clock=clock)
+    engine.add(Expense(datetime(2024, 4, 10), 100, 1))
+    engine._totals['Неделя'] += 1
+    assert engine.verify() == {'Неделя': (101, 100)}
+    engine.recompute()
+    assert engine.verify() == {}
+
+
+def test_budget_amounts_match_update_amount(repo, clock):
+    engine = BudgetEngine(repo, clock=datetime.today)
+    today = datetime.today()
+    for days in (0, 1, 3, 10, 40):
+        engine.add(Expense(today - timedelta(days=days), 10 + days, 1))
+    for interval in ('День', 'Неделя', 'Месяц'):
+        budget = Budget(interval, 0, 1000)
+        budget.update_amount(repo)
+        assert engine.amount(interval) == budget.amount
+
+
+def test_random_operations_sqlite(tmp_path, clock):
+    repo = SQLiteRepository(str(tmp_path / 'engine.db'), Expense)
+    repo.create_table()
+    engine = BudgetEngine(repo, clock=clock)
+    rnd = random.Random(0)
+    pks = []
+    for step in range(300):
+        date = clock.now - timedelta(hours=rnd.randrange(24 * 45))
+        expense = Expense(date, rnd.randrange(1, 100), 1)
+        action = rnd.random()
+        if action < 0.5 or not pks:
+            pks.append(engine.add(expense))
+        elif action < 0.8:
+            expense.pk = rnd.choice(pks)
+            engine.update(expense)
+        else:
+            engine.delete(pks.pop(rnd.randrange(len(pks))))
+        if step % 50 == 0:
+            clock.now += timedelta(hours=13)
+        assert engine.verify() == {}
+    repo.close()
+
+
+def test_write_behind_flushes_do_not_recompute(tmp_path, clock, monkeypatch):
+    sqlite_repo = SQLiteRepository(str(tmp_path / 'engine.db'), Expense)
+    sqlite_repo.create_table()
+    sqlite_repo.add(Expense(datetime(2024, 4, 10, 9), 1000, 1))
+    repo = WriteBehindRepository(sqlite_repo, max_delay=0)
+    engine = BudgetEngine(repo, clock=clock)
+    recomputes = []
+    recompute = engine.recompute
+    monkeypatch.setattr(engine, 'recompute', lambda: recomputes.append(1) or recompute())
+
+    for i in range(10):
+        engine.add(Expense(datetime(2024, 4, 10), i, 1))
+        repo.flush()
+        assert engine.amount('День') == 1045 - sum(range(i + 1, 10))
+    assert recomputes == []
+
+    # изменение в обход обертки приводит к пересчету
+    sqlite_repo.update(Expense(datetime(2024, 4, 10, 9), 2000, 1, pk=1))
+    assert engine.amount('День') == 2045
+    assert recomputes == [1]
+    assert engine.verify() == {}
+    repo.close()
+
+
+def test_budget_writes_do_not_recompute(tmp_path, clock, monkeypatch):
+    # как в MainWindow: расходы и бюджеты в одном файле с общим менеджером
+    expenses = SQLiteRepository(str(tmp_path / 'engine.db'), Expense)
+    budgets = SQLiteRepository(expenses.db_file, Budget, expenses.connection)
+    expenses.create_table()
+    budgets.create_table()
+    budget = Budget('День', 0, 1000)
+    budgets.add(budget)
+    engine = BudgetEngine(expenses, clock=clock)
+    recomputes = []
+    recompute = engine.recompute
+    monkeypatch.setattr(engine, 'recompute', lambda: recomputes.append(1) or recompute())
+
+    for i in range(3):
+        engine.add(Expense(datetime(2024, 4, 10), 10, 1))
+        budget.amount = engine.amount('День')
+        budgets.update_many([budget])
+        budgets.update_many([])
+    assert engine.amount('День') == 30
+    assert recomputes == []
+
+    # изменение расходов в обход движка приводит к пересчету
+    expenses.add(Expense(datetime(2024, 4, 10), 5, 1))
+    assert engine.amount('День') == 35
+    assert recomputes == [1]
+    expenses.close()
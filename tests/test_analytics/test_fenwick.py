@@ -0,0 +1,125 @@
+from datetime import date, datetime, timedelta
+
+import random
+
+import pytest
+
+from bookkeeper.analytics.fenwick import DailySpendIndex, FenwickTree
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.memory_repository import MemoryRepository
+from bookkeeper.repository.query import Between
+
+
+def test_fenwick_sums():
+    values = [3.0, 1.0, 4.0, 1.0, 5.0, 9.0, 2.0, 6.0]
+    tree = FenwickTree.from_values(values)
+    assert len(tree) == 8
+    for start in range(9):
+        for stop in range(start, 9):
+            assert tree.range_sum(start, stop) == sum(values[start:stop])
+    assert tree.prefix_sum(100) == sum(values)
+    assert tree.range_sum(-5, 2) == 4.0
+    assert tree.range_sum(5, 2) == 0.0
+
+
+def test_fenwick_add_and_grow():
+    tree = FenwickTree(3)
+    tree.add(1, 2.0)
+    tree.add(10, 5.0)
+    assert len(tree) == 11
+    assert tree.value(10) == 5.0
+    assert tree.value(100) == 0.0
+    assert tree.prefix_sum(11) == 7.0
+    assert tree.range_sum(2, 11) == 5.0
+    assert tree.values()[1] == 2.0
+    with pytest.raises(IndexError):
+        tree.add(-1, 1.0)
+
+
+def test_fenwick_random():
+    rnd = random.Random(1)
+    values = [0.0] * 50
+    tree = FenwickTree()
+    for _ in range(500):
+        i = rnd.randrange(50)
+        delta = rnd.randrange(-10, 10)
+        values[i] += delta
+        tree.add(i, delta)
+        start, stop = sorted(rnd.sample(range(51), 2))
+        assert tree.range_sum(start, stop) == sum(values[start:stop])
+
+
+@pytest.fixture
+def repo():
+    repo = MemoryRepository()
+    repo.add(Expense(datetime(2024, 1, 1, 10), 10, 1))
+    repo.add(Expense(datetime(2024, 1, 1, 23), 5, 2))
+    repo.add(Expense(datetime(2024, 1, 15), 100, 1))
+    repo.add(Expense(datetime(2024, 3, 1), 1000, 2))
+    return repo
+
+
+def test_range_sum(repo):
+    index = DailySpendIndex(repo)
+    assert index.range_sum(date(2024, 1, 1), date(2024, 1, 1)) == 15
+    assert index.day_sum(datetime(2024, 1, 1, 12)) == 15
+    assert index.range_sum(date(2023, 1, 1), date(2024, 1, 15)) == 115
+    assert index.range_sum(date(2024, 1, 2), date(2030, 1, 1)) == 1100
+    assert index.range_sum(date(2024, 2, 1), date(2024, 1, 1)) == 0
+    with pytest.raises(ValueError):
+        index.range_sum(date(2024, 1, 1), date(2024, 1, 1), category_id=1)
+
+
+def test_range_sum_by_category(repo):
+    index = DailySpendIndex(repo, by_category=True)
+    assert index.range_sum(date(2024, 1, 1), date(2024, 12, 31), 1) == 110
+    assert index.range_sum(date(2024, 1, 1), date(2024, 12, 31), 2) == 1005
+    assert index.range_sum(date(2024, 1, 1), date(2024, 12, 31), 3) == 0
+
+
+def test_empty_repository():
+    index = DailySpendIndex(MemoryRepository(), by_category=True)
+    assert index.range_sum(date(2024, 1, 1), date(2024, 12, 31)) == 0
+    index.add(Expense(datetime(2024, 5, 5), 7, 3))
+    assert len(index._total) == 1
+    assert index.day_sum(date(2024, 5, 5), 3) == 7
+
+
+def test_maintenance(repo):
+    index = DailySpendIndex(repo, by_category=True)
+    pk = index.add(Expense(datetime(2023, 12, 25), 1, 1))
+    assert index.range_sum(date(2023, 1, 1), date(2023, 12, 31), 1) == 1
+    index.update(Expense(datetime(2024, 1, 15), 2, 2, pk=pk))
+    assert index.range_sum(date(2023, 1, 1), date(2023, 12, 31)) == 0
+    assert index.day_sum(date(2024, 1, 15), 2) == 2
+    index.delete(pk)
+    assert index.day_sum(date(2024, 1, 15)) == 100
+
+    # изменение в обход индекса
+    repo.add(Expense(datetime(2024, 1, 15), 3, 1))
+    assert index.day_sum(date(2024, 1, 15)) == 103
+
+
+def test_random_against_repository():
+    rnd = random.Random(2)
+    repo = MemoryRepository()
+    index = DailySpendIndex(repo, by_category=True)
+    start = datetime(2024, 1, 1)
+    pks = []
+    for _ in range(300):
+        expense = Expense(start + timedelta(hours=rnd.randrange(24 * 90)),
+                          rnd.randrange(1, 100), rnd.randrange(1, 4))
+        action = rnd.random()
+        if action < 0.6 or not pks:
+            pks.append(index.add(expense))
+        elif action < 0.8:
+            expense.pk = rnd.choice(pks)
+            index.update(expense)
+        else:
+            index.delete(pks.pop(rnd.randrange(len(pks))))
+        first = start + timedelta(days=rnd.randrange(90))
+        last = first + timedelta(days=rnd.randrange(30))
+        where = {'date': Between(first, last.replace(hour=23, minute=59, second=59))}
+        assert index.range_sum(first, last) == repo.aggregate('sum', 'amount', where)
+        where['category_id'] = 2
+        assert index.range_sum(first, last, 2) == repo.aggregate('sum', 'amount', where)
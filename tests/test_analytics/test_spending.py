@@ -0,0 +1,126 @@
+from datetime import datetime, timedelta
+
+import random
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from bookkeeper.analytics.spending import spending_matrix, topological_order  # noqa: E402
+from bookkeeper.models.category import Category  # noqa: E402
+from bookkeeper.models.expense import Expense  # noqa: E402
+from bookkeeper.repository.columnar_repository import (  # noqa: E402
+    ColumnarExpenseRepository)
+from bookkeeper.repository.memory_repository import MemoryRepository  # noqa: E402
+from bookkeeper.repository.sqlite_repository import SQLiteRepository  # noqa: E402
+from bookkeeper.utils import read_tree  # noqa: E402
+
+TREE = '''
+продукты
+    мясо
+        сырое мясо
+        мясные продукты
+    сладости
+книги
+'''
+
+
+@pytest.fixture
+def categories():
+    repo = MemoryRepository()
+    Category.create_from_tree(read_tree(TREE.splitlines()), repo)
+    return repo
+
+
+def pk(categories, name):
+    return categories.get_all({'name': name})[0].pk
+
+
+def expenses(categories, rnd, count=300):
+    leaves = [c.pk for c in categories.get_all()] + [100]
+    start = datetime(2023, 11, 1)
+    return [Expense(start + timedelta(hours=rnd.randrange(24 * 120)),
+                    float(rnd.randrange(1, 100)), rnd.choice(leaves))
+            for _ in range(count)]
+
+
+def test_topological_order():
+    cats = [Category('c', 3, pk=4), Category('b', 1, pk=3), Category('a', pk=1),
+            Category('x', 6, pk=5), Category('y', 5, pk=6), Category('z', 42, pk=7)]
+    assert [c.pk for c in topological_order(cats)] == [1, 7, 3, 4, 5, 6]
+
+
+def test_hierarchy_rollup(categories):
+    repo = MemoryRepository()
+    repo.add(Expense(datetime(2024, 1, 5), 10, pk(categories, 'сырое мясо')))
+    repo.add(Expense(datetime(2024, 1, 6), 5, pk(categories, 'мясо')))
+    repo.add(Expense(datetime(2024, 2, 1), 7, pk(categories, 'сладости')))
+    repo.add(Expense(datetime(2024, 3, 1), 3, pk(categories, 'книги')))
+    repo.add(Expense(datetime(2024, 3, 2), 1, 100))
+    repo.add(Expense(datetime(2023, 12, 31), 1000, pk(categories, 'книги')))
+
+    m = spending_matrix(repo, categories, 'Месяц', datetime(2024, 1, 1),
+                        datetime(2024, 3, 31))
+    assert m.periods == [datetime(2024, 1, 1), datetime(2024, 2, 1),
+                         datetime(2024, 3, 1)]
+    assert m.total.shape == (6, 3)
+    assert m.row(pk(categories, 'продукты')).tolist() == [15, 7, 0]
+    assert m.row(pk(categories, 'продукты'), own=True).tolist() == [0, 0, 0]
+    assert m.row(pk(categories, 'мясо')).tolist() == [15, 0, 0]
+    assert m.row(pk(categories, 'мясо'), own=True).tolist() == [5, 0, 0]
+    assert m.row(pk(categories, 'книги')).tolist() == [0, 0, 3]
+    assert m.value(pk(categories, 'сладости'), datetime(2024, 2, 20)) == 7
+    assert m.unassigned.tolist() == [0, 0, 1]
+    # корни в сумме дают все траты по известным категориям
+    roots = [i for i, c in enumerate(m.categories) if categories.get(c).parent is None]
+    assert m.total[roots].sum() + m.unassigned.sum() == 26
+
+
+@pytest.mark.parametrize('interval', ['День', 'Неделя', 'Месяц'])
+def test_backends_agree(categories, tmp_path, interval):
+    objs = expenses(categories, random.Random(5))
+    memory = MemoryRepository()
+    memory.add_many(Expense(e.date, e.amount, e.category_id) for e in objs)
+    columnar = ColumnarExpenseRepository()
+    columnar.add_many(Expense(e.date, e.amount, e.category_id) for e in objs)
+    sqlite = SQLiteRepository(str(tmp_path / 'spending.db'), Expense)
+    sqlite.create_table()
+    sqlite.add_many(Expense(e.date, e.amount, e.category_id) for e in objs)
+
+    start, end = datetime(2023, 12, 13), datetime(2024, 2, 10)
+    expected = spending_matrix(memory, categories, interval, start, end)
+    for repo in (columnar, sqlite):
+        m = spending_matrix(repo, categories, interval, start, end)
+        assert m.periods == expected.periods
+        assert m.categories == expected.categories
+        assert np.allclose(m.total, expected.total)
+        assert np.allclose(m.unassigned, expected.unassigned)
+    sqlite.close()
+
+
+def test_sqlite_sum_by_period_uses_rollups(tmp_path):
+    repo = SQLiteRepository(str(tmp_path / 'periods.db'), Expense)
+    repo.create_table()
+    repo.add(Expense(datetime(2024, 1, 7, 23), 10, 1))  # воскресенье
+    repo.add(Expense(datetime(2024, 1, 8, 1), 5, 1))
+    repo.add(Expense(datetime(2024, 2, 1), 1, 2))
+    assert repo.sum_by_period('Неделя') == {datetime(2024, 1, 1): 10,
+                                            datetime(2024, 1, 8): 5,
+                                            datetime(2024, 1, 29): 1}
+    assert repo.sum_by_period('Месяц', by_category=True) == \
+        {(datetime(2024, 1, 1), 1): 15, (datetime(2024, 2, 1), 2): 1}
+    some = {'date': datetime(2024, 2, 1)}
+    assert repo.sum_by_period('День', some) == {datetime(2024, 2, 1): 1}
+    with repo.connection.writer() as con:
+        con.execute('UPDATE expense_daily SET total = 0')
+        con.execute('UPDATE expense_monthly SET total = 100')
+    assert repo.sum_by_period('День') == {datetime(2024, 1, 7): 0,
+                                          datetime(2024, 1, 8): 0,
+                                          datetime(2024, 2, 1): 0}
+    assert repo.sum_by_period('Месяц') == {datetime(2024, 1, 1): 100,
+                                           datetime(2024, 2, 1): 100}
+    # условие не выражается через сводные таблицы - запрос к таблице расходов
+    assert repo.sum_by_period('День', some) == {datetime(2024, 2, 1): 1}
+    with pytest.raises(KeyError):
+        repo.sum_by_period('Год')
+    repo.close()
@@ -0,0 +1,241 @@
+from datetime import datetime
+from itertools import count
+
+import io
+
+import pytest
+
+from bookkeeper.cli import main
+from bookkeeper.csv_import import (CategoryResolver, CsvMapping, _records, import_csv,
+                                   import_csv_parallel, iter_chunks)
+from bookkeeper.models.category import Category
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.memory_repository import MemoryRepository
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+
+CSV = '''date,amount,category,comment
+2024-01-01 10:00:00,100.5,продукты,хлеб
+2024-01-01 12:00:00,20,книги,
+2024-01-02,30,продукты,"молоко, ""3.2%"""
+'''
+
+
+@pytest.fixture
+def categories():
+    repo = MemoryRepository()
+    for name in ('продукты', 'книги'):
+        repo.add(Category(name))
+    return repo
+
+
+@pytest.fixture
+def expenses():
+    return MemoryRepository()
+
+
+def write(tmp_path, text, encoding='utf-8', name='statement.csv'):
+    path = tmp_path / name
+    path.write_bytes(text.encode(encoding))
+    return str(path)
+
+
+def test_import(tmp_path, categories, expenses):
+    result = import_csv(write(tmp_path, CSV), expenses, categories)
+    assert (result.rows, result.imported, result.skipped) == (3, 3, 0)
+    assert result.fraction == 1.0
+    assert [(e.date, e.amount, e.category_id, e.comment) for e in expenses.get_all()] == [
+        (datetime(2024, 1, 1, 10), 100.5, 1, 'хлеб'),
+        (datetime(2024, 1, 1, 12), 20, 2, ''),
+        (datetime(2024, 1, 2), 30, 1, 'молоко, "3.2%"'),
+    ]
+
+
+def test_progress(tmp_path, categories, expenses):
+    reports = []
+    import_csv(write(tmp_path, CSV + '\n' * 3), expenses, categories, chunk_size=2,
+               progress=lambda p: reports.append((p.rows, p.imported, p.skipped,
+                                                  p.fraction)))
+    assert reports[0][:3] == (2, 2, 0)
+    assert reports[-1] == (6, 3, 3, 1.0)
+    assert [r[3] for r in reports] == sorted(r[3] for r in reports)
+
+
+def test_mapping(tmp_path, categories, expenses):
+    text = ('\ufeffДата;Категория;Сумма\n'
+            '01.02.2024;книги;-1 234,50\n'
+            '02.02.2024;продукты;-10,00\n')
+    mapping = CsvMapping(date='Дата', amount='Сумма', category='Категория', comment=None,
+                         date_format='%d.%m.%Y', decimal=',', thousands=' ',
+                         negate=True, delimiter=';')
+    import_csv(write(tmp_path, text), expenses, categories, mapping)
+    assert [(e.date, e.amount, e.category_id) for e in expenses.get_all()] == [
+        (datetime(2024, 2, 1), 1234.5, 2), (datetime(2024, 2, 2), 10, 1)]
+
+
+def test_no_header(tmp_path, categories, expenses):
+    text = 'книги,5,2024-03-01\n'
+    mapping = CsvMapping(date=2, amount=1, category=0, comment=None, header=False,
+                         encoding='cp1251')
+    import_csv(write(tmp_path, text, 'cp1251'), expenses, categories, mapping)
+    assert expenses.get(1) == Expense(datetime(2024, 3, 1), 5, 2, pk=1)
+    with pytest.raises(ValueError, match='header'):
+        import_csv(write(tmp_path, text), expenses, categories,
+                   CsvMapping(header=False))
+
+
+def test_unknown_category(tmp_path, categories, expenses):
+    path = write(tmp_path, CSV + '2024-01-03,1,транспорт,\n')
+    with pytest.raises(ValueError, match='row 5: unknown category'):
+        import_csv(path, expenses, categories)
+
+    expenses = MemoryRepository()
+    result = import_csv(path, expenses, categories, CsvMapping(unknown_category='skip'))
+    assert (result.imported, result.skipped) == (3, 1)
+
+    expenses = MemoryRepository()
+    import_csv(path, expenses, categories, CsvMapping(unknown_category='create'))
+    transport = categories.get_all({'name': 'транспорт'})[0]
+    assert transport.parent is None
+    assert expenses.get_all()[-1].category_id == transport.pk
+
+
+def test_parse_errors(tmp_path, categories, expenses):
+    path = write(tmp_path, CSV + '2024-01-03,abc,книги,\n')
+    with pytest.raises(ValueError, match='row 5'):
+        import_csv(path, expenses, categories)
+    path = write(tmp_path, CSV + '03.01.2024,1,книги,\n')
+    with pytest.raises(ValueError, match='row 5'):
+        import_csv(path, expenses, categories)
+    path = write(tmp_path, CSV + '2024-01-03,1\n')
+    with pytest.raises(ValueError, match='row 5: expected 4 columns'):
+        import_csv(path, expenses, categories)
+    with pytest.raises(ValueError, match='not in the header'):
+        import_csv(path, expenses, categories, CsvMapping(date='Дата'))
+
+
+def test_category_resolver(categories):
+    categories.add(Category('книги', 1))
+    resolver = CategoryResolver(categories)
+    assert resolver.resolve('книги') == 2
+    assert resolver.resolve('нет') is None
+    categories.delete(2)
+    # результат кэшируется
+    assert resolver.resolve('книги') == 2
+
+
+def test_iter_chunks_is_lazy():
+    rows = ([str(i)] for i in count())
+    chunks = iter_chunks(rows, 3)
+    assert next(chunks) == [['0'], ['1'], ['2']]
+    assert next(chunks) == [['3'], ['4'], ['5']]
+    with pytest.raises(ValueError):
+        next(iter_chunks([], 0))
+
+
+def test_sqlite_batches(tmp_path):
+    db_file = str(tmp_path / 'import.db')
+    categories = SQLiteRepository(db_file, Category)
+    expenses = SQLiteRepository(db_file, Expense)
+    categories.create_table()
+    expenses.create_table()
+    categories.add_many([Category('продукты'), Category('книги')])
+    lines = [f'2024-01-{i % 28 + 1:02d},{i},продукты,' for i in range(95)]
+    path = write(tmp_path, 'date,amount,category,comment\n' + '\n'.join(lines)
+                 + '\n2024-02-01,1,транспорт,\n')
+
+    with pytest.raises(ValueError, match='row 97'):
+        import_csv(path, expenses, categories, chunk_size=10)
+    # порции до ошибочной записаны, порция с ошибкой - нет
+    assert expenses.aggregate('count') == 90
+    assert expenses.aggregate('sum', 'amount') == sum(range(90))
+    categories.close()
+
+
+def test_cli(tmp_path, capsys):
+    db_file = str(tmp_path / 'cli.db')
+    path = write(tmp_path, 'a;b;c\n2024-01-01;10,5;продукты\n')
+    main(['import-csv', db_file, path, '--date', '0', '--amount', '1', '--category', '2',
+          '--comment', '', '--delimiter', ';', '--decimal', ',',
+          '--unknown-category', 'create'])
+    captured = capsys.readouterr()
+    assert captured.out.startswith('imported: 1, skipped: 0')
+    assert captured.err.startswith('1 rows')
+    repo = SQLiteRepository(db_file, Expense)
+    assert [(e.amount, e.category_id) for e in repo.get_all()] == [(10.5, 1)]
+    repo.close()
+
+    other = write(tmp_path, 'a;b;c\n2024-01-02;1;книги\n', name='other.csv')
+    main(['import-csv', db_file, path, other, '--jobs', '2', '--date', '0',
+          '--amount', '1', '--category', '2', '--comment', '', '--delimiter', ';',
+          '--decimal', ',', '--unknown-category', 'create'])
+    assert capsys.readouterr().out.startswith('imported: 2, skipped: 0')
+    repo = SQLiteRepository(db_file, Expense)
+    assert [(e.amount, e.category_id) for e in repo.get_all()] == [
+        (10.5, 1), (10.5, 1), (1, 2)]
+    repo.close()
+
+
+def sqlite_repos(db_file):
+    categories = SQLiteRepository(db_file, Category)
+    expenses = SQLiteRepository(db_file, Expense, categories.connection)
+    categories.create_table()
+    expenses.create_table()
+    categories.add_many([Category('продукты'), Category('книги')])
+    return categories, expenses
+
+
+def dump(repo):
+    with repo.connection.reader() as con:
+        return con.execute('SELECT * FROM expense ORDER BY pk').fetchall()
+
+
+def test_records():
+    data = b'a,b\n1,"x\ny"\n\n2,"""q"""\r\n3,"\n\n"'
+    assert list(_records(io.BytesIO(data))) == [
+        b'a,b\n', b'1,"x\ny"\n', b'\n', b'2,"""q"""\r\n', b'3,"\n\n"']
+
+
+def test_parallel_matches_sequential(tmp_path):
+    paths = [
+        write(tmp_path, '\ufeff' + CSV + '\n2024-01-03,5,книги,"две\nстроки"\n',
+              name='a.csv'),
+        write(tmp_path, 'date,amount,category,comment\n' + ''.join(
+            f'2024-02-{i % 28 + 1:02d},{i},{"книги" if i % 3 else "нет"},"{i}, {i}"\n'
+            for i in range(50)), name='b.csv'),
+        write(tmp_path, 'comment,category,amount,date\n,продукты,1,2024-03-01\n',
+              name='c.csv'),
+    ]
+    mapping = CsvMapping(unknown_category='skip')
+    categories, expenses = sqlite_repos(str(tmp_path / 'sequential.db'))
+    results = [import_csv(path, expenses, categories, mapping, 7) for path in paths]
+    expected = dump(expenses)
+    categories.close()
+
+    categories, expenses = sqlite_repos(str(tmp_path / 'parallel.db'))
+    reports = []
+    result = import_csv_parallel(paths, expenses, categories, mapping, 7, workers=2,
+                                 progress=lambda p: reports.append(p.fraction))
+    assert dump(expenses) == expected
+    assert (result.rows, result.imported, result.skipped) == (
+        sum(r.rows for r in results), sum(r.imported for r in results),
+        sum(r.skipped for r in results))
+    assert reports == sorted(reports) and reports[-1] == 1.0
+    assert expenses.get(4).comment == 'две\nстроки'
+    categories.close()
+
+
+def test_parallel_errors(tmp_path):
+    categories, expenses = sqlite_repos(str(tmp_path / 'import.db'))
+    good = write(tmp_path, CSV, name='good.csv')
+    bad = write(tmp_path, CSV + '2024-01-03,1,транспорт,\n', name='bad.csv')
+    with pytest.raises(ValueError, match='bad.csv: row 5: unknown category'):
+        import_csv_parallel([good, bad], expenses, categories, chunk_size=2, workers=2)
+    # порции до ошибочной записаны
+    assert expenses.aggregate('count') == 5
+
+    bad = write(tmp_path, CSV + '2024-01-03,abc,книги,\n', name='bad.csv')
+    with pytest.raises(ValueError, match='bad.csv: row 5'):
+        import_csv_parallel([bad], expenses, categories, workers=1)
+    with pytest.raises(ValueError, match='good.csv: column'):
+        import_csv_parallel([good], expenses, categories, CsvMapping(date='Дата'))
+    categories.close()
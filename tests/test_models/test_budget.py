@@ -2,8 +2,10 @@ import datetime
 
 import pytest
 
+from bookkeeper.analytics.fenwick import DailySpendIndex
 from bookkeeper.repository.memory_repository import MemoryRepository
-from bookkeeper.models.budget import Budget
+from bookkeeper.models.budget import (Budget, period_bounds, rolling_bounds,
+                                      year_to_date_bounds)
 from bookkeeper.models.expense import Expense
 
 
@@ -42,3 +44,58 @@ def test_update_amount(expenses_repo):
     assert b2.amount == 7000.0
     assert b3.amount == 10000.0
 
+
+def test_period_bounds():
+    d = datetime.datetime(2021, 1, 1, 12, 30)
+    day = datetime.timedelta(days=1)
+    end = datetime.timedelta(microseconds=1)
+    assert period_bounds('День', d) == (datetime.datetime(2021, 1, 1),
+                                        datetime.datetime(2021, 1, 2) - end)
+    # 1 января 2021 - пятница 53-й ISO недели 2020 года
+    assert period_bounds('Неделя', d) == (datetime.datetime(2020, 12, 28),
+                                          datetime.datetime(2021, 1, 4) - end)
+    assert period_bounds('Месяц', d + 30 * day) == (datetime.datetime(2021, 1, 1),
+                                                    datetime.datetime(2021, 2, 1) - end)
+    assert period_bounds('Месяц', datetime.datetime(2020, 12, 31))[1] == \
+        datetime.datetime(2021, 1, 1) - end
+    with pytest.raises(KeyError):
+        period_bounds('Год', d)
+
+
+def test_update_amount_current_period(expenses_repo):
+    today = datetime.datetime.today()
+    expenses_repo.add(Expense(today, 100.0, 1))
+    expenses_repo.add(Expense(today, 50.0, 2))
+    expenses_repo.add(Expense(today - datetime.timedelta(days=400), 1000.0, 1))
+    for interval in ('День', 'Неделя', 'Месяц'):
+        b = Budget(interval, 0, 1000.0)
+        b.update_amount(expenses_repo)
+        assert b.amount == 150.0
+
+
+def test_custom_windows():
+    d = datetime.datetime(2024, 3, 10, 15)
+    end = datetime.datetime(2024, 3, 11) - datetime.timedelta(microseconds=1)
+    assert rolling_bounds(30, d) == (datetime.datetime(2024, 2, 10), end)
+    assert rolling_bounds(1, d) == period_bounds('День', d)
+    assert year_to_date_bounds(d) == (datetime.datetime(2024, 1, 1), end)
+    with pytest.raises(ValueError):
+        rolling_bounds(0, d)
+
+
+def test_update_amount_from_index(expenses_repo):
+    today = datetime.datetime.today()
+    expenses_repo.add(Expense(today, 100.0, 1))
+    expenses_repo.add(Expense(today - datetime.timedelta(days=20), 10.0, 2))
+    expenses_repo.add(Expense(today - datetime.timedelta(days=400), 1000.0, 1))
+    index = DailySpendIndex(expenses_repo, by_category=True)
+
+    b = Budget('День', 0, 1000.0)
+    b.update_amount_from_index(index)
+    assert b.amount == 100.0
+    b.update_amount_from_index(index, rolling_bounds(30, today))
+    assert b.amount == 110.0
+    b.update_amount_from_index(index, rolling_bounds(30, today), category_id=2)
+    assert b.amount == 10.0
+    b.update_amount_from_index(index, rolling_bounds(401, today))
+    assert b.amount == 1110.0
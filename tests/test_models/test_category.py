@@ -1,12 +1,18 @@
 """
 Тесты для категорий расходов
 """
+from datetime import datetime
 from inspect import isgenerator
+import sqlite3
 
 import pytest
 
-from bookkeeper.models.category import Category
+from bookkeeper.cli import main
+from bookkeeper.models.category import Category, TreeSync
+from bookkeeper.models.expense import Expense
 from bookkeeper.repository.memory_repository import MemoryRepository
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+from bookkeeper.utils import iter_tree
 
 
 @pytest.fixture
@@ -106,3 +112,142 @@ def test_create_from_tree_error(repo):
     tree = [('1', 'parent'), ('parent', None)]
     with pytest.raises(KeyError):
         Category.create_from_tree(tree, repo)
+
+
+TREE = '''
+продукты
+    мясо
+        сырое мясо
+        мясные продукты
+    сладости
+книги
+'''
+
+
+def tree_of(repo):
+    return sorted(tuple(c.name for c in [*reversed(repo.ancestors(c.pk)), c])
+                  for c in repo.get_all())
+
+
+def sync(text, repo):
+    return Category.sync_from_tree(iter_tree(text.splitlines()), repo)
+
+
+def test_sync_from_tree_creates(repo):
+    result = sync(TREE, repo)
+    assert len(result.added) == 6
+    assert tree_of(repo) == sorted(iter_tree(TREE.splitlines()))
+    result = sync(TREE, repo)
+    assert result == TreeSync()
+
+
+def test_sync_from_tree_changes(repo):
+    sync(TREE, repo)
+    pks = {c.name: c.pk for c in repo.get_all()}
+    text = '''
+еда
+    мясо
+        сырое мясо
+    фрукты
+книги
+    сладости
+'''
+    result = sync(text, repo)
+    assert tree_of(repo) == sorted(iter_tree(text.splitlines()))
+    assert [c.pk for c in result.renamed] == [pks['продукты']]
+    assert [c.pk for c in result.moved] == [pks['сладости']]
+    assert [c.name for c in result.added] == ['фрукты']
+    assert result.deleted == [pks['мясные продукты']]
+    assert repo.get(pks['сырое мясо']).parent == pks['мясо']
+
+
+def test_sync_from_tree_swap(repo):
+    sync('a\n    b\n        c\n', repo)
+    pks = {c.name: c.pk for c in repo.get_all()}
+    result = sync('c\n    b\n        a\n', repo)
+    assert tree_of(repo) == [('c',), ('c', 'b'), ('c', 'b', 'a')]
+    assert {c.name for c in result.moved} == {'a', 'b', 'c'}
+    assert {c.name: c.pk for c in repo.get_all()} == pks
+
+
+def test_sync_from_tree_duplicate_names(repo):
+    text = 'a\n    прочее\nb\n    прочее\n'
+    sync(text, repo)
+    result = sync(text + 'c\n    прочее\n', repo)
+    assert [(c.name, c.parent) for c in result.added] == \
+        [('c', None), ('прочее', result.added[0].pk)]
+    assert tree_of(repo) == sorted(iter_tree((text + 'c\n    прочее\n').splitlines()))
+
+
+def test_sync_from_tree_invalid_paths(repo):
+    with pytest.raises(ValueError):
+        Category.sync_from_tree([('a',), ('b', 'c')], repo)
+    assert repo.get_all() == []
+
+
+def test_sync_from_tree_sqlite(tmp_path):
+    repo = SQLiteRepository(str(tmp_path / 'sync.db'), Category)
+    repo.create_table()
+    sync(TREE, repo)
+    sync('сладости\n    мясо\n        сырое мясо\n    книги\nпродукты\n', repo)
+    with repo.connection.reader() as con:
+        closure = con.execute('SELECT * FROM category_closure ORDER BY 1, 2').fetchall()
+    repo.rebuild_closure()
+    with repo.connection.reader() as con:
+        assert con.execute('SELECT * FROM category_closure '
+                           'ORDER BY 1, 2').fetchall() == closure
+    assert [c.name for c in repo.descendants(pk_of(repo, 'сладости'))] == \
+        ['книги', 'мясо', 'сырое мясо']
+    repo.close()
+
+
+def pk_of(repo, name):
+    return repo.get_all({'name': name})[0].pk
+
+
+def test_sync_categories_cli(tmp_path, capsys):
+    db_file, tree_file = str(tmp_path / 'cli.db'), tmp_path / 'tree.txt'
+    tree_file.write_text(TREE, encoding='utf-8')
+    main(['sync-categories', db_file, str(tree_file)])
+    assert capsys.readouterr().out == \
+        'added: 6, renamed: 0, moved: 0, deleted: 0 (expenses deleted: 0)\n'
+
+    repo = SQLiteRepository(db_file, Category)
+    expenses = SQLiteRepository(db_file, Expense)
+    for name in ('книги', 'мясо'):
+        expenses.add(Expense(datetime(2024, 1, 1), 1, pk_of(repo, name)))
+    tree_file.write_text(TREE.replace('книги\n', ''), encoding='utf-8')
+    main(['sync-categories', db_file, str(tree_file)])
+    assert capsys.readouterr().out == \
+        'added: 0, renamed: 0, moved: 0, deleted: 1 (expenses deleted: 1)\n'
+    assert [e.category_id for e in expenses.get_all()] == [pk_of(repo, 'мясо')]
+    repo.close()
+
+
+def test_sync_categories_cli_foreign_keys(tmp_path, capsys):
+    # таблицы как в MainWindow: расходы ссылаются на категории внешним ключом
+    db_file, tree_file = str(tmp_path / 'fk.db'), tmp_path / 'tree.txt'
+    with sqlite3.connect(db_file) as con:
+        con.execute('CREATE TABLE IF NOT EXISTS Category '
+                    '(pk INTEGER PRIMARY KEY, parent INTEGER, name TEXT)')
+        con.execute('CREATE TABLE IF NOT EXISTS Expense '
+                    '(pk INTEGER PRIMARY KEY, amount REAL, category_id INTEGER, '
+                    'date DATETIME, comment TEXT,  FOREIGN KEY (category_id) '
+                    'REFERENCES Category(pk))')
+    con.close()
+    tree_file.write_text(TREE, encoding='utf-8')
+    main(['sync-categories', db_file, str(tree_file)])
+    capsys.readouterr()
+
+    repo = SQLiteRepository(db_file, Category)
+    expenses = SQLiteRepository(db_file, Expense)
+    for name in ('книги', 'мясные продукты', 'мясо'):
+        expenses.add(Expense(datetime(2024, 1, 1), 1, pk_of(repo, name)))
+    tree_file.write_text(TREE.replace('книги\n', '').replace(
+        '        мясные продукты\n', ''), encoding='utf-8')
+    main(['sync-categories', db_file, str(tree_file)])
+    assert capsys.readouterr().out == \
+        'added: 0, renamed: 0, moved: 0, deleted: 2 (expenses deleted: 2)\n'
+    assert [e.category_id for e in expenses.get_all()] == [pk_of(repo, 'мясо')]
+    repo.close()
+    expenses.close()
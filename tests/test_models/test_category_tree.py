@@ -0,0 +1,215 @@
+"""
+Тесты для индекса дерева категорий
+"""
+from datetime import datetime
+
+import random
+
+import pytest
+
+from bookkeeper.models import category_tree
+from bookkeeper.models.category import Category
+from bookkeeper.models.category_tree import CategoryTree
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.memory_repository import MemoryRepository
+from bookkeeper.utils import read_tree
+
+TREE = '''
+продукты
+    мясо
+        сырое мясо
+        мясные продукты
+    сладости
+книги
+'''
+
+
+@pytest.fixture
+def repo():
+    repo = MemoryRepository()
+    Category.create_from_tree(read_tree(TREE.splitlines()), repo)
+    return repo
+
+
+@pytest.fixture
+def tree(repo):
+    return CategoryTree.from_repository(repo)
+
+
+def pk(repo, name):
+    return repo.get_all({'name': name})[0].pk
+
+
+def brute_ancestor(tree, ancestor, node):
+    parent = tree.get(node).parent
+    while parent is not None:
+        if parent == ancestor:
+            return True
+        parent = tree.get(parent).parent
+    return False
+
+
+def check(tree):
+    nodes = list(tree.walk())
+    assert sorted(nodes) == sorted(pk for pk in nodes if pk in tree)
+    assert len(nodes) == len(tree)
+    for a in nodes:
+        assert tree.depth(a) == len(tree.path(a)) - 1
+        for b in nodes:
+            assert tree.is_ancestor(a, b) == brute_ancestor(tree, a, b)
+
+
+def test_build(repo, tree):
+    assert len(tree) == 6
+    food, meat, raw = pk(repo, 'продукты'), pk(repo, 'мясо'), pk(repo, 'сырое мясо')
+    books = pk(repo, 'книги')
+    assert tree.is_ancestor(food, raw)
+    assert tree.is_ancestor(meat, raw)
+    assert not tree.is_ancestor(raw, meat)
+    assert not tree.is_ancestor(food, food)
+    assert not tree.is_ancestor(books, raw)
+    assert tree.depth(food) == 0
+    assert tree.depth(raw) == 2
+    assert tree.children(None) == [food, books]
+    check(tree)
+
+
+def test_descendants_match_repository(repo, tree):
+    for c in repo.get_all():
+        assert tree.descendant_ids(c.pk) == [d.pk for d in repo.descendants(c.pk)]
+        assert tree.subtree_ids(c.pk) == repo.subtree_ids(c.pk)
+
+
+def test_walk_parents_first(repo, tree):
+    seen = set()
+    for node in tree.walk():
+        parent = tree.get(node).parent
+        assert parent is None or parent in seen
+        seen.add(node)
+    assert list(tree.walk(pk(repo, 'книги'))) == [pk(repo, 'книги')]
+
+
+def test_path_and_breadcrumb(repo, tree):
+    raw = pk(repo, 'сырое мясо')
+    assert tree.path(raw) == (pk(repo, 'продукты'), pk(repo, 'мясо'), raw)
+    assert tree.breadcrumb(raw) == 'продукты / мясо / сырое мясо'
+    assert tree.breadcrumb(raw, '>') == 'продукты>мясо>сырое мясо'
+
+
+def test_stores_copies(repo, tree):
+    food = pk(repo, 'продукты')
+    tree.rename(food, 'еда')
+    assert repo.get(food).name == 'продукты'
+    assert tree.get(food).name == 'еда'
+
+
+def test_add(repo, tree):
+    meat = pk(repo, 'мясо')
+    c = Category('птица', meat)
+    repo.add(c)
+    tree.add(c)
+    assert tree.is_ancestor(pk(repo, 'продукты'), c.pk)
+    assert tree.breadcrumb(c.pk) == 'продукты / мясо / птица'
+    assert tree.children(meat)[-1] == c.pk
+    top = Category('транспорт')
+    repo.add(top)
+    tree.add(top)
+    assert tree.depth(top.pk) == 0
+    assert tree.relabels == 1
+    check(tree)
+
+
+def test_add_errors(repo, tree):
+    with pytest.raises(ValueError):
+        tree.add(repo.get(pk(repo, 'мясо')))
+    with pytest.raises(ValueError):
+        tree.add(Category('x', 100, pk=50))
+
+
+def test_rename_updates_breadcrumb(repo, tree):
+    raw = pk(repo, 'сырое мясо')
+    assert tree.breadcrumb(raw) == 'продукты / мясо / сырое мясо'
+    tree.rename(pk(repo, 'мясо'), 'мясное')
+    assert tree.breadcrumb(raw) == 'продукты / мясное / сырое мясо'
+
+
+def test_move(repo, tree):
+    meat, books = pk(repo, 'мясо'), pk(repo, 'книги')
+    raw = pk(repo, 'сырое мясо')
+    assert tree.breadcrumb(raw) == 'продукты / мясо / сырое мясо'
+    tree.move(meat, books)
+    assert tree.is_ancestor(books, raw)
+    assert not tree.is_ancestor(pk(repo, 'продукты'), raw)
+    assert tree.depth(raw) == 2
+    assert tree.breadcrumb(raw) == 'книги / мясо / сырое мясо'
+    tree.move(meat, None)
+    assert tree.depth(raw) == 1
+    assert tree.children(None)[-1] == meat
+    check(tree)
+
+
+def test_move_into_own_subtree(repo, tree):
+    food = pk(repo, 'продукты')
+    with pytest.raises(ValueError):
+        tree.move(food, pk(repo, 'сырое мясо'))
+    with pytest.raises(ValueError):
+        tree.move(food, food)
+    with pytest.raises(ValueError):
+        tree.move(food, 100)
+    check(tree)
+
+
+def test_remove(repo, tree):
+    meat = pk(repo, 'мясо')
+    removed = tree.remove(meat)
+    assert sorted(removed) == sorted(repo.subtree_ids(meat))
+    assert len(tree) == 3
+    assert meat not in tree
+    assert tree.children(pk(repo, 'продукты')) == [pk(repo, 'сладости')]
+    check(tree)
+
+
+def test_relabel_when_gap_exhausted(monkeypatch):
+    monkeypatch.setattr(category_tree, '_SPACING', 4)
+    tree = CategoryTree([Category('root', pk=1)])
+    for i in range(2, 30):
+        tree.add(Category(str(i), 1, pk=i))
+    assert tree.relabels > 1
+    assert tree.descendant_ids(1) == list(range(2, 30))
+    check(tree)
+
+
+def test_random_operations():
+    rnd = random.Random(1)
+    tree = CategoryTree()
+    for i in range(1, 200):
+        nodes = list(tree.walk())
+        if nodes and rnd.random() < 0.3:
+            node, parent = rnd.choice(nodes), rnd.choice(nodes + [None])
+            if parent is None or not (parent == node or tree.is_ancestor(node, parent)):
+                tree.move(node, parent)
+        tree.add(Category(str(i), rnd.choice(nodes + [None]), pk=i))
+    check(tree)
+
+
+def test_invalid_hierarchy():
+    with pytest.raises(ValueError):
+        CategoryTree([Category('a', 2, pk=1), Category('b', 1, pk=2)])
+
+
+def test_subtree_condition(repo, tree):
+    expenses = MemoryRepository()
+    for c in repo.get_all():
+        expenses.add(Expense(datetime(2024, 1, 1), 10, c.pk))
+    meat = pk(repo, 'мясо')
+    found = expenses.iter_all({'category_id': tree.subtree_condition(meat)})
+    assert sorted(e.category_id for e in found) == sorted(repo.subtree_ids(meat))
+
+
+def test_missing_parent_is_top_level():
+    tree = CategoryTree([Category('a', pk=1), Category('b', 100, pk=2),
+                         Category('c', 2, pk=3)])
+    assert tree.get(2).parent is None
+    assert tree.depth(2) == 0 and tree.depth(3) == 1
+    assert list(tree.walk()) == [1, 2, 3]
+    check(tree)
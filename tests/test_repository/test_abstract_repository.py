@@ -18,3 +18,54 @@ def test_can_create_subclass():
 
     t = Test()
     assert isinstance(t, AbstractRepository)
+
+
+def test_default_bulk_methods():
+    class Test(AbstractRepository):
+        def __init__(self): self.calls = []
+        def get(self, pk): pass
+        def get_all(self, where=None): pass
+        def update(self, obj): self.calls.append(('update', obj))
+        def delete(self, pk): self.calls.append(('delete', pk))
+
+        def add(self, obj):
+            self.calls.append(('add', obj))
+            return obj
+
+    t = Test()
+    assert t.add_many([1, 2]) == [1, 2]
+    t.update_many([3])
+    t.delete_many([4, 5])
+    assert t.calls == [('add', 1), ('add', 2), ('update', 3),
+                       ('delete', 4), ('delete', 5)]
+
+
+def test_default_transaction():
+    class Test(AbstractRepository):
+        def add(self, obj): pass
+        def get(self, pk): pass
+        def get_all(self, where=None): pass
+        def update(self, obj): pass
+        def delete(self, pk): pass
+
+    with Test().transaction():
+        pass
+
+
+def test_default_hierarchy():
+    class Node:
+        def __init__(self, pk, parent): self.pk, self.parent = pk, parent
+
+    class Test(AbstractRepository):
+        def __init__(self, nodes): self.nodes = {n.pk: n for n in nodes}
+        def add(self, obj): pass
+        def get(self, pk): return self.nodes.get(pk)
+        def get_all(self, where=None): return list(self.nodes.values())
+        def update(self, obj): pass
+        def delete(self, pk): pass
+
+    t = Test([Node(1, None), Node(3, 2), Node(2, 1), Node(4, 1)])
+    assert [n.pk for n in t.descendants(1)] == [2, 4, 3]
+    assert [n.pk for n in t.ancestors(3)] == [2, 1]
+    assert t.subtree_ids(2) == [2, 3]
+    assert t.subtree_ids(5) == []
@@ -0,0 +1,100 @@
+from bookkeeper.repository.async_repository import (AsyncAbstractRepository,
+                                                    AsyncRepositoryAdapter,
+                                                    AsyncSQLiteRepository)
+from bookkeeper.repository.memory_repository import MemoryRepository
+from bookkeeper.repository.query import Gt, Query
+from dataclasses import dataclass
+
+import asyncio
+import pytest
+import threading
+
+
+@dataclass
+class Custom():
+    a: int = 0
+    parent: int | None = None
+    pk: int = 0
+
+
+def test_cannot_create_abstract_repository():
+    with pytest.raises(TypeError):
+        AsyncAbstractRepository()
+
+
+def test_default_methods():
+    class Test(AsyncAbstractRepository):
+        def __init__(self):
+            self.objs = {}
+
+        async def add(self, obj):
+            obj.pk = len(self.objs) + 1
+            self.objs[obj.pk] = obj
+            return obj.pk
+
+        async def get(self, pk):
+            return self.objs.get(pk)
+
+        async def get_all(self, where=None):
+            return list(self.objs.values())
+
+        async def update(self, obj):
+            self.objs[obj.pk] = obj
+
+        async def delete(self, pk):
+            del self.objs[pk]
+
+    async def main():
+        t = Test()
+        assert await t.add_many([Custom(i) for i in range(5)]) == [1, 2, 3, 4, 5]
+        assert [o.pk for o in await t.find(Query(where={'a': Gt(2)}))] == [4, 5]
+        assert [o.pk async for o in t.iter_all(batch_size=2)] == [1, 2, 3, 4, 5]
+        assert await t.aggregate('sum', 'a') == 10
+        await t.delete_many([1, 2])
+        assert len(await t.get_all()) == 3
+
+    asyncio.run(main())
+
+
+def test_adapter():
+    async def main():
+        async with AsyncRepositoryAdapter(MemoryRepository()) as repo:
+            pk = await repo.add(Custom(1))
+            assert await repo.get(pk) == Custom(1, pk=pk)
+            await repo.add_many([Custom(2, pk), Custom(3, pk)])
+            assert await repo.subtree_ids(pk) == [1, 2, 3]
+            await repo.update(Custom(5, pk=pk))
+            assert await repo.aggregate('max', 'a') == 5
+            assert [o.a async for o in repo.iter_all({'parent': pk}, batch_size=1)] == \
+                [2, 3]
+
+            def failing(r):
+                with r.transaction():
+                    r.delete(2)
+                    raise RuntimeError
+            with pytest.raises(RuntimeError):
+                await repo.run(failing)
+            assert len(await repo.get_all()) == 3
+
+    asyncio.run(main())
+
+
+def test_sqlite(tmp_path):
+    async def main():
+        repo = AsyncSQLiteRepository(str(tmp_path / 'test.db'), Custom)
+        await repo.create_table()
+        pks = await asyncio.gather(*(repo.add(Custom(i)) for i in range(20)))
+        assert sorted(pks) == list(range(1, 21))
+        results = await asyncio.gather(*(repo.get(pk) for pk in pks))
+        assert [o.pk for o in results] == pks
+        assert await repo.find(Query(order_by=('-a',), limit=1)) == \
+            [Custom(19, pk=pks[19])]
+        await repo.delete_many(pks[:10])
+        assert await repo.aggregate('count') == 10
+        threads = await asyncio.gather(*(repo.run(lambda r: threading.get_ident())
+                                         for _ in range(5)))
+        assert len(set(threads)) == 1 and threads[0] != threading.get_ident()
+        await repo.close()
+        assert repo.connection._writer is None
+
+    asyncio.run(main())
@@ -0,0 +1,153 @@
+from bookkeeper.repository import cached_repository
+from bookkeeper.repository.cached_repository import CachedRepository
+from bookkeeper.repository.memory_repository import MemoryRepository
+from bookkeeper.repository.query import Gt, Query
+from bookkeeper.repository.sqlite_connection import SQLiteConnectionManager
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+from dataclasses import dataclass
+
+import pytest
+
+
+@dataclass
+class Custom():
+    name: str = ''
+    parent: int | None = None
+    pk: int = 0
+
+
+@pytest.fixture
+def inner():
+    return MemoryRepository()
+
+
+@pytest.fixture
+def repo(inner):
+    return CachedRepository(inner, maxsize=2)
+
+
+def test_lru(repo, inner):
+    pks = repo.add_many([Custom(str(i)) for i in range(3)])
+    assert repo.get(pks[0]).name == '0'
+    assert repo.get(pks[0]).name == '0'
+    assert repo.cache_info().hits == 1 and repo.cache_info().misses == 1
+    repo.get(pks[1])
+    repo.get(pks[0])
+    repo.get(pks[2])
+    # pks[1] вытеснен как давно не использованный
+    assert set(repo._lru) == {pks[0], pks[2]}
+    assert repo.get(100) is None
+    assert repo.cache_info().currsize == 2
+
+
+def test_invalidate_on_own_writes(repo):
+    pk = repo.add(Custom('a'))
+    repo.get(pk)
+    repo.update(Custom('b', pk=pk))
+    assert repo.get(pk).name == 'b'
+    repo.delete(pk)
+    assert repo.get(pk) is None
+    with pytest.raises(KeyError):
+        repo.delete(pk)
+
+
+def test_external_writes(inner):
+    repo = CachedRepository(inner, maxsize=2, check_interval=0)
+    pk = inner.add(Custom('a'))
+    assert repo.get(pk).name == 'a'
+    inner.update(Custom('b', pk=pk))
+    assert repo.get(pk).name == 'b'
+    assert repo.cache_info().hits == 0
+
+
+def test_cache_all(inner):
+    repo = CachedRepository(inner, cache_all=True)
+    root = repo.add(Custom('root'))
+    child = repo.add(Custom('child', root))
+    repo.add(Custom('leaf', child))
+    assert [c.name for c in repo.get_all()] == ['root', 'child', 'leaf']
+    assert repo.get(child).name == 'child'
+    assert repo.get_all({'parent': root}) == [Custom('child', root, child)]
+    assert repo.find(Query(where={'pk': Gt(1)}, order_by=('-pk',)))[0].name == 'leaf'
+    assert repo.aggregate('count', group_by='parent') == {None: 1, root: 1, child: 1}
+    assert repo.subtree_ids(root) == [1, 2, 3]
+    assert [c.name for c in repo.ancestors(3)] == ['child', 'root']
+    info = repo.cache_info()
+    assert info.table_cached and info.misses == 1 and info.hits > 0
+
+
+def test_transaction_rollback(repo):
+    pk = repo.add(Custom('a'))
+    with pytest.raises(RuntimeError):
+        with repo.transaction():
+            repo.update(Custom('b', pk=pk))
+            assert repo.get(pk).name == 'b'
+            raise RuntimeError
+    assert repo.get(pk).name == 'a'
+
+
+def test_sqlite_external_writer(tmp_path):
+    db_file = str(tmp_path / 'test.db')
+    with SQLiteConnectionManager(db_file) as m1, SQLiteConnectionManager(db_file) as m2:
+        r1 = SQLiteRepository(db_file, Custom, m1)
+        r1.create_table()
+        # другой процесс моделируется отдельным менеджером соединений
+        r2 = SQLiteRepository(db_file, Custom, m2)
+        repo = CachedRepository(r1, cache_all=True, check_interval=0)
+        pk = repo.add(Custom('a'))
+        assert repo.get(pk).name == 'a'
+        assert repo.get(pk).name == 'a'
+        assert repo.cache_info().hits == 1
+        r2.update(Custom('b', pk=pk))
+        assert repo.get(pk).name == 'b'
+
+        with pytest.raises(RuntimeError):
+            with r1.transaction():
+                repo.update(Custom('c', pk=pk))
+                assert repo.get(pk).name == 'c'
+                raise RuntimeError
+        assert repo.get(pk).name == 'b'
+
+
+def test_check_interval(inner, monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(cached_repository.time, 'monotonic', lambda: now[0])
+    calls = []
+    data_version = inner.data_version
+    monkeypatch.setattr(inner, 'data_version',
+                        lambda: calls.append(1) or data_version())
+    repo = CachedRepository(inner, check_interval=1.0)
+    pk = repo.add(Custom('a'))
+    calls.clear()
+    for _ in range(10):
+        assert repo.get(pk).name == 'a'
+    assert calls == [] and repo.cache_info().hits == 9
+
+    inner.update(Custom('b', pk=pk))
+    assert repo.get(pk).name == 'a'
+    now[0] = 1.0
+    assert repo.get(pk).name == 'b'
+    assert len(calls) == 1
+
+    # откат транзакции через обертку виден сразу
+    with pytest.raises(RuntimeError):
+        with repo.transaction():
+            repo.update(Custom('c', pk=pk))
+            assert repo.get(pk).name == 'c'
+            raise RuntimeError
+    assert repo.get(pk).name == 'b'
+    with pytest.raises(ValueError):
+        CachedRepository(inner, check_interval=-1)
+
+
+def test_external_write_inside_check_interval(inner, monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(cached_repository.time, 'monotonic', lambda: now[0])
+    repo = CachedRepository(inner, check_interval=1.0)
+    pk1, pk2 = repo.add(Custom('a')), repo.add(Custom('x'))
+    assert repo.get(pk1).name == 'a'
+    # внешнее изменение и собственная запись в пределах check_interval
+    inner.update(Custom('b', pk=pk1))
+    repo.update(Custom('y', pk=pk2))
+    assert repo.get(pk1).name == 'b'
+    assert repo.get(pk2).name == 'y'
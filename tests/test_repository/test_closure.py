@@ -0,0 +1,212 @@
+from datetime import datetime
+
+import random
+import sqlite3
+
+import pytest
+
+from bookkeeper.cli import main
+from bookkeeper.models.category import Category
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.cached_repository import CachedRepository
+from bookkeeper.repository.closure import Closure, InSubtree
+from bookkeeper.repository.memory_repository import MemoryRepository
+from bookkeeper.repository.query import In, Query
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+from bookkeeper.utils import read_tree
+
+TREE = '''
+продукты
+    мясо
+        сырое мясо
+        мясные продукты
+    сладости
+книги
+'''
+
+
+@pytest.fixture
+def repo(tmp_path):
+    r = SQLiteRepository(str(tmp_path / 'closure.db'), Category)
+    r.create_table()
+    Category.create_from_tree(read_tree(TREE.splitlines()), r)
+    yield r
+    r.close()
+
+
+def pk(repo, name):
+    return repo.get_all({'name': name})[0].pk
+
+
+def closure_rows(repo):
+    with repo.connection.reader() as con:
+        return con.execute('SELECT * FROM category_closure ORDER BY 1, 2').fetchall()
+
+
+def check(repo):
+    # таблица, поддерживаемая триггерами, совпадает с пересчитанной
+    rows = closure_rows(repo)
+    repo.rebuild_closure()
+    assert closure_rows(repo) == rows
+    closure, repo.closure = repo.closure, None
+    try:
+        expected = {c.pk: (repo.descendants(c.pk), repo.ancestors(c.pk))
+                    for c in repo.get_all()}
+    finally:
+        repo.closure = closure
+    for primary_key, (descendants, ancestors) in expected.items():
+        assert repo.descendants(primary_key) == descendants
+        assert repo.ancestors(primary_key) == ancestors
+        assert repo.subtree_ids(primary_key) == \
+            [primary_key] + [c.pk for c in descendants]
+
+
+def test_create(repo):
+    food, meat = pk(repo, 'продукты'), pk(repo, 'мясо')
+    raw = pk(repo, 'сырое мясо')
+    rows = closure_rows(repo)
+    assert len(rows) == 6 + 4 + 2
+    assert (food, raw, 2) in rows and (meat, raw, 1) in rows and (raw, raw, 0) in rows
+    check(repo)
+
+
+def test_ensure_closure(repo):
+    assert repo.ensure_closure() is False
+    with repo.connection.writer() as con:
+        con.execute('DROP TABLE category_closure')
+    assert repo.ensure_closure() is True
+    check(repo)
+
+
+def test_move(repo):
+    meat, books = repo.get(pk(repo, 'мясо')), pk(repo, 'книги')
+    meat.parent = books
+    repo.update(meat)
+    assert [c.name for c in repo.ancestors(pk(repo, 'сырое мясо'))] == ['мясо', 'книги']
+    check(repo)
+    meat.parent = None
+    repo.update(meat)
+    assert repo.ancestors(meat.pk) == []
+    check(repo)
+
+
+def test_rename_keeps_closure(repo):
+    rows = closure_rows(repo)
+    food = repo.get(pk(repo, 'продукты'))
+    food.name = 'еда'
+    repo.update(food)
+    assert closure_rows(repo) == rows
+
+
+def test_move_into_own_subtree(repo):
+    food = repo.get(pk(repo, 'продукты'))
+    rows = closure_rows(repo)
+    for parent in (pk(repo, 'сырое мясо'), food.pk):
+        food.parent = parent
+        with pytest.raises(sqlite3.IntegrityError):
+            repo.update(food)
+    assert repo.get(food.pk).parent is None
+    assert closure_rows(repo) == rows
+
+
+def test_delete(repo):
+    meat = pk(repo, 'мясо')
+    repo.delete(meat)
+    # подкатегории удаленной категории остаются без предков
+    assert repo.ancestors(pk(repo, 'сырое мясо')) == []
+    assert sorted(repo.subtree_ids(pk(repo, 'продукты'))) == \
+        sorted([pk(repo, 'продукты'), pk(repo, 'сладости')])
+    check(repo)
+    repo.delete_many(repo.subtree_ids(pk(repo, 'продукты')))
+    check(repo)
+
+
+def test_random_operations(repo):
+    rnd = random.Random(2)
+    for i in range(200):
+        categories = repo.get_all()
+        category, parent = rnd.choice(categories), rnd.choice(categories + [None])
+        action = rnd.random()
+        if action < 0.5:
+            repo.add(Category(str(i), parent and parent.pk))
+        elif action < 0.9:
+            category.parent = parent and parent.pk
+            if category.parent is None or \
+                    category.parent not in repo.subtree_ids(category.pk):
+                repo.update(category)
+        elif len(categories) > 5:
+            repo.delete(category.pk)
+    check(repo)
+
+
+def test_subtree_condition(repo):
+    expenses = SQLiteRepository(repo.db_file, Expense, repo.connection)
+    expenses.create_table()
+    for category in repo.get_all():
+        expenses.add(Expense(datetime(2024, 1, 1), category.pk, category.pk))
+    meat = pk(repo, 'мясо')
+    subtree = repo.subtree_ids(meat)
+
+    cond = repo.subtree_condition(meat)
+    assert cond == InSubtree('category_closure', meat)
+    assert sorted(cond.members) == sorted(subtree)
+    where = {'category_id': cond}
+    assert sorted(e.category_id for e in expenses.get_all(where)) == sorted(subtree)
+    assert expenses.aggregate('sum', 'amount', where) == sum(subtree)
+    assert sorted(expenses.aggregate('sum', 'amount', where, 'category_id')) == \
+        sorted(subtree)
+    plan = expenses.explain(Query(where=where))
+    assert any('category_closure' in line for line in plan)
+
+    # условие вычисляется при выполнении запроса
+    new = Category('птица', meat)
+    repo.add(new)
+    expenses.add(Expense(datetime(2024, 1, 1), 100, new.pk))
+    assert expenses.aggregate('sum', 'amount', where) == sum(subtree) + 100
+
+    memory = MemoryRepository()
+    memory.add(Expense(datetime(2024, 1, 1), 1, meat))
+    memory.add(Expense(datetime(2024, 1, 1), 1, pk(repo, 'книги')))
+    assert [e.category_id for e in memory.iter_all(where)] == [meat]
+
+
+def test_subtree_condition_without_closure():
+    repo = MemoryRepository()
+    Category.create_from_tree(read_tree(TREE.splitlines()), repo)
+    meat = pk(repo, 'мясо')
+    assert repo.subtree_condition(meat) == In(repo.subtree_ids(meat))
+    cached = CachedRepository(repo, cache_all=True)
+    assert cached.subtree_condition(meat) == In(repo.subtree_ids(meat))
+
+
+def test_cached_repository_uses_closure(repo):
+    cached = CachedRepository(repo, cache_all=True)
+    assert isinstance(cached.subtree_condition(1), InSubtree)
+
+
+def test_migration(tmp_path, capsys):
+    db_file = str(tmp_path / 'old.db')
+    old = SQLiteRepository(db_file, Category)
+    old.closure = None
+    old.create_table()
+    Category.create_from_tree(read_tree(TREE.splitlines()), old)
+    old.close()
+
+    main(['rebuild-closure', db_file])
+    assert capsys.readouterr().out == 'category_closure: created\n'
+    main(['rebuild-closure', db_file])
+    assert capsys.readouterr().out == 'category_closure: rebuilt\n'
+
+    repo = SQLiteRepository(db_file, Category)
+    assert repo.ensure_closure() is False
+    assert len(closure_rows(repo)) == 12
+    check(repo)
+    repo.close()
+
+
+def test_custom_parent_field():
+    closure = Closure('owner')
+    triggers = closure.triggers_sql('node')
+    assert sorted(triggers) == ['node_closure_delete', 'node_closure_insert',
+                                'node_closure_update']
+    assert 'UPDATE OF owner ON node' in triggers['node_closure_update']
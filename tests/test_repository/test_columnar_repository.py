@@ -0,0 +1,174 @@
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.memory_repository import MemoryRepository
+from bookkeeper.repository.query import Between, Ge, In, Lt, Query
+from datetime import datetime, timedelta
+
+import pytest
+import random
+
+np = pytest.importorskip('numpy')
+
+from bookkeeper.repository.columnar_repository import (  # noqa: E402
+    ColumnarExpenseRepository, period_starts, to_microseconds)
+
+START = datetime(2024, 1, 1)
+
+
+def make_expenses(count, seed=0):
+    rnd = random.Random(seed)
+    return [Expense(START + timedelta(hours=rnd.randint(0, 24 * 90),
+                                      microseconds=rnd.randint(0, 10)),
+                    float(rnd.randint(1, 100)), rnd.randint(1, 5),
+                    rnd.choice(['', 'bread', 'milk', 'coffee']))
+            for _ in range(count)]
+
+
+@pytest.fixture
+def repo():
+    return ColumnarExpenseRepository(capacity=4)
+
+
+@pytest.fixture
+def repos():
+    columnar, memory = ColumnarExpenseRepository(capacity=4), MemoryRepository()
+    for expense in make_expenses(200):
+        columnar.add(Expense(expense.date, expense.amount, expense.category_id,
+                             expense.comment))
+        memory.add(expense)
+    return columnar, memory
+
+
+def test_crud(repo):
+    e = Expense(START, 10.5, 3, 'bread')
+    pk = repo.add(e)
+    assert e.pk == pk == 1
+    assert repo.get(pk) == e
+    e2 = Expense(START + timedelta(days=1), 5, 2, 'milk', pk)
+    repo.update(e2)
+    assert repo.get(pk) == e2
+    repo.delete(pk)
+    assert repo.get(pk) is None and len(repo) == 0
+    with pytest.raises(KeyError):
+        repo.delete(pk)
+    with pytest.raises(ValueError):
+        repo.update(e2)
+    with pytest.raises(ValueError):
+        repo.add(e2)
+
+
+def test_compaction(repo):
+    pks = repo.add_many(make_expenses(10))
+    repo.delete_many(pks[:6])
+    assert repo._size == 4
+    assert [e.pk for e in repo.get_all()] == pks[6:]
+    assert repo.get(pks[7]).pk == pks[7]
+    assert repo.add(make_expenses(1)[0]) == 11
+
+
+@pytest.mark.parametrize('query', [
+    Query(),
+    Query(where={'category_id': 2}),
+    Query(where={'comment': 'milk', 'amount': Ge(50)}),
+    Query(where={'date': Between(START + timedelta(days=10),
+                                 START + timedelta(days=20))}),
+    Query(where={'category_id': In([1, 3]), 'comment': Lt('c')}),
+    Query(order_by=('-amount', 'pk'), limit=7, offset=3),
+    Query(where={'category_id': 4}, order_by=('date', '-pk'), limit=5),
+    Query(order_by=('comment', '-date'), limit=30),
+    Query(order_by=('-date', '-pk'), limit=10, after=(START + timedelta(days=45), 0)),
+    Query(order_by=('comment', 'pk'), limit=10, after=('coffee', 120)),
+])
+def test_find_matches_memory(repos, query):
+    columnar, memory = repos
+    assert columnar.find(query) == memory.find(query)
+
+
+def test_aggregate_matches_memory(repos):
+    columnar, memory = repos
+    for args in [('sum', 'amount'), ('count', 'pk'), ('min', 'date'), ('max', 'comment'),
+                 ('sum', 'amount', {'category_id': 2}, None),
+                 ('sum', 'amount', None, 'category_id'),
+                 ('max', 'amount', None, ('category_id', 'comment')),
+                 ('min', 'date', {'amount': Lt(30)}, 'comment'),
+                 ('count', 'pk', None, 'category_id'),
+                 ('sum', 'category_id', None, 'comment')]:
+        expected = memory.aggregate(*args)
+        result = columnar.aggregate(*args)
+        if isinstance(expected, dict):
+            assert result.keys() == expected.keys()
+            assert all(result[k] == pytest.approx(v) if isinstance(v, float)
+                       else result[k] == v for k, v in expected.items())
+        elif isinstance(expected, float):
+            assert result == pytest.approx(expected)
+        else:
+            assert result == expected
+    assert columnar.aggregate('sum', 'amount', {'category_id': 100}) == 0
+    assert columnar.aggregate('max', 'amount', {'category_id': 100}) is None
+    with pytest.raises(ValueError):
+        columnar.aggregate('sum', 'comment')
+
+
+@pytest.mark.parametrize('func', ['min', 'max'])
+@pytest.mark.parametrize('amounts', [[5.0, 1.0, 2.0], [1.0, 5.0, 7.0]])
+def test_grouped_min_max_matches_memory(func, amounts):
+    columnar, memory = ColumnarExpenseRepository(), MemoryRepository()
+    for amount, category_id in zip(amounts, [1, 2, 2]):
+        columnar.add(Expense(START, amount, category_id))
+        memory.add(Expense(START, amount, category_id))
+    assert columnar.aggregate(func, 'amount', group_by='category_id') == \
+        memory.aggregate(func, 'amount', group_by='category_id')
+    assert columnar.aggregate(func, 'amount', {'category_id': 2}, 'category_id') == \
+        memory.aggregate(func, 'amount', {'category_id': 2}, 'category_id')
+
+
+def test_iter_all(repos):
+    columnar, memory = repos
+    assert list(columnar.iter_all({'category_id': 1}, batch_size=7)) == \
+        memory.get_all({'category_id': 1})
+
+
+def test_sum_by_period(repos):
+    columnar, memory = repos
+    weeks = columnar.sum_by_period('Неделя')
+    assert all(start.weekday() == 0 for start in weeks)
+    assert sum(weeks.values()) == pytest.approx(memory.aggregate('sum', 'amount'))
+    months = columnar.sum_by_period('Месяц', by_category=True)
+    expected = {}
+    for e in memory.get_all():
+        key = (datetime(e.date.year, e.date.month, 1), e.category_id)
+        expected[key] = expected.get(key, 0) + e.amount
+    assert months == pytest.approx(expected)
+    with pytest.raises(KeyError):
+        columnar.sum_by_period('Год')
+
+
+def test_period_starts():
+    dates = np.array([to_microseconds(datetime(2024, 3, 13, 15)),
+                      to_microseconds(datetime(1969, 12, 31, 23))])
+    days = period_starts(dates, 'Неделя').astype('datetime64[D]').tolist()
+    assert [d.isoformat() for d in days] == ['2024-03-11', '1969-12-29']
+    days = period_starts(dates, 'Месяц').astype('datetime64[D]').tolist()
+    assert [d.isoformat() for d in days] == ['2024-03-01', '1969-12-01']
+
+
+def test_columns(repo):
+    repo.add_many(make_expenses(5))
+    pks = repo.add_columns(np.array(['2024-02-01T10:00'], 'datetime64[us]'), [1.5], [7])
+    assert repo.get(int(pks[0])) == Expense(datetime(2024, 2, 1, 10), 1.5, 7, '', 6)
+    columns = repo.columns({'category_id': 7})
+    assert columns['pk'].tolist() == [6] and columns['amount'].tolist() == [1.5]
+    assert repo.mask({'category_id': 7}).tolist() == [False] * 5 + [True]
+
+
+def test_transaction_rollback(repo):
+    objects = repo.add_many(make_expenses(3))
+    before = repo.get_all()
+    with pytest.raises(RuntimeError):
+        with repo.transaction():
+            repo.add_many(make_expenses(2))
+            repo.update(Expense(START, 1, 1, 'x', objects[0]))
+            repo.delete_many(objects[1:])
+            with repo.transaction():
+                repo.add(make_expenses(1)[0])
+            raise RuntimeError
+    assert repo.get_all() == before
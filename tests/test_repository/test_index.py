@@ -0,0 +1,14 @@
+from bookkeeper.repository.index import Index
+
+
+def test_index_name():
+    assert Index(('a', 'b')).index_name('t') == 't_a_b'
+    assert Index(('a',), name='idx').index_name('t') == 'idx'
+
+
+def test_create_sql():
+    assert Index(('a',)).create_sql('t') == 'CREATE INDEX t_a ON t (a)'
+    assert Index(('a',), include=('b',), unique=True).create_sql('t') == \
+        'CREATE UNIQUE INDEX t_a ON t (a, b)'
+    assert Index(('a',), where='a IS NOT NULL').create_sql('t') == \
+        'CREATE INDEX t_a ON t (a) WHERE a IS NOT NULL'
@@ -1,4 +1,8 @@
+from datetime import datetime
+
+from bookkeeper.models.expense import Expense
 from bookkeeper.repository.memory_repository import MemoryRepository
+from bookkeeper.repository.query import Gt, In, Query
 
 import pytest
 
@@ -69,3 +73,269 @@ def test_get_all_with_condition(repo, custom_class):
         objects.append(o)
     assert repo.get_all({'name': '0'}) == [objects[0]]
     assert repo.get_all({'test': 'test'}) == objects
+
+
+def test_add_many(repo, custom_class):
+    objects = [custom_class() for i in range(5)]
+    pks = repo.add_many(objects)
+    assert pks == [o.pk for o in objects]
+    assert len(set(pks)) == 5
+    assert repo.get_all() == objects
+
+
+def test_cannot_add_many_with_pk(repo, custom_class):
+    objects = [custom_class() for i in range(2)]
+    objects[1].pk = 1
+    with pytest.raises(ValueError):
+        repo.add_many(objects)
+    assert repo.get_all() == []
+
+
+def test_update_many(repo, custom_class):
+    objects = [custom_class() for i in range(3)]
+    repo.add_many(objects)
+    new_objects = [custom_class() for i in range(3)]
+    for o, new in zip(objects, new_objects):
+        new.pk = o.pk
+    repo.update_many(new_objects)
+    assert repo.get_all() == new_objects
+
+
+def test_delete_many(repo, custom_class):
+    objects = [custom_class() for i in range(3)]
+    pks = repo.add_many(objects)
+    repo.delete_many(pks[:2])
+    assert repo.get_all() == objects[2:]
+    with pytest.raises(KeyError):
+        repo.delete_many([pks[2], pks[0]])
+    assert repo.get_all() == objects[2:]
+
+
+def test_find(repo, custom_class):
+    objects = []
+    for i in range(6):
+        o = custom_class()
+        o.a = i % 2
+        o.b = i
+        objects.append(o)
+    repo.add_many(objects)
+    q = Query(where={'a': 1, 'b': Gt(1)}, order_by=('-b',), limit=1)
+    assert repo.find(q) == [objects[5]]
+    assert repo.find(q.next_page(objects[5])) == [objects[3]]
+    assert repo.find(Query(where={'b': In([0, 2])})) == [objects[0], objects[2]]
+
+
+def test_iter_all(repo, custom_class):
+    objects = []
+    for i in range(5):
+        o = custom_class()
+        o.a = i % 2
+        objects.append(o)
+    repo.add_many(objects)
+    it = repo.iter_all({'a': 1})
+    assert next(it) is objects[1]
+    repo.delete(objects[3].pk)
+    assert list(it) == [objects[3]]
+    assert list(repo.iter_all(batch_size=2)) == [o for o in objects if o.pk != 4]
+    with pytest.raises(ValueError):
+        next(repo.iter_all(batch_size=0))
+
+
+def test_aggregate(repo, custom_class):
+    for i in range(6):
+        o = custom_class()
+        o.a = i % 2
+        o.b = i
+        repo.add(o)
+    assert repo.aggregate('sum', 'b') == 15
+    assert repo.aggregate('count', where={'a': 1}) == 3
+    assert repo.aggregate('max', 'b', where={'b': In([1, 2])}) == 2
+    assert repo.aggregate('sum', 'b', group_by='a') == {0: 6, 1: 9}
+
+
+def test_transaction_commit(repo, custom_class):
+    with repo.transaction():
+        pk = repo.add(custom_class())
+    assert repo.get(pk) is not None
+
+
+def test_transaction_rollback(repo, custom_class):
+    objects = [custom_class() for i in range(3)]
+    repo.add_many(objects)
+    replacement = custom_class()
+    replacement.pk = objects[0].pk
+    with pytest.raises(RuntimeError):
+        with repo.transaction():
+            repo.add(custom_class())
+            repo.update(replacement)
+            repo.delete_many([objects[1].pk, objects[2].pk])
+            raise RuntimeError
+    assert sorted(repo.get_all(), key=lambda o: o.pk) == objects
+
+
+def test_nested_transaction(repo, custom_class):
+    with pytest.raises(RuntimeError):
+        with repo.transaction():
+            outer = custom_class()
+            repo.add(outer)
+            with pytest.raises(KeyError):
+                with repo.transaction():
+                    repo.add(custom_class())
+                    repo.delete(100)
+            assert repo.get_all() == [outer]
+            raise RuntimeError
+    assert repo.get_all() == []
+
+
+def make_tree(repo, custom_class, parents):
+    objects = []
+    for parent in parents:
+        o = custom_class()
+        o.parent = parent
+        objects.append(o)
+        repo.add(o)
+    return objects
+
+
+def test_hierarchy(repo, custom_class):
+    # 1 -> (2 -> (4, 5), 3 -> 6)
+    objects = make_tree(repo, custom_class, [None, 1, 1, 2, 2, 3])
+    assert repo.descendants(1) == objects[1:]
+    assert repo.descendants(3) == [objects[5]]
+    assert repo.descendants(6) == [] and repo.descendants(100) == []
+    assert repo.ancestors(5) == [objects[1], objects[0]]
+    assert repo.ancestors(1) == []
+    assert repo.subtree_ids(2) == [2, 4, 5]
+    assert repo.subtree_ids(100) == []
+
+
+def test_hierarchy_index_follows_changes(repo, custom_class):
+    objects = make_tree(repo, custom_class, [None, 1, 1, 2])
+    assert repo.subtree_ids(1) == [1, 2, 3, 4]
+    objects[3].parent = 3
+    repo.update(objects[3])
+    assert repo.subtree_ids(2) == [2] and repo.subtree_ids(3) == [3, 4]
+    with pytest.raises(RuntimeError):
+        with repo.transaction():
+            repo.delete(3)
+            make_tree(repo, custom_class, [2])
+            raise RuntimeError
+    assert repo.subtree_ids(1) == [1, 2, 3, 4]
+    repo.delete_many([3, 4])
+    assert repo.subtree_ids(1) == [1, 2]
+
+
+def test_hierarchy_cycle(repo, custom_class):
+    objects = make_tree(repo, custom_class, [None, 1])
+    objects[0].parent = 2
+    repo.update(objects[0])
+    assert repo.descendants(1) == [objects[1]]
+    assert repo.ancestors(1) == [objects[1]]
+
+
+@pytest.fixture
+def indexed_repo():
+    return MemoryRepository(indexes=('a', 'b'))
+
+
+def make_objects(repo, custom_class, values):
+    objects = []
+    for a, b in values:
+        o = custom_class()
+        o.a, o.b = a, b
+        objects.append(o)
+    repo.add_many(objects)
+    return objects
+
+
+def test_indexed_get_all(indexed_repo, custom_class):
+    assert indexed_repo.indexes == ['a', 'b']
+    objects = make_objects(indexed_repo, custom_class,
+                           [(i % 2, i % 5) for i in range(20)])
+    assert indexed_repo.get_all({'a': 1}) == objects[1::2]
+    assert indexed_repo.get_all({'a': 0, 'b': 4}) == [objects[4], objects[14]]
+    assert indexed_repo.get_all({'a': 2}) == []
+    # выбирается наименьший блок индекса
+    assert len(indexed_repo._candidates({'a': 0, 'b': 4})) == 4
+    assert len(indexed_repo._candidates({'a': 0, 'b': In([1, 2])})) == 8
+    assert indexed_repo.find(Query(where={'b': In([0, 1]), 'a': Gt(0)})) == \
+        [objects[1], objects[5], objects[11], objects[15]]
+    assert list(indexed_repo.iter_all({'b': 3})) == [objects[3], objects[8],
+                                                     objects[13], objects[18]]
+    assert indexed_repo.aggregate('count', where={'b': 0}) == 4
+    assert indexed_repo.get_all({'a': [1]}) == []
+
+
+def test_index_follows_changes(indexed_repo, custom_class):
+    objects = make_objects(indexed_repo, custom_class, [(1, 1), (1, 2), (2, 2)])
+    objects[0].a = 2
+    indexed_repo.update(objects[0])
+    assert indexed_repo.get_all({'a': 2}) == [objects[0], objects[2]]
+    assert indexed_repo.get_all({'a': 1}) == [objects[1]]
+    indexed_repo.delete(objects[2].pk)
+    assert indexed_repo.get_all({'b': 2}) == [objects[1]]
+    with pytest.raises(RuntimeError):
+        with indexed_repo.transaction():
+            indexed_repo.delete(objects[0].pk)
+            make_objects(indexed_repo, custom_class, [(2, 1)])
+            raise RuntimeError
+    assert indexed_repo.get_all({'a': 2}) == [objects[0]]
+    assert indexed_repo._indexes['a'] == {1: {2: None}, 2: {1: None}}
+
+
+def test_rollback_of_mutated_object(indexed_repo, custom_class):
+    make_objects(indexed_repo, custom_class, [(1, 1), (2, 1)])
+    obj = indexed_repo.get(1)
+    with indexed_repo.transaction():
+        obj.a = 3
+        indexed_repo.update(obj)
+        with pytest.raises(RuntimeError):
+            with indexed_repo.transaction():
+                obj.a, obj.c = 4, 'new'
+                indexed_repo.update(obj)
+                indexed_repo.delete(2)
+                raise RuntimeError
+        assert indexed_repo.get(1) is obj and obj.a == 3 and not hasattr(obj, 'c')
+    assert indexed_repo.get_all({'a': 3}) == [obj]
+    assert indexed_repo.get_all({'a': 4}) == []
+    assert indexed_repo._indexes['a'] == {3: {1: None}, 2: {2: None}}
+    assert indexed_repo._saved == {}
+
+
+def test_rollback_of_object_written_before_transaction(indexed_repo, custom_class):
+    make_objects(indexed_repo, custom_class, [(1, 1)])
+    obj = indexed_repo.get(1)
+    with pytest.raises(RuntimeError):
+        with indexed_repo.transaction():
+            obj.a = 3
+            indexed_repo.update(obj)
+            raise RuntimeError
+    # снимка нет: изменение на месте остается, индекс ему соответствует
+    assert indexed_repo.get(1) is obj and obj.a == 3
+    assert indexed_repo.get_all({'a': 3}) == [obj]
+    assert indexed_repo.get_all({'a': 1}) == []
+
+
+def test_rollback_of_slotted_object():
+    repo = MemoryRepository(indexes=('category_id',))
+    expense = Expense(datetime(2024, 1, 1), 10, 1)
+    with repo.transaction():
+        repo.add(expense)
+        with pytest.raises(RuntimeError):
+            with repo.transaction():
+                expense.amount, expense.category_id = 20, 2
+                repo.update(expense)
+                raise RuntimeError
+    assert (repo.get(1).amount, repo.get(1).category_id) == (10, 1)
+    assert repo.get_all({'category_id': 1}) == [expense]
+
+
+def test_snapshots_only_in_transaction(repo, custom_class):
+    repo.add_many([custom_class(), custom_class()])
+    repo.update(repo.get(1))
+    assert repo._saved == {}
+    with repo.transaction():
+        repo.update(repo.get(1))
+        repo.add(custom_class())
+        assert set(repo._saved) == {1, 3}
+    assert repo._saved == {}
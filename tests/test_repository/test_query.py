@@ -0,0 +1,81 @@
+from bookkeeper.repository.query import (Between, Ge, Gt, In, Le, Lt, Query,
+                                         aggregate, matches)
+from dataclasses import dataclass
+
+import pytest
+
+
+@dataclass
+class Custom():
+    a: int = 0
+    b: str = ''
+    pk: int = 0
+
+
+@pytest.fixture
+def objects():
+    return [Custom(a=i % 3, b=str(i), pk=i + 1) for i in range(9)]
+
+
+def test_predicates():
+    assert Lt(2).matches(1) and not Lt(2).matches(2)
+    assert Le(2).matches(2) and not Le(2).matches(3)
+    assert Gt(2).matches(3) and not Gt(2).matches(2)
+    assert Ge(2).matches(2) and not Ge(2).matches(1)
+    assert In([1, 2]).matches(2) and not In([1, 2]).matches(3)
+    assert Between(1, 2).matches(1) and Between(1, 2).matches(2)
+    assert not Between(1, 2).matches(3)
+    assert not Lt(2).matches(None)
+
+
+def test_to_sql():
+    assert Lt(1).to_sql('a') == 'a < ?'
+    assert In([1, 2]).to_sql('a') == 'a IN (?, ?)'
+    assert In([]).to_sql('a') == '0'
+    assert Between(1, 2).params() == [1, 2]
+
+
+def test_matches():
+    obj = Custom(a=1, b='x')
+    assert matches(obj, {'a': 1, 'b': 'x'})
+    assert matches(obj, {'a': Ge(1), 'b': In('xy')})
+    assert not matches(obj, {'a': 1, 'b': 'y'})
+
+
+def test_order_limit_offset(objects):
+    q = Query(where={'a': Ge(1)}, order_by=('-a', 'pk'), limit=3, offset=1)
+    assert [o.pk for o in q.apply(objects)] == [6, 9, 2]
+    q = Query(order_by=('-pk',), limit=2, offset=1)
+    assert [o.pk for o in q.apply(objects)] == [8, 7]
+    q = Query(order_by=('a', 'pk'))
+    assert [o.pk for o in q.apply(objects)] == [1, 4, 7, 2, 5, 8, 3, 6, 9]
+
+
+def test_keyset_pagination(objects):
+    q = Query(order_by=('-a', 'pk'), limit=4)
+    pages = []
+    page = q.apply(objects)
+    while page:
+        pages.append([o.pk for o in page])
+        q = q.next_page(page[-1])
+        page = q.apply(objects)
+    assert pages == [[3, 6, 9, 2], [5, 8, 1, 4], [7]]
+
+
+def test_after_requires_all_fields():
+    with pytest.raises(ValueError):
+        Query(order_by=('a', 'pk'), after=(1,))
+
+
+def test_aggregate(objects):
+    assert aggregate(objects, 'sum', 'a') == 9
+    assert aggregate(objects, 'count', 'a') == 9
+    assert aggregate(objects, 'min', 'b') == '0'
+    assert aggregate(objects, 'max', 'pk') == 9
+    assert aggregate([], 'sum', 'a') == 0
+    assert aggregate([], 'max', 'a') is None
+    assert aggregate(objects, 'sum', 'pk', group_by='a') == {0: 12, 1: 15, 2: 18}
+    assert aggregate(objects[:2], 'count', 'pk', group_by=('a', 'b')) == \
+        {(0, '0'): 1, (1, '1'): 1}
+    with pytest.raises(ValueError):
+        aggregate(objects, 'avg', 'a')
@@ -0,0 +1,170 @@
+from datetime import datetime, timedelta
+
+import random
+import sqlite3
+
+import pytest
+
+from bookkeeper.cli import main
+from bookkeeper.models.budget import period_bounds
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.query import Between, Ge, Gt, In, Le, Lt
+from bookkeeper.repository.rollup import Rollup
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+
+END = timedelta(microseconds=1)
+
+
+@pytest.fixture
+def repo(tmp_path):
+    r = SQLiteRepository(str(tmp_path / 'rollup.db'), Expense)
+    r.create_table()
+    yield r
+    r.close()
+
+
+def rollup_rows(repo, name):
+    with repo.connection.reader() as con:
+        return con.execute(f'SELECT * FROM {name} ORDER BY 1, 2').fetchall()
+
+
+def raw(repo, where, group_by=None):
+    # тот же запрос без сводных таблиц
+    rollups, repo.rollups = repo.rollups, ()
+    try:
+        return repo.aggregate('sum', 'amount', where, group_by)
+    finally:
+        repo.rollups = rollups
+
+
+def test_key_condition():
+    day, month = Rollup('day'), Rollup('month')
+    start, end = datetime(2024, 3, 1), datetime(2024, 3, 31, 23, 59, 59)
+    assert day.key_condition(Between(start, end)) == Between('2024-03-01', '2024-03-31')
+    assert month.key_condition(Between(start, end + timedelta(seconds=1) - END)) == \
+        Between('2024-03', '2024-03')
+    assert month.key_condition(Between(start, end - timedelta(days=1))) is None
+    assert day.key_condition(Between(start, end - timedelta(hours=1))) is None
+    assert day.key_condition(Ge(start)) == Ge('2024-03-01')
+    assert day.key_condition(Lt(start)) == Lt('2024-03-01')
+    assert day.key_condition(Le(end)) == Le('2024-03-31')
+    assert day.key_condition(Gt(end)) == Gt('2024-03-31')
+    assert day.key_condition(Gt(start)) is None
+    assert day.key_condition(start) is None
+    assert day.key_condition(In((start,))) is None
+
+
+def test_triggers_maintain_rollups(repo):
+    pk = repo.add(Expense(datetime(2024, 3, 1, 10), 10, 1))
+    repo.add(Expense(datetime(2024, 3, 1, 12), 5, 1))
+    repo.add(Expense(datetime(2024, 3, 2), 7, 2))
+    assert rollup_rows(repo, 'expense_daily') == [('2024-03-01', 1, 15, 2),
+                                                  ('2024-03-02', 2, 7, 1)]
+    assert rollup_rows(repo, 'expense_monthly') == [('2024-03', 1, 15, 2),
+                                                    ('2024-03', 2, 7, 1)]
+
+    repo.update(Expense(datetime(2024, 4, 1), 20, 2, pk=pk))
+    assert rollup_rows(repo, 'expense_daily') == [('2024-03-01', 1, 5, 1),
+                                                  ('2024-03-02', 2, 7, 1),
+                                                  ('2024-04-01', 2, 20, 1)]
+    repo.delete(pk)
+    assert rollup_rows(repo, 'expense_monthly') == [('2024-03', 1, 5, 1),
+                                                    ('2024-03', 2, 7, 1)]
+    repo.delete_all()
+    assert rollup_rows(repo, 'expense_daily') == []
+
+
+def test_null_category(repo):
+    first = repo.add(Expense(datetime(2024, 3, 1), 10, None))
+    repo.add(Expense(datetime(2024, 3, 1), 5, None))
+    month = {'date': Between(*period_bounds('Месяц', datetime(2024, 3, 5)))}
+    assert repo.aggregate('sum', 'amount', month) == 15
+    repo.delete(first)
+    assert repo.aggregate('sum', 'amount', month) == 5
+    assert repo.aggregate('count', where=month) == 1
+
+
+def test_aggregate_reads_rollups(repo):
+    repo.add(Expense(datetime(2024, 3, 1, 10), 10, 1))
+    repo.add(Expense(datetime(2024, 3, 15), 5, 2))
+    with repo.connection.writer() as con:
+        # порча сводных таблиц видна, только если запрос читает их
+        con.execute("UPDATE expense_daily SET total = total + 1000")
+        con.execute("UPDATE expense_monthly SET total = total + 100")
+
+    day = {'date': Between(*period_bounds('День', datetime(2024, 3, 1, 12)))}
+    month = {'date': Between(*period_bounds('Месяц', datetime(2024, 3, 1)))}
+    assert repo.aggregate('sum', 'amount', day) == 1010
+    assert repo.aggregate('sum', 'amount', month) == 215
+    assert repo.aggregate('sum', 'amount', {**month, 'category_id': 2}) == 105
+    assert repo.aggregate('sum', 'amount', month, group_by='category_id') == \
+        {1: 110, 2: 105}
+    # невыровненный диапазон, другие функции и поля - по таблице расходов
+    some = {'date': Between(datetime(2024, 3, 1, 9), datetime(2024, 3, 31))}
+    assert repo.aggregate('sum', 'amount', some) == 15
+    assert repo.aggregate('max', 'amount', month) == 10
+    assert repo.aggregate('sum', 'amount', {**month, 'comment': ''}) == 15
+    assert repo.aggregate('sum', 'amount', month, group_by='date') == \
+        {datetime(2024, 3, 1, 10): 10, datetime(2024, 3, 15): 5}
+
+    repo.rebuild_rollups()
+    assert repo.aggregate('sum', 'amount', month) == 15
+
+
+def test_random_against_table(repo):
+    rnd = random.Random(3)
+    start = datetime(2024, 1, 1)
+    pks = []
+    for _ in range(200):
+        expense = Expense(start + timedelta(hours=rnd.randrange(24 * 100)),
+                          rnd.randrange(1, 100), rnd.randrange(1, 4))
+        action = rnd.random()
+        if action < 0.6 or not pks:
+            pks.append(repo.add(expense))
+        elif action < 0.8:
+            expense.pk = rnd.choice(pks)
+            repo.update(expense)
+        else:
+            repo.delete(pks.pop(rnd.randrange(len(pks))))
+    for interval in ('День', 'Неделя', 'Месяц'):
+        for days in range(0, 100, 7):
+            where = {'date': Between(*period_bounds(interval,
+                                                    start + timedelta(days=days)))}
+            assert repo.aggregate('sum', 'amount', where) == raw(repo, where)
+            assert repo.aggregate('sum', 'amount', where, 'category_id') == \
+                raw(repo, where, 'category_id')
+            assert repo.aggregate('count', where=where) == \
+                len(repo.get_all(where))
+
+
+def test_ensure_rollups(repo):
+    repo.add(Expense(datetime(2024, 3, 1), 10, 1))
+    assert repo.ensure_rollups() == []
+    with repo.connection.writer() as con:
+        con.execute('DROP TABLE expense_daily')
+    assert repo.ensure_rollups() == ['expense_daily']
+    assert rollup_rows(repo, 'expense_daily') == [('2024-03-01', 1, 10, 1)]
+    repo.drop_table()
+    with repo.connection.reader() as con:
+        names = [row[0] for row in con.execute('SELECT name FROM sqlite_master')]
+    assert not any(name.startswith('expense') for name in names)
+
+
+def test_cli_rebuild_rollups(tmp_path, capsys):
+    db_file = str(tmp_path / 'old.db')
+    # база данных прежней версии, без сводных таблиц
+    con = sqlite3.connect(db_file)
+    con.execute('CREATE TABLE Expense (pk INTEGER PRIMARY KEY, amount REAL, '
+                'category_id INTEGER, date DATETIME, comment TEXT)')
+    con.execute("INSERT INTO Expense VALUES (1, 10, 1, '2024-03-01 10:00:00', '')")
+    con.commit()
+    con.close()
+
+    main(['rebuild-rollups', db_file])
+    assert 'expense_daily: created' in capsys.readouterr().out
+    con = sqlite3.connect(db_file)
+    assert con.execute('SELECT * FROM expense_monthly').fetchall() == \
+        [('2024-03', 1, 10, 1)]
+    con.close()
+    main(['rebuild-rollups', db_file])
+    assert 'expense_daily: rebuilt' in capsys.readouterr().out
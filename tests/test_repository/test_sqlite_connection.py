@@ -0,0 +1,204 @@
+from bookkeeper.repository.sqlite_connection import (PROFILES, PragmaProfile,
+                                                     SQLiteConnectionManager)
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+from dataclasses import dataclass
+
+import pytest
+import threading
+
+
+@dataclass
+class Custom():
+    foo: str = 'check'
+    a: int = 4
+    pk: int = 0
+
+
+@pytest.fixture
+def manager(tmp_path):
+    m = SQLiteConnectionManager(str(tmp_path / 'test.db'), readers=2)
+    yield m
+    m.close()
+
+
+@pytest.fixture
+def repo(manager):
+    r = SQLiteRepository(manager.db_file, Custom, manager)
+    r.create_table()
+    return r
+
+
+def test_shared_manager(tmp_path):
+    db_file = str(tmp_path / 'shared.db')
+    r1 = SQLiteRepository(db_file, Custom)
+    r2 = SQLiteRepository(db_file, Custom)
+    assert r1.connection is r2.connection
+    assert SQLiteConnectionManager.shared(db_file) is r1.connection
+    r1.close()
+
+
+def test_reuses_connections(manager):
+    with manager.writer() as con1:
+        pass
+    with manager.writer() as con2:
+        pass
+    assert con1 is con2
+
+    with manager.reader() as con1:
+        pass
+    with manager.reader() as con2:
+        pass
+    assert con1 is con2
+
+
+def test_reader_pool_size(manager):
+    with manager.reader() as con1, manager.reader() as con2:
+        assert con1 is not con2
+    assert manager._opened_readers == 2
+
+
+def test_rollback_on_error(repo, manager):
+    with pytest.raises(RuntimeError):
+        with manager.writer():
+            repo.add(Custom())
+            raise RuntimeError
+    assert repo.get_all() == []
+
+
+def test_read_inside_writer_sees_changes(repo, manager):
+    with manager.writer():
+        pk = repo.add(Custom())
+        assert repo.get(pk) is not None
+
+
+def test_close_and_reopen(repo, manager):
+    pk = repo.add(Custom())
+    manager.close()
+    assert manager._writer is None
+    assert repo.get(pk) == Custom(pk=pk)
+
+
+def test_context_manager(tmp_path):
+    with SQLiteRepository(str(tmp_path / 'test.db'), Custom,
+                          SQLiteConnectionManager(str(tmp_path / 'test.db'))) as r:
+        r.create_table()
+        pk = r.add(Custom())
+    assert r.connection._writer is None
+    assert r.get(pk) == Custom(pk=pk)
+    r.close()
+
+
+def test_threads(repo):
+    def worker():
+        for _ in range(20):
+            obj = Custom()
+            repo.add(obj)
+            assert repo.get(obj.pk) == obj
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(repo.get_all()) == 80
+
+
+@dataclass
+class Other():
+    b: int = 0
+    pk: int = 0
+
+
+def test_transaction_spans_repositories(repo, manager):
+    other = SQLiteRepository(manager.db_file, Other, manager)
+    other.create_table()
+    with pytest.raises(RuntimeError):
+        with repo.transaction():
+            repo.add(Custom())
+            other.add(Other())
+            raise RuntimeError
+    assert repo.get_all() == [] and other.get_all() == []
+
+    with other.transaction():
+        repo.add(Custom())
+        other.add(Other())
+    assert len(repo.get_all()) == 1 and len(other.get_all()) == 1
+
+
+def test_nested_transaction(repo):
+    with repo.transaction():
+        outer = Custom()
+        repo.add(outer)
+        with pytest.raises(RuntimeError):
+            with repo.transaction():
+                repo.add(Custom())
+                raise RuntimeError
+        # неудачная операция откатывает только свою точку сохранения
+        with pytest.raises(KeyError):
+            repo.delete_many([outer.pk, 100])
+    assert repo.get_all() == [outer]
+
+
+def pragmas(con):
+    return tuple(con.execute(f'PRAGMA {name}').fetchone()[0] for name in
+                 ('journal_mode', 'synchronous', 'cache_size', 'temp_store',
+                  'busy_timeout', 'foreign_keys'))
+
+
+def test_default_profile(manager):
+    with manager.writer() as con:
+        assert pragmas(con) == ('wal', 2, -2000, 0, 5000, 1)
+    with manager.reader() as con:
+        assert pragmas(con) == ('wal', 2, -2000, 0, 5000, 1)
+
+
+def test_profiles(tmp_path):
+    with SQLiteConnectionManager(str(tmp_path / 'test.db'), profile='bulk-load') as m:
+        with m.reader() as con:
+            assert pragmas(con) == ('wal', 0, -256000, 2, 30000, 1)
+        m.set_profile('balanced')
+        assert m._writer is None
+        with m.writer() as con:
+            assert pragmas(con) == ('wal', 1, -32000, 2, 5000, 1)
+        m.set_profile(PragmaProfile(journal_mode='DELETE', synchronous='OFF'))
+        with m.writer() as con:
+            assert pragmas(con)[:2] == ('delete', 0)
+
+
+def test_unknown_profile(tmp_path):
+    with pytest.raises(ValueError):
+        SQLiteConnectionManager(str(tmp_path / 'test.db'), profile='fast')
+
+
+def test_shared_profile(tmp_path):
+    db_file = str(tmp_path / 'shared.db')
+    m = SQLiteConnectionManager.shared(db_file, 'bulk-load')
+    assert m.profile == PROFILES['bulk-load']
+    assert SQLiteConnectionManager.shared(db_file) is m
+    assert m.profile == PROFILES['bulk-load']
+    SQLiteConnectionManager.shared(db_file, 'durable')
+    assert m.profile == PROFILES['durable']
+    m.close()
+
+
+def test_table_data_version(repo, manager):
+    other = SQLiteRepository(manager.db_file, Other, manager)
+    other.create_table()
+    version, other_version = repo.data_version(), other.data_version()
+    # транзакции без изменений строк не меняют версию
+    repo.update_many([])
+    with manager.writer():
+        pass
+    assert repo.data_version() == version
+    # изменения другой таблицы не меняют версию этой
+    other.add(Other(1))
+    assert repo.data_version() == version
+    assert other.data_version() != other_version
+    repo.add(Custom())
+    assert repo.data_version() != version
+    # изменения не через репозиторий меняют версию всех таблиц
+    version, other_version = repo.data_version(), other.data_version()
+    with manager.writer() as con:
+        con.execute('DELETE FROM other')
+    assert repo.data_version() != version
+    assert other.data_version() != other_version
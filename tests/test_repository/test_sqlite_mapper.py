@@ -0,0 +1,74 @@
+from bookkeeper.repository.sqlite_mapper import (RowMapper, decode_datetime,
+                                                 encode_value, sql_type)
+from bookkeeper.models.budget import Budget
+from bookkeeper.models.category import Category
+from bookkeeper.models.expense import Expense
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Literal
+
+
+@dataclass
+class Custom():
+    foo: str = 'check'
+    dt: datetime = datetime(1994, 9, 25, 16, 24, 11)
+    parent: int | None = None
+    pk: int = 0
+
+
+class Plain():
+    foo: str
+    a: int
+    pk: int
+
+
+def test_sql_type():
+    assert sql_type(int) == 'INTEGER'
+    assert sql_type(int | None) == 'INTEGER'
+    assert sql_type(Literal['a', 'b']) == 'TEXT'
+    assert sql_type(datetime) == 'DATETIME'
+
+
+def test_decode_datetime():
+    assert decode_datetime('1994-09-25 16:24:11') == datetime(1994, 9, 25, 16, 24, 11)
+    assert decode_datetime("'1994-09-25 16:24:11'") == datetime(1994, 9, 25, 16, 24, 11)
+    assert decode_datetime(None) is None
+    assert decode_datetime('NULL') is None
+
+
+def test_encode_value():
+    assert encode_value(datetime(1994, 9, 25, 16, 24, 11, 5)) == '1994-09-25 16:24:11'
+    assert encode_value(4) == 4
+    assert encode_value(4.5) == 4.5
+    assert encode_value(None) is None
+
+
+def test_dataclass_roundtrip():
+    mapper = RowMapper(Custom, 'custom')
+    assert mapper.select_columns == ['foo', 'dt', 'parent', 'pk']
+    obj = Custom(pk=3)
+    row = tuple(mapper.encode(obj)) + (obj.pk,)
+    assert mapper.decode(row) == obj
+
+
+def test_legacy_null():
+    mapper = RowMapper(Custom, 'custom')
+    obj = mapper.decode(('NULL', 'NULL', 'NULL', 1))
+    assert obj == Custom(None, None, None, 1)
+
+
+def test_plain_class():
+    mapper = RowMapper(Plain, 'plain')
+    assert mapper.select_columns == ['pk', 'foo', 'a']
+    obj = mapper.decode((1, 'x', 2))
+    assert isinstance(obj, Plain)
+    assert (obj.pk, obj.foo, obj.a) == (1, 'x', 2)
+
+
+def test_models():
+    assert RowMapper(Expense, 'expense').select_columns == [
+        'date', 'amount', 'category_id', 'comment', 'pk']
+    assert RowMapper(Category, 'category').decode(('name', 'NULL', 1)) == \
+        Category('name', None, 1)
+    assert RowMapper(Budget, 'budget').decode(('День', 1.0, 2.0, 1)) == \
+        Budget('День', 1.0, 2.0, 1)
@@ -1,4 +1,7 @@
 from bookkeeper.repository.sqlite_repository import SQLiteRepository
+from bookkeeper.repository.query import Between, Ge, Gt, In, Le, Lt, Query
+from bookkeeper.repository.index import Index
+from bookkeeper.models.expense import Expense
 from dataclasses import dataclass
 from datetime import datetime
 
@@ -182,3 +185,247 @@ def test_foreign_keys(foreign_repo0, foreign_repo1, foreign_custom_class0, forei
 
     obj1.fk = obj0.pk
     foreign_repo1.add(obj1)
+
+
+def test_add_many(repo, custom_class):
+    objects = [custom_class(a=i) for i in range(5)]
+    pks = repo.add_many(objects)
+    assert pks == [o.pk for o in objects]
+    assert repo.get_all() == objects
+    obj = custom_class()
+    assert repo.add(obj) == pks[-1] + 1
+
+
+def test_cannot_add_many_with_pk(repo, custom_class):
+    objects = [custom_class() for i in range(2)]
+    objects[1].pk = 1
+    with pytest.raises(ValueError):
+        repo.add_many(objects)
+    assert repo.get_all() == []
+
+
+def test_add_columns(repo, custom_class):
+    repo.add(custom_class(a=0))
+    pks = repo.add_columns({'foo': ['x', 'y'], 'bar': ['', ''], 'a': [1, 2],
+                            'dt': ['2024-01-02 03:04:05', '2024-01-03 00:00:00']})
+    assert pks == [2, 3]
+    assert repo.get(2) == custom_class('x', '', datetime(2024, 1, 2, 3, 4, 5), 1, pk=2)
+    assert repo.get(3).dt == datetime(2024, 1, 3)
+    with pytest.raises(ValueError):
+        repo.add_columns({'foo': ['x'], 'bar': [''], 'a': [1]})
+    with pytest.raises(ValueError):
+        repo.add_columns({'foo': ['x'], 'bar': [''], 'a': [1, 2], 'dt': [None]})
+    assert len(repo.get_all()) == 3
+
+
+def test_update_many(repo, custom_class):
+    objects = [custom_class(a=i) for i in range(3)]
+    repo.add_many(objects)
+    for o in objects:
+        o.foo = 'updated'
+    repo.update_many(objects)
+    assert repo.get_all() == objects
+
+
+def test_update_many_is_atomic(repo, custom_class):
+    objects = [custom_class(a=i) for i in range(2)]
+    repo.add_many(objects)
+    objects[0].foo = 'updated'
+    objects[1].pk = 100
+    with pytest.raises(ValueError):
+        repo.update_many(objects)
+    assert repo.get(objects[0].pk).foo == 'check'
+
+
+def test_delete_many(repo, custom_class):
+    objects = [custom_class(a=i) for i in range(3)]
+    pks = repo.add_many(objects)
+    repo.delete_many(pks[:2])
+    assert repo.get_all() == objects[2:]
+    with pytest.raises(KeyError):
+        repo.delete_many([pks[2], pks[0]])
+    assert repo.get_all() == objects[2:]
+
+
+def test_get_all_with_several_conditions(repo, custom_class):
+    objects = [custom_class(a=i % 2, bar=str(i // 2)) for i in range(4)]
+    repo.add_many(objects)
+    assert repo.get_all({'a': 1, 'bar': '0'}) == [objects[1]]
+
+
+def test_native_binding(repo, custom_class):
+    pk = repo.add(custom_class())
+    with repo.connection.reader() as con:
+        row = con.execute(f'SELECT typeof(a), typeof(dt) FROM {repo.table_name} '
+                          f'WHERE pk = ?', (pk,)).fetchone()
+    assert row == ('integer', 'text')
+
+
+def test_find(repo, custom_class):
+    objects = [custom_class(a=i, foo=str(i % 2),
+                            dt=datetime(2024, 1, 1 + i)) for i in range(6)]
+    repo.add_many(objects)
+    assert repo.find(Query(where={'a': Between(1, 3), 'foo': '1'})) == \
+        [objects[1], objects[3]]
+    assert repo.find(Query(where={'dt': Lt(datetime(2024, 1, 3))})) == objects[:2]
+    assert repo.find(Query(where={'a': In([5, 0])}, order_by=('-a',))) == \
+        [objects[5], objects[0]]
+    assert repo.find(Query(where={'a': Ge(4)})) == objects[4:]
+    assert repo.find(Query(where={'a': Le(0)})) == objects[:1]
+    assert repo.find(Query(where={'a': Gt(4)})) == objects[5:]
+    assert repo.find(Query(order_by=('-dt',), limit=2, offset=1)) == \
+        [objects[4], objects[3]]
+    assert repo.find(Query(offset=4)) == objects[4:]
+
+
+def test_find_keyset(repo, custom_class):
+    objects = [custom_class(a=i % 3) for i in range(7)]
+    repo.add_many(objects)
+    q = Query(order_by=('-a', 'pk'), limit=3)
+    pages = []
+    page = repo.find(q)
+    while page:
+        pages.append(page)
+        q = q.next_page(page[-1])
+        page = repo.find(q)
+    assert [o for p in pages for o in p] == Query(order_by=('-a', 'pk')).apply(objects)
+    assert [len(p) for p in pages] == [3, 3, 1]
+
+
+def test_find_unknown_field(repo):
+    with pytest.raises(ValueError):
+        repo.find(Query(order_by=('pk; DROP TABLE custom',)))
+
+
+def test_iter_all(repo, custom_class):
+    objects = [custom_class(a=i % 3) for i in range(7)]
+    repo.add_many(objects)
+    it = repo.iter_all(batch_size=2)
+    assert next(it) == objects[0]
+    assert list(it) == objects[1:]
+    assert list(repo.iter_all({'a': 0}, batch_size=1)) == objects[::3]
+    assert list(repo.iter_all({'a': Ge(1), 'pk': Lt(4)})) == objects[1:3]
+    with pytest.raises(ValueError):
+        next(repo.iter_all(batch_size=0))
+
+
+def test_iter_all_releases_connection(tmp_path):
+    r = SQLiteRepository(str(tmp_path / 'test.db'), Custom)
+    r.create_table()
+    r.add_many([Custom() for _ in range(3)])
+    for _ in range(2 * r.connection.readers):
+        it = r.iter_all(batch_size=1)
+        next(it)
+        it.close()
+    assert r.connection._pool.qsize() == r.connection._opened_readers
+    r.close()
+
+
+def test_aggregate(repo, custom_class):
+    objects = [custom_class(a=i, foo=str(i % 2),
+                            dt=datetime(2024, 1, 1 + i)) for i in range(6)]
+    repo.add_many(objects)
+    assert repo.aggregate('sum', 'a') == 15
+    assert repo.aggregate('count', where={'foo': '1'}) == 3
+    assert repo.aggregate('max', 'dt', where={'a': Lt(3)}) == datetime(2024, 1, 3)
+    assert repo.aggregate('min', 'a', where={'a': Gt(10)}) is None
+    assert repo.aggregate('sum', 'a', where={'a': Gt(10)}) == 0
+    assert repo.aggregate('sum', 'a', group_by='foo') == {'0': 6, '1': 9}
+    assert repo.aggregate('count', group_by=('foo', 'bar')) == \
+        {('0', 'erase'): 3, ('1', 'erase'): 3}
+    with pytest.raises(ValueError):
+        repo.aggregate('sum', 'unknown')
+
+
+# Тесты индексов
+
+@dataclass
+class Indexed():
+    db_indexes = (Index(('a',)), Index(('b', 'a'), include=('c',)),
+                  Index(('c',), where='c IS NOT NULL', name='partial_c'))
+
+    a: int = 0
+    b: int = 0
+    c: int | None = None
+    pk: int = 0
+
+
+@pytest.fixture
+def indexed_repo(tmp_path):
+    r = SQLiteRepository(str(tmp_path / 'indexed.db'), Indexed)
+    r.create_table()
+    yield r
+    r.close()
+
+
+def index_names(repo):
+    with repo.connection.reader() as con:
+        return {row[0] for row in con.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'index'")}
+
+
+def test_create_indexes(indexed_repo):
+    assert index_names(indexed_repo) == {'indexed_a', 'indexed_b_a', 'partial_c'}
+    assert indexed_repo.ensure_indexes() == []
+
+
+def test_recreate_changed_index(indexed_repo):
+    indexed_repo.indexes = (Index(('a',), include=('b',)),)
+    assert indexed_repo.ensure_indexes() == ['indexed_a']
+    assert indexed_repo.ensure_indexes() == []
+
+
+def test_explain(indexed_repo):
+    indexed_repo.add_many([Indexed(a=i, b=i % 3) for i in range(10)])
+    plan = indexed_repo.explain(Query(where={'b': 1}, order_by=('a',)))
+    assert any('INDEX indexed_b_a' in line for line in plan)
+    plan = indexed_repo.explain(Query(where={'c': Gt(1)}))
+    assert any('INDEX partial_c' in line for line in plan)
+    assert indexed_repo.find(Query(where={'b': 1}, order_by=('-a',), limit=2)) == \
+        [Indexed(a=7, b=1, pk=8), Indexed(a=4, b=1, pk=5)]
+
+
+def test_expense_hot_queries_use_indexes(tmp_path):
+    r = SQLiteRepository(str(tmp_path / 'expense.db'), Expense)
+    r.create_table()
+    plan = r.explain(Query(order_by=('-date', '-pk'), limit=20))
+    assert any('expense_date' in line for line in plan)
+    plan = r.explain(Query(where={'category_id': 1}))
+    assert any('expense_category_id_date' in line for line in plan)
+    r.close()
+
+
+@dataclass
+class Node():
+    parent: int | None = None
+    pk: int = 0
+
+
+@pytest.fixture
+def tree_repo(tmp_path):
+    r = SQLiteRepository(str(tmp_path / 'tree.db'), Node)
+    r.create_table()
+    # 1 -> (2 -> (4, 5), 3 -> 6)
+    r.add_many([Node(p) for p in [None, 1, 1, 2, 2, 3]])
+    yield r
+    r.close()
+
+
+def test_hierarchy(tree_repo):
+    assert [n.pk for n in tree_repo.descendants(1)] == [2, 3, 4, 5, 6]
+    assert tree_repo.descendants(3) == [Node(3, 6)]
+    assert tree_repo.descendants(6) == [] and tree_repo.descendants(100) == []
+    assert tree_repo.ancestors(5) == [Node(1, 2), Node(None, 1)]
+    assert tree_repo.ancestors(1) == []
+    assert sorted(tree_repo.subtree_ids(2)) == [2, 4, 5]
+    assert tree_repo.subtree_ids(1)[0] == 1
+    assert tree_repo.subtree_ids(100) == []
+    with pytest.raises(ValueError):
+        tree_repo.descendants(1, 'unknown')
+
+
+def test_hierarchy_cycle(tree_repo):
+    tree_repo.update(Node(4, 1))
+    assert [n.pk for n in tree_repo.descendants(2)] == [4, 5, 1, 3, 6]
+    assert [n.pk for n in tree_repo.ancestors(4)] == [2, 1]
+    assert sorted(tree_repo.subtree_ids(4)) == [1, 2, 3, 4, 5, 6]
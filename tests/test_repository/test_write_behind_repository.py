@@ -0,0 +1,165 @@
+from bookkeeper.repository.query import Query
+from bookkeeper.repository.sqlite_connection import SQLiteConnectionManager
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+from bookkeeper.repository.write_behind_repository import WriteBehindRepository
+from dataclasses import dataclass
+
+import pytest
+import sqlite3
+import threading
+
+
+@dataclass
+class Custom():
+    a: int = 0
+    pk: int = 0
+
+
+@pytest.fixture
+def sqlite_repo(tmp_path):
+    manager = SQLiteConnectionManager(str(tmp_path / 'test.db'))
+    r = SQLiteRepository(manager.db_file, Custom, manager)
+    r.create_table()
+    r.add(Custom(100))
+    yield r
+    manager.close()
+
+
+@pytest.fixture
+def repo(sqlite_repo):
+    r = WriteBehindRepository(sqlite_repo, max_batch=1000, max_delay=10)
+    yield r
+    r.close()
+
+
+def committed(sqlite_repo):
+    return sorted(o.a for o in sqlite_repo.get_all())
+
+
+def test_pending_writes_are_visible(repo, sqlite_repo):
+    pk = repo.add(Custom(1))
+    assert pk == 2
+    # пачка еще не записана: max_delay велик
+    assert committed(sqlite_repo) == [100]
+    assert repo.get(pk) == Custom(1, pk)
+    repo.update(Custom(2, pk))
+    assert repo.get(pk) == Custom(2, pk)
+    repo.delete(1)
+    assert repo.get(1) is None
+    assert repo.get_all() == [Custom(2, pk)]
+    assert committed(sqlite_repo) == [2]
+
+
+def test_batch_size_threshold(sqlite_repo):
+    with WriteBehindRepository(sqlite_repo, max_batch=10, max_delay=10) as repo:
+        repo.add_many([Custom(i) for i in range(10)])
+        with repo._cond:
+            assert repo._cond.wait_for(lambda: repo._done == 10, timeout=5)
+        assert len(committed(sqlite_repo)) == 11
+
+
+def test_time_threshold(sqlite_repo):
+    with WriteBehindRepository(sqlite_repo, max_delay=0.01) as repo:
+        repo.add(Custom(1))
+        with repo._cond:
+            assert repo._cond.wait_for(lambda: repo._done == 1, timeout=5)
+        assert committed(sqlite_repo) == [1, 100]
+
+
+def test_deferred_error(repo, sqlite_repo):
+    repo.add(Custom(1))
+    repo.update(Custom(5, pk=50))
+    repo.add(Custom(2))
+    repo.delete(60)
+    with pytest.raises(ValueError) as info:
+        repo.flush()
+    assert info.value.__notes__ == ['1 more queued changes failed']
+    # ошибочные изменения пропускаются, остальные изменения пачки сохраняются
+    assert committed(sqlite_repo) == [1, 2, 100]
+    repo.add(Custom(3))
+    repo.flush()
+    assert committed(sqlite_repo) == [1, 2, 3, 100]
+
+
+def test_find_sees_queue_without_flush(repo, sqlite_repo):
+    for a in (5, 6, 7):
+        repo.add(Custom(a))
+    repo.flush()
+    repo.update(Custom(200, pk=3))
+    repo.delete(4)
+    repo.add(Custom(150))
+    query = Query(order_by=('-a',), limit=3)
+    assert repo.find(query) == [Custom(200, 3), Custom(150, 5), Custom(100, 1)]
+    assert repo.find(Query(where={'a': 7})) == []
+    assert repo.find(Query(order_by=('a',), limit=2, offset=1)) == \
+        [Custom(100, 1), Custom(150, 5)]
+    # очередь не записана
+    assert committed(sqlite_repo) == [5, 6, 7, 100]
+    repo.flush()
+    assert repo.find(query) == sqlite_repo.find(query)
+
+
+def test_data_version_ignores_own_flushes(repo, sqlite_repo):
+    repo.add(Custom(1))
+    version = repo.data_version()
+    repo.flush()
+    assert repo.data_version() == version
+    repo.add(Custom(2))
+    assert repo.data_version() != version
+    version = repo.data_version()
+    sqlite_repo.update(Custom(3, pk=1))
+    assert repo.data_version() != version
+
+
+def test_data_version_after_failed_flush(repo, sqlite_repo, monkeypatch):
+    repo.add(Custom(1))
+    version = repo.data_version()
+    manager = sqlite_repo.connection
+    writer = manager.writer
+
+    def failing_writer(*args, **kwargs):
+        raise sqlite3.OperationalError('database is locked')
+
+    # транзакция не началась: очередь не тронута, версия не меняется
+    monkeypatch.setattr(manager, 'writer', failing_writer)
+    with pytest.raises(sqlite3.OperationalError):
+        repo._drain(raise_errors=True)
+    assert repo.data_version() == version
+    monkeypatch.setattr(manager, 'writer', writer)
+    repo.flush()
+    assert repo.data_version() == version
+    assert committed(sqlite_repo) == [1, 100]
+
+    # незаписанное изменение пропадает из очереди: версия меняется один раз
+    repo.update(Custom(5, pk=50))
+    version = repo.data_version()
+    with pytest.raises(ValueError):
+        repo.flush()
+    assert repo.data_version() != version
+    version = repo.data_version()
+    repo.flush()
+    assert repo.data_version() == version
+
+
+def test_writes_inside_transaction(repo, sqlite_repo):
+    repo.add(Custom(1))
+    with pytest.raises(RuntimeError):
+        with repo.transaction():
+            repo.add(Custom(2))
+            assert committed(sqlite_repo) == [1, 2, 100]
+            raise RuntimeError
+    assert committed(sqlite_repo) == [1, 100]
+    assert repo.find(Query(order_by=('-a',), limit=1)) == [Custom(100, 1)]
+
+
+def test_concurrent_writers(repo, sqlite_repo):
+    def worker():
+        for i in range(50):
+            repo.add(Custom(i))
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert repo.aggregate('count') == 201
@@ -1,9 +1,10 @@
 import tempfile
+from inspect import isgenerator
 from textwrap import dedent
 
 import pytest
 
-from bookkeeper.utils import read_tree
+from bookkeeper.utils import iter_tree, read_tree
 
 
 def test_create_tree():
@@ -71,3 +72,25 @@ def test_with_file():
             ('child2', 'parent1'),
             ('parent2', None)
         ]
+
+
+def test_iter_tree():
+    text = dedent('''
+        parent1
+            child1
+                grandchild
+
+            child2
+        parent2
+    ''')
+    paths = iter_tree(text.splitlines())
+    assert isgenerator(paths)
+    assert list(paths) == [
+        ('parent1',),
+        ('parent1', 'child1'),
+        ('parent1', 'child1', 'grandchild'),
+        ('parent1', 'child2'),
+        ('parent2',),
+    ]
+    with pytest.raises(IndentationError):
+        list(iter_tree(['    a', 'b']))